@@ -10,6 +10,8 @@ from flask_rq import RQ
 
 from config import config
 from .assets import app_css, app_js, vendor_css, vendor_js
+from .cache import StatsCache
+from .instrumentation import SQLInstrumentation
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 
@@ -17,6 +19,8 @@ mail = Mail()
 db = SQLAlchemy()
 csrf = CsrfProtect()
 compress = Compress()
+stats_cache = StatsCache()
+sql_instrumentation = SQLInstrumentation()
 
 # Set up Flask-Login
 login_manager = LoginManager()
@@ -38,6 +42,8 @@ def create_app(config_name):
     login_manager.init_app(app)
     csrf.init_app(app)
     compress.init_app(app)
+    stats_cache.init_app(app)
+    sql_instrumentation.init_app(app)
     RQ(app)
 
     # Register Jinja template functions
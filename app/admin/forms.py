@@ -1,12 +1,53 @@
+from flask import _request_ctx_stack
 from flask_wtf import Form
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import ValidationError
 from wtforms.ext.sqlalchemy.fields import QuerySelectField
 from wtforms.fields import PasswordField, StringField, SubmitField, TextAreaField, FormField, SelectField, IntegerField, BooleanField, SelectMultipleField, HiddenField
 from wtforms.fields.html5 import EmailField, DateField
-from wtforms.validators import Email, EqualTo, InputRequired, Length
+from wtforms.validators import Email, EqualTo, InputRequired, Length, Optional
 
 from .. import db
-from ..models import Role, User, Candidate, Race, Class, Gender, SexualOrientation, Term, Status
+from ..models import Role, User, Candidate, Race, Class, Gender, SexualOrientation, Term, Status, DonorStatus
+
+
+def _request_choices():
+    """Choice lists shared by the forms of the current request."""
+    ctx = _request_ctx_stack.top
+    if ctx is None:
+        return {}
+    if not hasattr(ctx, 'shared_choices'):
+        ctx.shared_choices = {}
+    return ctx.shared_choices
+
+
+def terms_by_start_date():
+    """All terms, oldest first, queried at most once per request."""
+    choices = _request_choices()
+    if 'terms' not in choices:
+        choices['terms'] = Term.query.order_by(Term.start_date).all()
+    return choices['terms']
+
+
+def terms_by_start_date_desc():
+    return terms_by_start_date()[::-1]
+
+
+class SharedQuerySelectField(QuerySelectField):
+    """
+    A QuerySelectField whose options are built once per request and shared
+    by every field with the same `query_factory`, e.g. the term selector
+    repeated on each row of the participants page.
+    """
+
+    def _get_object_list(self):
+        if self._object_list is None and self.query is None:
+            choices = _request_choices()
+            if self.query_factory not in choices:
+                choices[self.query_factory] = super(
+                    SharedQuerySelectField, self)._get_object_list()
+            self._object_list = choices[self.query_factory]
+        return super(SharedQuerySelectField, self)._get_object_list()
 
 
 class ChangeUserEmailForm(Form):
@@ -81,6 +122,14 @@ class EditTermForm(Form):
         'End Date', validators=[InputRequired()])
     submit = SubmitField('Update')
 
+class RollOverForm(Form):
+    term = SharedQuerySelectField(
+        'Move pending participants to',
+        validators=[InputRequired()],
+        get_label='name',
+        query_factory=terms_by_start_date_desc)
+    submit_roll_over = SubmitField('Roll over')
+
 class DemographicForm(Form):
     race = SelectField(
         'Race',
@@ -109,18 +158,18 @@ class EditStatusForm(Form):
         label='',
         choices=[(choice.name, choice.name.replace('_', ' ').title()) for choice in Status]
     )
-    term = QuerySelectField(
+    term = SharedQuerySelectField(
         label='',
         get_label='name',
         allow_blank=True,
-        query_factory=lambda: db.session.query(Term).order_by('start_date'))
+        query_factory=terms_by_start_date)
     submit_status = SubmitField('Update Status')
 
 class StatsSelectTermForm(Form):
-    term = QuerySelectField(
+    term = SharedQuerySelectField(
         label='',
         get_label='name',
-        query_factory=lambda:  db.session.query(Term).order_by(Term.start_date.desc()))
+        query_factory=terms_by_start_date_desc)
     submit_term = SubmitField('Update')
 
 class NewCandidateForm(Form):
@@ -132,11 +181,11 @@ class NewCandidateForm(Form):
         'Email', validators=[InputRequired(), Length(1, 64), Email()])
     phone_number = StringField(
         'Phone Number')
-    term = QuerySelectField(
+    term = SharedQuerySelectField(
         'Term',
         get_label='name',
         allow_blank=True,
-        query_factory=lambda: db.session.query(Term).order_by('start_date'))
+        query_factory=terms_by_start_date)
     source = StringField(
         'Source')
     staff_contact = StringField(
@@ -164,13 +213,68 @@ class EditParticipantForm(Form):
         'Notes', validators=[Length(0, 1024)])
     status = IntegerField(
         'Status', validators=[InputRequired()])
-    assigned_term = QuerySelectField(
+    assigned_term = SharedQuerySelectField(
         'Assigned Term',
         get_label='name',
-        query_factory=lambda: db.session.query(Term).order_by('start_date'))
+        query_factory=terms_by_start_date)
     amount_donated = IntegerField(
         'Amount Donated', validators=[])
     applied = BooleanField(
         'Applied', default=False)
     demographic = FormField(DemographicForm)
     submit = SubmitField('Save')
+
+
+class ExportForm(Form):
+    export = SelectField(
+        'Export',
+        choices=[('participants', 'Participants'), ('donors', 'Donors')])
+    term = SharedQuerySelectField(
+        'Term',
+        get_label='name',
+        allow_blank=True,
+        blank_text='All terms',
+        query_factory=terms_by_start_date_desc)
+    participant_status = SelectField(
+        'Participant status',
+        choices=[('', 'Any status')] +
+        [(s.name, s.name.title()) for s in Status])
+    donor_status = SelectField(
+        'Donor status',
+        choices=[('', 'Any status')] +
+        [(s.name, s.name.title().replace('_', ' ')) for s in DonorStatus])
+    start_date = DateField(
+        'From', validators=[Optional()])
+    end_date = DateField(
+        'To', validators=[Optional()])
+    submit = SubmitField('Start export')
+
+    def validate_end_date(self, field):
+        if self.start_date.data and field.data and \
+                field.data < self.start_date.data:
+            raise ValidationError('The range has to end after it starts.')
+
+    def filters(self):
+        """The export_criteria arguments chosen, as JSON-friendly values."""
+        status = self.participant_status if self.export.data == \
+            'participants' else self.donor_status
+        return {
+            'term_id': self.term.data.id if self.term.data else None,
+            'status': status.data or None,
+            'start': self.start_date.data.isoformat()
+            if self.start_date.data else None,
+            'end': self.end_date.data.isoformat()
+            if self.end_date.data else None,
+        }
+
+
+class ImportForm(Form):
+    records = SelectField(
+        'Import',
+        choices=[('participants', 'Participants'), ('donors', 'Donors')])
+    file = FileField(
+        'CSV file',
+        validators=[FileRequired(), FileAllowed(['csv'], 'Upload a .csv file.')])
+    dry_run = BooleanField(
+        'Only check the file', default=False)
+    submit = SubmitField('Import')
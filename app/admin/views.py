@@ -1,16 +1,30 @@
-from flask import abort, flash, redirect, render_template, url_for, request, make_response
+import io
+from collections import OrderedDict
+
+from flask import abort, current_app, flash, redirect, render_template, url_for, request, make_response, jsonify, Response, stream_with_context, session
 from flask_login import current_user, login_required
 from flask_rq import get_queue
+from sqlalchemy import or_
+from sqlalchemy.orm import contains_eager, joinedload
 
 from .forms import (ChangeAccountTypeForm, ChangeUserEmailForm, InviteUserForm,
                     NewUserForm, NewCandidateForm, DemographicForm,
                     EditParticipantForm, NewTermForm, EditTermForm, EditStatusForm,
-                    InviteAcceptedCandidatesForm, StatsSelectTermForm)
+                    InviteAcceptedCandidatesForm, StatsSelectTermForm,
+                    ExportForm, ImportForm, RollOverForm,
+                    terms_by_start_date_desc)
 from . import admin
-from .. import db
+from .. import db, stats_cache
+from ..charts import CHART_FORMATS, CHART_TITLES, chart_image, term_chart
 from ..decorators import admin_required
 from ..email import send_email
-from ..models import Role, User, Candidate, Demographic, Donor, EditableHTML, Status, DonorStatus, Term
+from ..exports import csv_chunks, export_file, gzip_chunks, start_export
+from ..imports import import_columns, import_csv
+from ..invites import invite_candidates
+from ..jobs import job_progress
+from ..notifications import notify_admins
+from ..models import Role, User, Candidate, Demographic, Donor, EditableHTML, Status, DonorStatus, Term, TermStats, DEMOGRAPHIC_DIMENSIONS, SEARCH_KINDS, SEARCH_MODELS, SearchIndex
+from ..pagination import keyset_page
 
 
 
@@ -22,6 +36,64 @@ def index():
     return render_template('admin/index.html')
 
 
+@admin.route('/cache-stats')
+@login_required
+@admin_required
+def cache_stats():
+    """Statistics cache hit and miss counters across workers."""
+    return jsonify(stats_cache.counters())
+
+
+@admin.route('/search')
+@login_required
+@admin_required
+def search():
+    """
+    Ranked full-text search over candidates and donors, as JSON. Query
+    arguments: `q`, optionally `kind` ('candidate' or 'donor'), `page` and
+    `limit`.
+    """
+    kind = request.args.get('kind') or None
+    if kind is not None and kind not in SEARCH_KINDS:
+        abort(400)
+    page = max(request.args.get('page', 1, type=int), 1)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    matches, more = SearchIndex.search(request.args.get('q', ''), kind, page,
+                                       limit)
+
+    records = {}
+    for match_kind in SEARCH_KINDS:
+        ids = [ref_id for k, ref_id, _ in matches if k == match_kind]
+        if ids:
+            model = SEARCH_MODELS[match_kind]
+            for record in model.query.filter(model.id.in_(ids)):
+                records[match_kind, record.id] = record
+
+    results = []
+    for match_kind, ref_id, score in matches:
+        record = records.get((match_kind, ref_id))
+        if record is None:
+            continue
+        if match_kind == 'candidate':
+            url = url_for('admin.edit_participant', part_id=record.id)
+        elif record.user_id is not None:
+            url = url_for('participant.index', part_id=record.user_id)
+        else:
+            url = url_for('admin.all_donors')
+        results.append({
+            'kind': match_kind,
+            'id': record.id,
+            'title': '{} {}'.format(record.first_name or '',
+                                    record.last_name or '').strip(),
+            'description': ', '.join(
+                [match_kind.title()] +
+                [v for v in (record.email, record.phone_number) if v]),
+            'url': url,
+            'score': score,
+        })
+    return jsonify(results=results, next=page + 1 if more else None)
+
+
 @admin.route('/new-user', methods=['GET', 'POST'])
 @login_required
 @admin_required
@@ -66,7 +138,8 @@ def new_term():
             candidates= [],
             )
         db.session.add(term)
-        db.session.commit()
+        db.session.flush()
+        TermStats.rebuild_term(term.id)  # commits
         flash('Term {} successfully created'.format(term.name),
               'form-success')
     return render_template('admin/new_term.html', form=form)
@@ -95,114 +168,229 @@ def edit_term(term_id):
         db.session.commit()
         flash('Term {} successfully updated'.format(term.name),
               'form-success')
-    return render_template('admin/edit_term.html', form=form, term=term)
+    return render_template('admin/edit_term.html', form=form, term=term,
+                           roll_over_form=RollOverForm())
 
 @admin.route('/terms/<int:term_id>/_delete')
 @login_required
 @admin_required
 def delete_term(term_id):
-    """Delete a term."""
-    term = Term.query.filter_by(id=term_id).first()
+    """Delete a term, leaving its participants without one."""
+    term = Term.query.get_or_404(term_id)
+    # One UPDATE for every participant, committed along with the delete
+    Candidate.query.filter_by(term_id=term_id) \
+        .update({Candidate.term_id: None}, synchronize_session='evaluate')
+    TermStats.query.filter_by(term_id=term_id).delete()
+    # Not TermStats.invalidate: there are no charts left to pre-render
+    stats_cache.invalidate_on_commit(db.session(), 'term', term_id)
     db.session.delete(term)
     db.session.commit()
 
-    candidates = Candidate.query.filter_by(term_id=term_id)
-    for candidate in candidates:
-        candidate.term_id = null
-        candidate.term = null
-        db.session.add(candidate)
-        db.session.commit()
-
     flash('Successfully deleted term %s.' % term.name, 'success')
     return redirect(url_for('admin.term_management'))
 
+
+@admin.route('/terms/<int:term_id>/_roll-over', methods=['POST'])
+@login_required
+@admin_required
+def roll_over_term(term_id):
+    """Move a term's pending participants into another term."""
+    term = Term.query.get_or_404(term_id)
+    form = RollOverForm()
+    if not form.validate_on_submit():
+        for field, errors in form.errors.items():
+            flash('Error filling out {} field. {}'.format(
+                field.replace('_', ' ').title(), errors[0]), 'form-error')
+    elif form.term.data.id == term_id:
+        flash('Choose another term to move the participants to.',
+              'form-error')
+    else:
+        target = form.term.data
+        moved = Candidate.query \
+            .filter_by(term_id=term_id, status=Status.PENDING) \
+            .update({Candidate.term_id: target.id},
+                    synchronize_session='evaluate')
+        # rebuild_term commits, taking the move with it
+        TermStats.rebuild_term(term_id)
+        TermStats.rebuild_term(target.id)
+        flash('Moved {} pending participants from {} to {}.'.format(
+            moved, term.name, target.name), 'form-success')
+    return redirect(url_for('admin.edit_term', term_id=term_id))
+
 @admin.route('/participants', methods=['GET', 'POST'])
 @login_required
 @admin_required
 def participants():
-    """Manage participants"""
-    participants = Candidate.query.all()
-
-    status_forms = { p.id: EditStatusForm(participant=p.id, status=p.status.name, term=p.term) for p in participants }
-    for f in status_forms:
-        form = status_forms[f]
-        if form.submit_status.data and form.validate():
-            user = Candidate.query.filter_by(id=form.participant.data).first()
-            user.status = form.status.data
-            user.term = form.term.data
-            db.session.add(user)
-            db.session.commit()
-            flash('Status for user {} successfully changed to {}.'
-                .format(user.first_name, user.status), 'form-success')
-            return redirect(url_for('admin.participants'))
+    """Manage participants. Rows are loaded from participants_data."""
+    # One status form serves every participant; the page fills it in from
+    # the row that was clicked
+    status_form = EditStatusForm(prefix='status')
+    if status_form.submit_status.data and status_form.validate():
+        user = Candidate.query.get_or_404(status_form.participant.data)
+        TermStats.record_candidate(user, -1)
+        user.status = status_form.status.data
+        user.term = status_form.term.data
+        db.session.add(user)
+        TermStats.record_candidate(user)
+        db.session.commit()
+        flash('Status for user {} successfully changed to {}.'
+            .format(user.first_name, user.status), 'form-success')
+        return redirect(url_for('admin.participants'))
 
     # Populate statistics with latest term
-    stats = {}
-    stat_term = Term.query.order_by(Term.start_date.desc()).first()
+    terms = terms_by_start_date_desc()
+    stat_term = terms[0] if terms else None
     stat_form = StatsSelectTermForm()
     if stat_form.submit_term.data and stat_form.validate():
         stat_term = stat_form.term.data
 
-    if stat_term is not None:
-        stats['Race Statistics'] = Candidate.race_stats(stat_term.id)
-        stats['Class Statistics'] = Candidate.class_stats(stat_term.id)
-        stats['Gender Statistics'] = Candidate.gender_stats(stat_term.id)
-        stats['Sexual Orientation Statistics'] = Candidate.sexual_orientation_stats(stat_term.id)
-        # TODO - Probably move this to its own page
-        stats['Cohort Statistics'] = Candidate.cohort_stats(stat_term.id)
-
     return render_template('admin/participant_management.html',
                         Status=Status,
-                        participants=participants, demographics=Demographic.demographics_dict(),
-                        terms=Term.query.order_by(Term.start_date.desc()).all(),
-                        status_forms=status_forms,
-                        stats=stats,
+                        demographics=Demographic.filter_choices(),
+                        terms=terms,
+                        status_form=status_form,
+                        participant_fields=[f for f in PARTICIPANT_FIELDS
+                                            if f != 'user_id'],
+                        chart_dimensions=list(CHART_TITLES),
                         stat_term=stat_term,
-                        stat_form=stat_form)
-
-@admin.route('/participants/demographic_graphs/<string:name>/<stats>')
-@login_required
-def make_graph(name, stats):
-    import numpy as np
-    import matplotlib
-    matplotlib.use('TkAgg')
-    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-    from matplotlib.figure import Figure
-    import ast
-    import math
-    from textwrap import wrap
-    from io import StringIO, BytesIO
-
-    # Setup data
-    stats_obj=ast.literal_eval(stats)
-    objects = [ stat[0] for stat in stats_obj.items() ]
-    objects = [ o.title().replace('_', ' ') for o in objects]
-    objects = [ '\n'.join(wrap(o, 11)) for o in objects ]
-    amt = [ int(stat[1]) for stat in stats_obj.items() ]
-    y_ticks = np.arange(len(amt))
-
-    # Setup graph
-    fig=Figure()
-    ax=fig.add_subplot(111)
-    ax.bar(y_ticks, amt, align='center', alpha=0.5)
-    ax.set_yticks(y_ticks, amt)
-    ax.set_ylabel('Number of candidates')
-    ax.set_xticks(np.arange(len(objects)))
-    ax.set_xticklabels(objects, rotation = 0, ha='center')
-    ax.set_title('Graph for {}'.format(name))
-
-    # Add labels to inside of bars
-    for i, v in enumerate(amt):
-        if v != 0:
-            ax.text(i, v * 0.8, str(v), color='gray')
-
-    # Convert to png
-    canvas=FigureCanvas(fig)
-    png_output=BytesIO()
-    canvas.print_png(png_output)
-    response=make_response(png_output.getvalue())
-    response.headers['Content-Type'] = 'image/png'
+                        stat_form=stat_form,
+                        chart_format=current_app.config['CHART_FORMAT'])
+
+
+def _demographic_json(demographic):
+    if demographic is None:
+        return None
+    result = {name: getattr(getattr(demographic, name), 'name', None)
+              for name, _ in DEMOGRAPHIC_DIMENSIONS}
+    result['age'] = demographic.age
+    return result
+
+
+def _participant_urls(p):
+    return {
+        'edit': url_for('admin.edit_participant', part_id=p.id),
+        'delete': url_for('admin.delete_participant', participant_id=p.id),
+        'donors': url_for('participant.index', part_id=p.user_account.id)
+                  if p.user_account else None,
+    }
+
+
+# Fields participants_data can return, with the Candidate relationship (if
+# any) that has to be loaded to produce each one
+PARTICIPANT_FIELDS = OrderedDict([
+    ('id', (lambda p: p.id, None)),
+    ('first_name', (lambda p: p.first_name, None)),
+    ('last_name', (lambda p: p.last_name, None)),
+    ('email', (lambda p: p.email, None)),
+    ('phone_number', (lambda p: p.phone_number, None)),
+    ('status', (lambda p: p.status.name if p.status else None, None)),
+    ('term', (lambda p: {'id': p.term.id, 'name': p.term.name}
+              if p.term else None, 'term')),
+    ('source', (lambda p: p.source, None)),
+    ('staff_contact', (lambda p: p.staff_contact, None)),
+    ('notes', (lambda p: p.notes, None)),
+    ('applied', (lambda p: bool(p.applied), None)),
+    ('amount_donated', (lambda p: p.amount_donated, None)),
+    ('demographic', (lambda p: _demographic_json(p.demographic),
+                     'demographic')),
+    ('user_id', (lambda p: p.user_account.id if p.user_account else None,
+                 'user_account')),
+    ('urls', (_participant_urls, 'user_account')),
+])
+
+
+def _enum_arg(name, enum_cls):
+    """The `enum_cls` member named by query argument `name`, if given."""
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return enum_cls[value]
+    except KeyError:
+        abort(400)
+
+
+def _demographic_filters():
+    """Filters on Demographic for the demographic query arguments given."""
+    filters = []
+    for name, enum_cls in DEMOGRAPHIC_DIMENSIONS:
+        value = _enum_arg(name, enum_cls)
+        if value is not None:
+            filters.append(getattr(Demographic, name) == value)
+    return filters
+
+
+@admin.route('/participants/data')
+@login_required
+@admin_required
+def participants_data():
+    """
+    JSON listing of participants ordered by last name, one page at a time.
+
+    Query arguments: `term_id`, `status` and the demographic columns
+    (`race`, `soc_class`, `gender`, `sexual_orientation`, given as enum
+    names) filter the rows; `fields` is a comma-separated subset of
+    PARTICIPANT_FIELDS to return; `limit` caps the page size and `cursor`
+    is the `next` value of the previous page.
+    """
+    fields = request.args.get('fields')
+    fields = fields.split(',') if fields else list(PARTICIPANT_FIELDS)
+    if any(f not in PARTICIPANT_FIELDS for f in fields):
+        abort(400)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+
+    query = Candidate.query
+    term_id = request.args.get('term_id', type=int)
+    if term_id is not None:
+        query = query.filter(Candidate.term_id == term_id)
+    status = _enum_arg('status', Status)
+    if status is not None:
+        query = query.filter(Candidate.status == status)
+
+    demographic_filters = _demographic_filters()
+
+    # Only load the relationships the requested fields need
+    loads = set(PARTICIPANT_FIELDS[f][1] for f in fields) - {None}
+    if demographic_filters:
+        query = query.join(Candidate.demographic).filter(*demographic_filters)
+        if 'demographic' in loads:
+            loads.remove('demographic')
+            query = query.options(contains_eager(Candidate.demographic))
+    for relationship in loads:
+        query = query.options(joinedload(getattr(Candidate, relationship)))
+
+    rows, cursor = keyset_page(query, [Candidate.sort_name, Candidate.id],
+                               lambda p: [p.sort_name, p.id],
+                               request.args.get('cursor'), limit)
+    return jsonify(
+        participants=[{f: PARTICIPANT_FIELDS[f][0](p) for f in fields}
+                      for p in rows],
+        next=cursor)
+
+@admin.route('/participants/demographic_graphs/<int:term_id>/<dimension>')
+@login_required
+@admin_required
+def make_graph(term_id, dimension):
+    """Chart of one statistics dimension for a term (PNG, or ?format=svg)."""
+    fmt = request.args.get('format', 'png')
+    if dimension not in CHART_TITLES or fmt not in CHART_FORMATS:
+        abort(404)
+    version = TermStats.version(term_id)
+    if version is None:
+        abort(404)
 
+    # The term's stats version changes with every write to its statistics,
+    # so browsers can revalidate without the chart being drawn or fetched
+    etag = 'term-{}-v{}-{}.{}'.format(term_id, version, dimension, fmt)
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        name, stats = term_chart(term_id, dimension)
+        _, image = chart_image(name, stats, fmt)
+        response = make_response(image)
+        response.headers['Content-Type'] = CHART_FORMATS[fmt][1]
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
     return response
 
 @admin.route('/new-candidate', methods=['GET', 'POST'])
@@ -235,23 +423,12 @@ def new_candidate():
         )
         db.session.add(demographic)
         db.session.add(candidate)
+        TermStats.record_candidate(candidate)
         db.session.commit()
 
-        admins = []
-        for u in User.query.all():
-            if u.is_admin():
-                admins.append(u)
-
-        # Notify admins via email
-        for a in admins:
-            get_queue().enqueue(
-                send_email,
-                recipient=a.email,
-                subject='New Giving Project Candidate',
-                template='admin/email/new_candidate',
-                user=a,
-                candidate=candidate,
-                add_method='Added by {}'.format(current_user.full_name()))
+        notify_admins('new_candidate', candidate_id=candidate.id,
+                      add_method='Added by {}'.format(
+                          current_user.full_name()))
 
         flash('Candidate {} successfully created'.format(candidate.first_name),
               'form-success')
@@ -289,6 +466,7 @@ def edit_participant(part_id):
         form.demographic.soc_class.data = part.demographic.soc_class
 
     if form.validate_on_submit():
+        TermStats.record_candidate(part, -1)
         part.first_name = form.first_name.data
         part.last_name = form.last_name.data
         part.email = form.email.data
@@ -299,7 +477,7 @@ def edit_participant(part_id):
         part.status = form.status.data
         part.term = form.assigned_term.data
         part.amount_donated = form.amount_donated.data
-        part.applied = form.applied
+        part.applied = form.applied.data
 
         demographic = part.demographic
         demographic.race = form.demographic.race.data
@@ -310,18 +488,83 @@ def edit_participant(part_id):
 
         db.session.add(demographic)
         db.session.add(part)
+        TermStats.record_candidate(part)
         db.session.commit()
         flash('Participant {} successfully saved'.format(part.first_name),
               'form-success')
     return render_template('admin/edit_participant.html', form=form)
 
+# Query arguments all_donors filters on, kept when paging through results
+DONOR_FILTERS = ('participant', 'status', 'term_id') + tuple(
+    name for name, _ in DEMOGRAPHIC_DIMENSIONS)
+
+
 @admin.route('/all-donors')
 @login_required
 @admin_required
 def all_donors():
-    """View and manage all donors"""
-    donors = Donor.query.all()
-    return render_template('admin/all_donors.html', DonorStatus=DonorStatus, donors=donors, demographics=Demographic.demographics_dict())
+    """
+    View and manage all donors, one page at a time in order of last name.
+
+    Query arguments: `participant` (a user id), `status`, `term_id` and the
+    demographic columns filter the donors; `limit` caps the page size and
+    `cursor` continues from a previous page.
+    """
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    query = Donor.query.outerjoin(Donor.user) \
+        .options(contains_eager(Donor.user))
+    participant = request.args.get('participant', type=int)
+    if participant is not None:
+        query = query.filter(Donor.user_id == participant)
+    status = _enum_arg('status', DonorStatus)
+    if status is not None:
+        query = query.filter(Donor.status == status)
+    term_id = request.args.get('term_id', type=int)
+    if term_id is not None:
+        query = query.join(User.candidate).filter(Candidate.term_id == term_id)
+
+    demographic_filters = _demographic_filters()
+    if demographic_filters:
+        query = query.join(Donor.demographic) \
+            .filter(*demographic_filters) \
+            .options(contains_eager(Donor.demographic))
+    else:
+        query = query.options(joinedload(Donor.demographic))
+
+    donors, cursor = keyset_page(query, [Donor.sort_name, Donor.id],
+                                 lambda d: [d.sort_name, d.id],
+                                 request.args.get('cursor'), limit)
+    filters = {name: request.args[name] for name in DONOR_FILTERS
+               if request.args.get(name)}
+    # Paging links keep the filters and any page size that was asked for
+    page_args = dict(filters)
+    if 'limit' in request.args:
+        page_args['limit'] = limit
+    # The participant filter offers one cohort, the chosen term's or else
+    # the newest one's, rather than everyone who ever took part
+    terms = terms_by_start_date_desc()
+    participants_term = next((t for t in terms if t.id == term_id), None) \
+        if term_id is not None else next(iter(terms), None)
+    choices = []
+    if participants_term is not None:
+        choices.append(Candidate.term_id == participants_term.id)
+    if participant is not None:
+        choices.append(User.id == participant)
+    participants = db.session.query(
+        User.id, User.first_name, User.last_name) \
+        .join(User.candidate).filter(or_(*choices)) \
+        .order_by(User.last_name, User.id).all() if choices else []
+    return render_template('admin/all_donors.html',
+                           DonorStatus=DonorStatus,
+                           donors=donors,
+                           next_cursor=cursor,
+                           first_page=request.args.get('cursor') is None,
+                           filters=filters,
+                           page_args=page_args,
+                           participants=participants,
+                           participants_term=participants_term,
+                           terms=terms,
+                           demographics=Demographic.filter_choices())
 
 @admin.route('/received-donation/<int:donor_id>')
 @login_required
@@ -371,41 +614,36 @@ def invite_accepted_candidates():
     """Invites accepted candidates to create an account and set their own password."""
     form = InviteAcceptedCandidatesForm()
     if form.validate_on_submit():
-        selected = [ Candidate.query.filter_by(id=c).first() for c in form.selected_candidates.data.split(',') ]
-        user_role = Role.query.filter_by(name='User').first()
-        # for each selected candidate create a new user account
-        for candidate in selected:
-            user = User.query.filter_by(email=candidate.email).first()
-            if user is None:
-                user = User(
-                    role=user_role,
-                    first_name=candidate.first_name,
-                    last_name=candidate.last_name,
-                    email=candidate.email,
-                    candidate=candidate)
-                db.session.add(user)
-                db.session.commit()
-            token = user.generate_confirmation_token()
-            invite_link = url_for(
-                'account.join_from_invite',
-                user_id=user.id,
-                token=token,
-                _external=True)
-            get_queue().enqueue(
-                send_email,
-                recipient=user.email,
-                subject='You Are Invited To Join',
-                template='account/email/invite',
-                user=user,
-                invite_link=invite_link)
-        str = ''
-        for c in selected:
-            str += c.first_name + ' ' + c.last_name + ', '
-        str = str[:-2]
-
-        flash('Candidates {} successfully invited'.format(str),
-              'form-success')
-    return render_template('admin/invite_accepted_candidates.html', form=form, all_terms=Term.query.order_by(Term.end_date.desc()).all(), accepted_candidates=Candidate.query.filter_by(status=Status.ASSIGNED).all())
+        ids = [int(i) for i in form.selected_candidates.data.split(',')
+               if i.strip().isdigit()]
+        if not ids:
+            flash('Select the candidates to invite.', 'form-error')
+            return redirect(url_for('admin.invite_accepted_candidates'))
+        invited, skipped, job_id = invite_candidates(ids)
+        if invited:
+            flash('Inviting candidates {}'.format(', '.join(invited)),
+                  'form-success')
+        if skipped:
+            flash('Candidates {} have no email address and were not '
+                  'invited'.format(', '.join(skipped)), 'form-error')
+        return redirect(url_for('admin.invite_accepted_candidates',
+                                job=job_id))
+    job = job_progress(request.args['job']) if 'job' in request.args else None
+    accepted_candidates = Candidate.query \
+        .options(joinedload(Candidate.term)) \
+        .filter_by(status=Status.ASSIGNED).all()
+    return render_template('admin/invite_accepted_candidates.html', form=form, all_terms=Term.query.order_by(Term.end_date.desc()).all(), accepted_candidates=accepted_candidates, job=job)
+
+
+@admin.route('/jobs/<job_id>')
+@login_required
+@admin_required
+def job_status(job_id):
+    """Progress of a background job, as JSON."""
+    progress = job_progress(job_id)
+    if progress is None:
+        abort(404)
+    return jsonify(progress)
 
 
 @admin.route('/users')
@@ -494,6 +732,9 @@ def delete_user(user_id):
               'administrator to do this.', 'error')
     else:
         user = User.query.filter_by(id=user_id).first()
+        if user.candidate is not None:
+            TermStats.record_participant_donors(user, user.candidate.term_id,
+                                                -1)
         db.session.delete(user)
         db.session.commit()
         flash('Successfully deleted user %s.' % user.full_name(), 'success')
@@ -506,6 +747,7 @@ def delete_user(user_id):
 def delete_participant(participant_id):
     """Delete a participant."""
     p = Candidate.query.filter_by(id=participant_id).first()
+    TermStats.record_candidate(p, -1)
     db.session.delete(p)
     db.session.commit()
     flash('Successfully deleted participant %s.' % p.first_name, 'success')
@@ -532,97 +774,91 @@ def update_editor_contents():
 
     return 'OK', 200
 
+def _csv_response(name):
+    """Stream export `name` as a CSV download, gzipped if ?gzip=1."""
+    chunks = csv_chunks(name)
+    filename = '{}.csv'.format(name)
+    if request.args.get('gzip'):
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    else:
+        chunks = (chunk.encode('utf-8') for chunk in chunks)
+        mimetype = 'text/csv'
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers['Content-Disposition'] = \
+        'attachment; filename={}'.format(filename)
+    return response
+
+
 @admin.route('/download/participants', methods=['GET'])
 @login_required
+@admin_required
 def download_participants():
-    # format string or list of strings to be csv-friendly
-    def csv_friendly(str):
-        if str == "":
-            return "NOT SPECIFIED"
-        return '\"{}\"'.format(str.replace('\"', '\"\"')) if str else ''
-
-    # write headers
-    csv = 'First Name,Last Name,Term,Email,Phone,Source,Staff Contact,Notes,Status,Amount Donated,Applied,Age,Race,Class,Gender,Sexual Orientation\n'
-
-    # write each candidate
-    candidates = Candidate.query.all()
-    for candidate in candidates:
-        demographics = candidate.demographic.demographic_strings()
-        csv += ','.join([
-            csv_friendly(candidate.first_name),
-            csv_friendly(candidate.last_name),
-            csv_friendly(candidate.term.name if candidate.term else ""),
-            csv_friendly(candidate.email),
-            csv_friendly(candidate.phone_number),
-            csv_friendly(candidate.source),
-            csv_friendly(candidate.staff_contact),
-            csv_friendly(candidate.notes),
-            csv_friendly(candidate.status_name()),
-            csv_friendly(str(candidate.amount_donated)),
-            csv_friendly(str(candidate.applied)),
-            csv_friendly(str(candidate.demographic.age)),
-            csv_friendly(demographics['Race']),
-            csv_friendly(demographics['Class']),
-            csv_friendly(demographics['Gender']),
-            csv_friendly(demographics['SexualOrientation']),
-        ])
-        csv += '\n'
-
-    # send csv response
-    response = make_response(csv)
-    response.headers['Content-Disposition'] = 'attachment; filename=participants.csv'
-    response.mimetype = 'text/csv'
-    print(response)
-    return response
+    return _csv_response('participants')
 
 
 @admin.route('/download/donors', methods=['GET'])
 @login_required
+@admin_required
 def download_donors():
-    # format string or list of strings to be csv-friendly
-    def csv_friendly(str):
-        if str == "":
-            return "NOT SPECIFIED"
-        return '\"{}\"'.format(str.replace('\"', '\"\"')) if str else ''
-
-    # write headers
-    # TODO put remaining headers
-    csv = 'First Name,Last Name,Email,Phone,Street,City,State,Zip,Status,Contact Data,Amount Asking,Amount Pledged,Amount Received,Data Received,Race,Class,Gender,Sexual Orientation,Age,Interested in Future GP,Want to learn,Interested in Volunteering,Notes\n'
-
-    # write each resource
-    donors = Donor.query.all()
-    for donor in donors:
-        demographics = donor.demographic.demographic_strings()
-        csv += ','.join([
-            csv_friendly(donor.first_name),
-            csv_friendly(donor.last_name),
-            csv_friendly(donor.email),
-            csv_friendly(donor.phone_number),
-            csv_friendly(donor.street_address),
-            csv_friendly(donor.city),
-            csv_friendly(donor.state),
-            csv_friendly(donor.zipcode),
-            csv_friendly(donor.get_status()),
-            csv_friendly(str(donor.contact_date)),
-            csv_friendly(str(donor.amount_asking_for)),
-            csv_friendly(str(donor.amount_pledged)),
-            csv_friendly(str(donor.amount_received)),
-            csv_friendly(str(donor.date_received)),
-            csv_friendly(demographics['Race']),
-            csv_friendly(demographics['Class']),
-            csv_friendly(demographics['Gender']),
-            csv_friendly(demographics['SexualOrientation']),
-            csv_friendly(str(donor.demographic.age)),
-            csv_friendly(str(donor.interested_in_future_gp)),
-            csv_friendly(str(donor.want_to_learn_about_brf_guarantees)),
-            csv_friendly(str(donor.interested_in_volunteering)),
-            csv_friendly(str(donor.notes)),
-        ])
-        csv += '\n'
-
-    # send csv response
-    response = make_response(csv)
-    response.headers['Content-Disposition'] = 'attachment; filename=donors.csv'
-    response.mimetype = 'text/csv'
-    print(response)
+    return _csv_response('donors')
+
+
+@admin.route('/exports', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def exports():
+    """
+    Start export jobs on the worker, and follow the ones started from this
+    browser session until their files can be downloaded.
+    """
+    form = ExportForm()
+    if form.validate_on_submit():
+        job_id = start_export(form.export.data, form.filters(),
+                              current_user.id)
+        session['exports'] = ([job_id] + session.get('exports', []))[:10]
+        return redirect(url_for('admin.exports'))
+    jobs = [job_progress(job_id) for job_id in session.get('exports', [])]
+    return render_template('admin/exports.html', form=form,
+                           jobs=[job for job in jobs if job is not None])
+
+
+@admin.route('/exports/<job_id>/download')
+@login_required
+@admin_required
+def download_export(job_id):
+    progress = job_progress(job_id)
+    if progress is None or progress['state'] != 'finished':
+        abort(404)
+    chunks = export_file(job_id)
+    if chunks is None:  # removed after expiring
+        abort(404)
+    response = Response(stream_with_context(chunks), mimetype='text/csv')
+    response.headers['Content-Disposition'] = \
+        'attachment; filename={}'.format(progress['filename'])
     return response
+
+
+@admin.route('/import', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def import_records():
+    """Create participants or donors in bulk from an uploaded CSV file."""
+    form = ImportForm()
+    result = None
+    if form.validate_on_submit():
+        try:
+            text = form.file.data.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            form.file.errors.append('The file has to be UTF-8 encoded.')
+        else:
+            imported, errors = import_csv(form.records.data,
+                                          io.StringIO(text, newline=''),
+                                          dry_run=form.dry_run.data)
+            result = {'imported': imported, 'errors': errors,
+                      'dry_run': form.dry_run.data}
+    columns = {name: list(import_columns(name))
+               for name in ('participants', 'donors')}
+    return render_template('admin/import.html', form=form, result=result,
+                           columns=columns)
@@ -0,0 +1,317 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from redis import StrictRedis
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Session.info key holding callbacks to run once the session commits
+_PENDING = 'run_on_commit'
+
+# Redis hash of the hit and miss counts of every worker
+COUNTERS_KEY = 'cache-counters'
+
+# Keys that are invalidated rather than expiring on their own. Invalidations
+# made while Redis is unreachable only reach the local cache, so a worker
+# that lost Redis deletes these before it uses Redis again.
+FLUSH_ON_RECONNECT = ('stats:*', 'identity:*')
+
+
+def run_on_commit(session, f, *args):
+    """
+    Call `f(*args)` after `session` next commits, or never if it rolls back
+    first. Repeated registrations of the same call run once, in order.
+    """
+    pending = session.info.setdefault(_PENDING, [])
+    if (f, args) not in pending:
+        pending.append((f, args))
+
+
+class LRUCache(object):
+    """A small thread-safe LRU mapping with per-entry expiry."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class StatsCache(object):
+    """
+    Cache for computed statistics, scoped by term or participant.
+
+    Every scope (e.g. ('term', 3)) is one Redis hash holding the results of
+    each cached function for that scope, so invalidating a scope is a
+    single DEL. When Redis is disabled or unreachable the cache falls back
+    to an in-process LRU; that fallback is per worker, so its TTL bounds
+    how stale another worker's copy can get. A worker coming back to Redis
+    first deletes the FLUSH_ON_RECONNECT keys, since invalidations it made
+    meanwhile never reached them.
+
+    Hit and miss counts are kept in Redis for all workers together, and in
+    the process while Redis is down.
+    """
+
+    def __init__(self, app=None):
+        self.local = LRUCache()
+        self.ttl = 300
+        self.retry_after = 30
+        self.hits = 0
+        self.misses = 0
+        self._redis = None
+        self._redis_down_until = 0
+        self._flush_pending = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.local = LRUCache(app.config.get('STATS_CACHE_SIZE', 512))
+        self.ttl = app.config.get('STATS_CACHE_TTL', 300)
+        self.retry_after = app.config.get('STATS_CACHE_RETRY_AFTER', 30)
+        self._redis = None
+        self._flush_pending = False
+        if app.config.get('STATS_CACHE_REDIS', True):
+            self._redis = StrictRedis(
+                host=app.config['RQ_DEFAULT_HOST'],
+                port=app.config['RQ_DEFAULT_PORT'],
+                db=app.config['RQ_DEFAULT_DB'],
+                password=app.config['RQ_DEFAULT_PASSWORD'],
+                socket_timeout=0.25,
+                socket_connect_timeout=0.25)
+
+    @staticmethod
+    def key(scope, scope_id):
+        return 'stats:{}:{}'.format(scope, scope_id)
+
+    def redis(self):
+        """The Redis client, or None while Redis is disabled or down."""
+        if self._redis is None or time.time() < self._redis_down_until:
+            return None
+        if self._flush_pending:
+            try:
+                self._flush(self._redis)
+            except RedisError:
+                self._redis_failed()
+                return None
+            self._flush_pending = False
+        return self._redis
+
+    def _redis_failed(self):
+        self._redis_down_until = time.time() + self.retry_after
+        self._flush_pending = True
+
+    @staticmethod
+    def _delete_matching(client, pattern):
+        keys = list(client.scan_iter(match=pattern, count=1000))
+        for start in range(0, len(keys), 1000):
+            client.delete(*keys[start:start + 1000])
+
+    @classmethod
+    def _flush(cls, client):
+        for pattern in FLUSH_ON_RECONNECT:
+            cls._delete_matching(client, pattern)
+
+    def _count(self, outcome):
+        """Count a memoized lookup as a 'hits' or 'misses'."""
+        client = self.redis()
+        if client is not None:
+            try:
+                client.hincrby(COUNTERS_KEY, outcome, 1)
+                return
+            except RedisError:
+                self._redis_failed()
+        setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def get(self, scope, scope_id, name):
+        key = self.key(scope, scope_id)
+        client = self.redis()
+        if client is not None:
+            try:
+                value = client.hget(key, name)
+                return json.loads(value.decode()) if value else None
+            except RedisError:
+                self._redis_failed()
+        value = (self.local.get(key) or {}).get(name)
+        return json.loads(value) if value else None
+
+    def set(self, scope, scope_id, name, value):
+        key = self.key(scope, scope_id)
+        client = self.redis()
+        if client is not None:
+            try:
+                client.pipeline() \
+                    .hset(key, name, json.dumps(value)) \
+                    .expire(key, self.ttl) \
+                    .execute()
+                return
+            except RedisError:
+                self._redis_failed()
+        entries = dict(self.local.get(key) or {})
+        entries[name] = json.dumps(value)
+        self.local.set(key, entries, self.ttl)
+
+    def get_blob(self, key, shared=False):
+        """
+        Fetch raw bytes stored with set_blob. With `shared`, only Redis is
+        read and None is returned while it is down.
+        """
+        client = self.redis()
+        if client is not None:
+            try:
+                return client.get(key)
+            except RedisError:
+                self._redis_failed()
+        return None if shared else self.local.get(key)
+
+    def set_blob(self, key, value, ttl, shared=False):
+        """
+        Store raw bytes (e.g. a rendered image) under `key`. With `shared`,
+        nothing is stored while Redis is down, for values that must not
+        outlive an invalidation made by another worker.
+        """
+        client = self.redis()
+        if client is not None:
+            try:
+                client.setex(key, ttl, value)
+                return
+            except RedisError:
+                self._redis_failed()
+        if not shared:
+            self.local.set(key, value, ttl)
+
+    def delete_blob(self, key):
+        """Drop bytes stored with set_blob."""
+        self.local.delete(key)
+        client = self.redis()
+        if client is not None:
+            try:
+                client.delete(key)
+            except RedisError:
+                self._redis_failed()
+
+    def delete_blobs(self, pattern):
+        """Drop every blob in Redis whose key matches the glob `pattern`."""
+        client = self.redis()
+        if client is not None:
+            try:
+                self._delete_matching(client, pattern)
+            except RedisError:
+                self._redis_failed()
+
+    def invalidate(self, scope, scope_id):
+        """Drop everything cached for a scope right away."""
+        key = self.key(scope, scope_id)
+        self.local.delete(key)
+        client = self.redis()
+        if client is not None:
+            try:
+                client.delete(key)
+            except RedisError:
+                self._redis_failed()
+
+    def invalidate_on_commit(self, session, scope, scope_id):
+        """
+        Drop a scope once `session` commits, so readers cannot re-cache the
+        old values between the write and its commit. Discarded on rollback.
+        """
+        if scope_id is not None:
+            run_on_commit(session, self.invalidate, scope, scope_id)
+
+    def clear(self):
+        self.local.clear()
+        self.hits = self.misses = 0
+
+    def counters(self):
+        """
+        Hit and miss counts of all workers, plus the ones this worker
+        counted locally while Redis was down.
+        """
+        hits, misses = self.hits, self.misses
+        client = self.redis()
+        if client is not None:
+            try:
+                shared = client.hgetall(COUNTERS_KEY)
+                hits += int(shared.get(b'hits', 0))
+                misses += int(shared.get(b'misses', 0))
+            except RedisError:
+                self._redis_failed()
+                client = None
+        lookups = hits + misses
+        return {
+            'pid': os.getpid(),
+            'backend': 'redis' if client is not None else 'local',
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': float(hits) / lookups if lookups else 0.0,
+        }
+
+    def memoize(self, scope):
+        """
+        Cache a statistics function under `scope`. The function's first
+        argument identifies the scope: either an id or an object with an
+        `id` (e.g. a Candidate for the 'participant' scope). The original
+        function stays reachable as `.uncached`.
+        """
+
+        def decorator(f):
+            name = f.__qualname__
+
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                scope_id = getattr(args[0], 'id', args[0])
+                value = self.get(scope, scope_id, name)
+                if value is not None:
+                    self._count('hits')
+                    return value
+                self._count('misses')
+                value = f(*args, **kwargs)
+                self.set(scope, scope_id, name, value)
+                return value
+
+            decorated_function.uncached = f
+            return decorated_function
+
+        return decorator
+
+
+@event.listens_for(Session, 'after_commit')
+def _run_pending(session):
+    for f, args in session.info.pop(_PENDING, ()):
+        f(*args)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_pending(session):
+    session.info.pop(_PENDING, None)
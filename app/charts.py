@@ -0,0 +1,219 @@
+import hashlib
+import json
+import math
+from collections import OrderedDict
+from io import BytesIO
+from textwrap import wrap
+from xml.sax.saxutils import escape
+
+from flask import current_app
+from flask_rq import get_queue
+from redis.exceptions import RedisError
+
+from . import db, stats_cache
+from .cache import run_on_commit
+from .jobs import job_context
+
+
+# Charts shown for a term on the participants page, keyed by the
+# TermStats dimension each one plots
+CHART_TITLES = OrderedDict([
+    ('race', 'Race Statistics'),
+    ('soc_class', 'Class Statistics'),
+    ('gender', 'Gender Statistics'),
+    ('sexual_orientation', 'Sexual Orientation Statistics'),
+    # TODO - Probably move this to its own page
+    ('cohort', 'Cohort Statistics'),
+])
+
+
+def term_chart(term_id, dimension):
+    """The (title, stats) plotted for one dimension of a term."""
+    from .models import TermStats
+
+    return CHART_TITLES[dimension], TermStats.for_term(term_id)[dimension]
+
+
+def chart_key(name, stats):
+    """Content hash identifying the image for a chart title and payload."""
+    payload = json.dumps([name, list(stats.items())])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def render_png(name, stats):
+    """Draw a labelled bar chart of `stats` with matplotlib."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+    from matplotlib.figure import Figure
+
+    objects = [o.title().replace('_', ' ') for o in stats]
+    objects = ['\n'.join(wrap(o, 11)) for o in objects]
+    amt = [int(v) for v in stats.values()]
+    ticks = list(range(len(amt)))
+
+    fig = Figure()
+    ax = fig.add_subplot(111)
+    ax.bar(ticks, amt, align='center', alpha=0.5)
+    ax.set_ylabel('Number of candidates')
+    ax.set_xticks(ticks)
+    ax.set_xticklabels(objects, rotation=0, ha='center')
+    ax.set_title('Graph for {}'.format(name))
+
+    # Add labels to inside of bars
+    for i, v in enumerate(amt):
+        if v != 0:
+            ax.text(i, v * 0.8, str(v), color='gray')
+
+    png_output = BytesIO()
+    FigureCanvas(fig).print_png(png_output)
+    return png_output.getvalue()
+
+
+# Layout of the SVG charts, matching matplotlib's default 640x480 figure
+SVG_WIDTH, SVG_HEIGHT = 640, 480
+SVG_AXES = (80, 57.6, 576, 427.2)  # left, top, right, bottom
+SVG_BAR_COLOR = '#1f77b4'
+SVG_FONT = 'font-family="DejaVu Sans, Bitstream Vera Sans, sans-serif"'
+
+
+def _nice_ticks(top):
+    """Evenly spaced round tick values from 0 covering up to `top`."""
+    if top <= 0:
+        return [0, 1]
+    raw_step = top / 8.0
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    for factor in (1, 2, 2.5, 5, 10):
+        step = factor * magnitude
+        if step >= raw_step:
+            break
+    ticks = []
+    value = 0
+    while value <= top + 1e-9:
+        ticks.append(value)
+        value += step
+    return ticks
+
+
+def _fmt(value):
+    return ('%g' % value) if isinstance(value, float) else str(value)
+
+
+def render_svg(name, stats):
+    """
+    Draw the same labelled bar chart as render_png as an SVG document,
+    without matplotlib: wrapped category labels, values inside the bars
+    and a title.
+    """
+    labels = [o.title().replace('_', ' ') for o in stats]
+    labels = [wrap(o, 11) for o in labels]
+    amt = [int(v) for v in stats.values()]
+    left, top, right, bottom = SVG_AXES
+
+    # Data limits with matplotlib's 5% margins around 0.8-wide bars
+    span = len(amt) - 1 + 0.8
+    xmin = -0.4 - 0.05 * span
+    xmax = len(amt) - 1 + 0.4 + 0.05 * span
+    ymax = max(amt + [0]) * 1.05 or 1
+    ticks = [t for t in _nice_ticks(ymax) if t <= ymax]
+
+    def x(value):
+        return left + (value - xmin) / (xmax - xmin) * (right - left)
+
+    def y(value):
+        return bottom - value / ymax * (bottom - top)
+
+    out = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" '
+           'viewBox="0 0 {} {}" {}>'.format(SVG_WIDTH, SVG_HEIGHT, SVG_WIDTH,
+                                            SVG_HEIGHT, SVG_FONT),
+           '<rect width="100%" height="100%" fill="#ffffff"/>']
+
+    for i, v in enumerate(amt):
+        out.append('<rect x="{:.2f}" y="{:.2f}" width="{:.2f}" '
+                   'height="{:.2f}" fill="{}" fill-opacity="0.5"/>'.format(
+                       x(i - 0.4), y(v), x(i + 0.4) - x(i - 0.4),
+                       y(0) - y(v), SVG_BAR_COLOR))
+        # Add labels to inside of bars
+        if v != 0:
+            out.append('<text x="{:.2f}" y="{:.2f}" font-size="10" '
+                       'fill="gray">{}</text>'.format(x(i), y(v * 0.8), v))
+
+    out.append('<rect x="{}" y="{}" width="{}" height="{}" fill="none" '
+               'stroke="#000000" stroke-width="0.8"/>'.format(
+                   left, top, right - left, bottom - top))
+
+    for i, lines in enumerate(labels):
+        out.append('<line x1="{0:.2f}" y1="{1}" x2="{0:.2f}" y2="{2}" '
+                   'stroke="#000000" stroke-width="0.8"/>'.format(
+                       x(i), bottom, bottom + 3.5))
+        out.append('<text x="{:.2f}" y="{:.2f}" font-size="10" '
+                   'text-anchor="middle">'.format(x(i), bottom + 17))
+        for n, line in enumerate(lines):
+            out.append('<tspan x="{:.2f}" dy="{}">{}</tspan>'.format(
+                x(i), 0 if n == 0 else 12, escape(line)))
+        out.append('</text>')
+
+    for t in ticks:
+        out.append('<line x1="{0}" y1="{1:.2f}" x2="{2}" y2="{1:.2f}" '
+                   'stroke="#000000" stroke-width="0.8"/>'.format(
+                       left - 3.5, y(t), left))
+        out.append('<text x="{}" y="{:.2f}" font-size="10" '
+                   'text-anchor="end">{}</text>'.format(
+                       left - 7, y(t) + 3.5, _fmt(t)))
+
+    out.append('<text x="{0}" y="{1}" font-size="10" text-anchor="middle" '
+               'transform="rotate(-90 {0} {1})">Number of candidates</text>'
+               .format(left - 38, (top + bottom) / 2))
+    out.append('<text x="{}" y="{}" font-size="12" text-anchor="middle">'
+               '{}</text>'.format((left + right) / 2, top - 6,
+                                  escape('Graph for {}'.format(name))))
+    out.append('</svg>')
+    return '\n'.join(out).encode('utf-8')
+
+
+# Renderers and response content types for each chart format
+CHART_FORMATS = {
+    'png': (render_png, 'image/png'),
+    'svg': (render_svg, 'image/svg+xml'),
+}
+
+
+def chart_image(name, stats, fmt='png'):
+    """
+    Return (key, image bytes) for a chart in `fmt` ('png' or 'svg'),
+    rendering it only if no image with the same content hash is cached.
+    """
+    render, _ = CHART_FORMATS[fmt]
+    key = chart_key(name, stats)
+    cache_key = 'chart:{}:{}'.format(fmt, key)
+    image = stats_cache.get_blob(cache_key)
+    if image is None:
+        image = render(name, stats)
+        stats_cache.set_blob(cache_key, image,
+                             current_app.config['CHART_CACHE_TTL'])
+    return key, image
+
+
+def render_term_charts(term_id):
+    """RQ job: pre-render a term's charts so web workers only serve bytes."""
+    from .models import Term
+
+    with job_context():
+        if Term.query.get(term_id) is None:  # deleted since it was queued
+            return
+        for dimension in CHART_TITLES:
+            name, stats = term_chart(term_id, dimension)
+            for fmt in CHART_FORMATS:
+                chart_image(name, stats, fmt)
+
+
+def _enqueue_term_charts(term_id):
+    try:
+        get_queue().enqueue(render_term_charts, term_id)
+    except RedisError:
+        current_app.logger.warning(
+            'Could not queue chart rendering for term %s', term_id)
+
+
+def prerender_on_commit(term_id):
+    """Queue a term's charts for re-rendering once the session commits."""
+    if term_id is not None and current_app.config['CHART_PRERENDER']:
+        run_on_commit(db.session(), _enqueue_term_charts, term_id)
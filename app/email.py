@@ -1,20 +1,93 @@
-import os
+import smtplib
+import threading
 
-from flask import render_template
+from flask import current_app, render_template
 from flask_mail import Message
 
-from app import create_app
-
 from . import mail
+from .jobs import job_context
+
+
+def _dropped(error):
+    """Whether `error` means the server has closed the SMTP session."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421  # service closing
+    return isinstance(error, OSError) and \
+        not isinstance(error, smtplib.SMTPException)
+
+
+class MailSession(object):
+    """
+    An SMTP session kept open across the jobs of a worker thread. It is
+    opened on first use and opened again when a send finds that the server
+    has dropped it, e.g. after idling past its timeout; Flask-Mail itself
+    starts a new one every MAIL_MAX_EMAILS messages.
+    """
+
+    def __init__(self):
+        self.connection = None
+
+    def _connect(self):
+        if self.connection is None:
+            self.connection = mail.connect().__enter__()
+        return self.connection
+
+    def send(self, message):
+        try:
+            self._connect().send(message)
+        except Exception as e:
+            if not _dropped(e):
+                raise
+            self.close()
+            self._connect().send(message)
+
+    def close(self):
+        connection, self.connection = self.connection, None
+        if connection is not None and connection.host is not None:
+            try:
+                connection.host.quit()
+            except (smtplib.SMTPException, OSError):
+                connection.host.close()
+
+
+def mail_session():
+    """
+    The current app's SMTP session for this thread. Sessions are not shared
+    between threads, e.g. the requests of a threaded server, since an SMTP
+    connection can only send one message at a time.
+    """
+    sessions = current_app.extensions.setdefault('mail_sessions',
+                                                 threading.local())
+    if not hasattr(sessions, 'session'):
+        sessions.session = MailSession()
+    return sessions.session
+
+
+def email_message(recipient, subject, template, **kwargs):
+    """Render a templated email."""
+    msg = Message(
+        current_app.config['EMAIL_SUBJECT_PREFIX'] + ' ' + subject,
+        sender=current_app.config['EMAIL_SENDER'],
+        recipients=[recipient])
+    msg.body = render_template(template + '.txt', **kwargs)
+    msg.html = render_template(template + '.html', **kwargs)
+    return msg
 
 
 def send_email(recipient, subject, template, **kwargs):
-    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
-    with app.app_context():
-        msg = Message(
-            app.config['EMAIL_SUBJECT_PREFIX'] + ' ' + subject,
-            sender=app.config['EMAIL_SENDER'],
-            recipients=[recipient])
-        msg.body = render_template(template + '.txt', **kwargs)
-        msg.html = render_template(template + '.html', **kwargs)
-        mail.send(msg)
+    with job_context():
+        mail_session().send(
+            email_message(recipient, subject, template, **kwargs))
+
+
+def send_emails(emails):
+    """
+    RQ job: send several emails over one SMTP session. `emails` holds a
+    dict of send_email's arguments for each one.
+    """
+    with job_context():
+        session = mail_session()
+        for email in emails:
+            session.send(email_message(**email))
@@ -0,0 +1,272 @@
+import csv
+import datetime
+import io
+import uuid
+import zlib
+
+from flask import current_app
+from flask_rq import get_queue
+from redis.exceptions import RedisError
+
+from . import db, stats_cache
+from .jobs import job_context, report_progress
+from .models import (Candidate, Demographic, Donor, DonorStatus, ExportChunk,
+                     Status, Term, User)
+
+
+def _words(member):
+    """An enum member's name as words, e.g. 'NATIVE AMERICAN'."""
+    return member.name.replace('_', ' ') if member is not None else None
+
+
+def _title(member):
+    return member.name.title() if member is not None else None
+
+
+DEMOGRAPHIC_COLUMNS = [
+    ('Race', Demographic.race, _words),
+    ('Class', Demographic.soc_class, _words),
+    ('Gender', Demographic.gender, _words),
+    ('Sexual Orientation', Demographic.sexual_orientation, _words),
+]
+
+# Each export: the model it lists, the relationships it outer joins and
+# its (header, column, formatter) columns, in file order
+EXPORTS = {
+    'participants': (Candidate, [Candidate.term, Candidate.demographic], [
+        ('First Name', Candidate.first_name, None),
+        ('Last Name', Candidate.last_name, None),
+        ('Term', Term.name, None),
+        ('Email', Candidate.email, None),
+        ('Phone', Candidate.phone_number, None),
+        ('Source', Candidate.source, None),
+        ('Staff Contact', Candidate.staff_contact, None),
+        ('Notes', Candidate.notes, None),
+        ('Status', Candidate.status, _title),
+        ('Amount Donated', Candidate.amount_donated, None),
+        ('Applied', Candidate.applied, None),
+        ('Age', Demographic.age, None),
+    ] + DEMOGRAPHIC_COLUMNS),
+    'donors': (Donor, [Donor.demographic], [
+        ('First Name', Donor.first_name, None),
+        ('Last Name', Donor.last_name, None),
+        ('Email', Donor.email, None),
+        ('Phone', Donor.phone_number, None),
+        ('Street', Donor.street_address, None),
+        ('City', Donor.city, None),
+        ('State', Donor.state, None),
+        ('Zip', Donor.zipcode, None),
+        ('Status', Donor.status, _words),
+        ('Contact Date', Donor.contact_date, None),
+        ('Amount Asking', Donor.amount_asking_for, None),
+        ('Amount Pledged', Donor.amount_pledged, None),
+        ('Amount Received', Donor.amount_received, None),
+        ('Date Received', Donor.date_received, None),
+    ] + DEMOGRAPHIC_COLUMNS + [
+        ('Age', Demographic.age, None),
+        ('Interested in Future GP', Donor.interested_in_future_gp, None),
+        ('Want to learn', Donor.want_to_learn_about_brf_guarantees, None),
+        ('Interested in Volunteering', Donor.interested_in_volunteering,
+         None),
+        ('Notes', Donor.notes, None),
+    ]),
+}
+
+
+def _cell(value):
+    # Blank text reads as a deliberately empty answer in the spreadsheets
+    if value == '':
+        return 'NOT SPECIFIED'
+    return '' if value is None else value
+
+
+def export_query(name, criteria=()):
+    """
+    Query for the rows of export `name`, one tuple per record with the
+    related rows joined in, optionally narrowed by `criteria`.
+    """
+    model, joins, columns = EXPORTS[name]
+    query = db.session.query(*[column for _, column, _ in columns]) \
+        .select_from(model)
+    for relationship in joins:
+        query = query.outerjoin(relationship)
+    return query.filter(*criteria).order_by(model.id)
+
+
+def export_rows(name, criteria=(), chunk_size=1000):
+    """
+    Formatted rows of export `name`. Rows are fetched `chunk_size` at a
+    time (a server-side cursor where the database supports one), so
+    memory use does not grow with the table.
+    """
+    formatters = [f for _, _, f in EXPORTS[name][2]]
+    for row in export_query(name, criteria).yield_per(chunk_size):
+        yield [_cell(f(value) if f is not None else value)
+               for f, value in zip(formatters, row)]
+
+
+def csv_chunks(name, criteria=(), rows_per_chunk=500):
+    """CSV text of export `name`, header first, a few hundred rows a chunk."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([header for header, _, _ in EXPORTS[name][2]])
+    for i, row in enumerate(export_rows(name, criteria), 1):
+        writer.writerow(row)
+        if i % rows_per_chunk == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def gzip_chunks(chunks):
+    """Gzip a stream of text chunks on the fly."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _date(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def export_criteria(name, term_id=None, status=None, start=None, end=None):
+    """
+    Criteria narrowing export `name` to one term, one status (an enum
+    member name) and/or a range of ISO dates, both ends inclusive.
+    Participants are dated by their term's start date and donors by their
+    contact date.
+    """
+    criteria = []
+    if name == 'participants':
+        if term_id is not None:
+            criteria.append(Candidate.term_id == term_id)
+        status_column, status_enum = Candidate.status, Status
+        date_column = Term.start_date
+    else:
+        if term_id is not None:
+            criteria.append(Donor.user.has(User.candidate.has(
+                Candidate.term_id == term_id)))
+        status_column, status_enum = Donor.status, DonorStatus
+        date_column = Donor.contact_date
+    if status:
+        criteria.append(status_column == status_enum[status])
+    if start:
+        criteria.append(date_column >= _date(start))
+    if end:
+        criteria.append(date_column <= _date(end))
+    return criteria
+
+
+def start_export(name, filters, user_id=None):
+    """
+    Queue an export job writing export `name`, narrowed by `filters` (the
+    keyword arguments of export_criteria), to a file. Returns the job id.
+
+    The job fails straight away without Redis: its progress would only be
+    kept in this process, where the worker cannot update it.
+    """
+    job_id = uuid.uuid4().hex
+    report_progress(
+        job_id, id=job_id, export=name, filters=filters, user_id=user_id,
+        state='queued', rows=0, total=None,
+        filename='{}-{}.csv'.format(name, datetime.date.today().isoformat()),
+        created=datetime.datetime.utcnow().isoformat())
+    if stats_cache.redis() is None:
+        current_app.logger.error(
+            'Export job %s needs Redis to share its progress, but Redis is '
+            'disabled or unreachable', job_id)
+        report_progress(job_id, state='failed',
+                        error='Exports need Redis, which is unavailable.')
+        return job_id
+    try:
+        get_queue().enqueue_call(
+            func=run_export, args=(job_id, name, filters),
+            timeout=current_app.config['EXPORT_JOB_TIMEOUT'])
+    except RedisError:
+        current_app.logger.warning('Could not queue export job %s', job_id)
+        report_progress(job_id, state='failed',
+                      error='The job queue is unavailable.')
+    return job_id
+
+
+def remove_expired_exports():
+    """Delete the files of exports older than EXPORT_TTL."""
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=current_app.config['EXPORT_TTL'])
+    ExportChunk.query.filter(ExportChunk.created < cutoff) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+
+
+def write_export(job_id, name, filters, rows_per_chunk=2000,
+                 bytes_per_chunk=1024 * 1024):
+    """
+    Write export job `job_id` as gzipped ExportChunks of about
+    `bytes_per_chunk`, reporting progress after every `rows_per_chunk`
+    rows. The chunks are committed together once the file is complete.
+    """
+    remove_expired_exports()
+    criteria = export_criteria(name, **filters)
+    total = export_query(name, criteria).order_by(None).count()
+    report_progress(job_id, state='running', rows=0, total=total)
+
+    size = 0
+    buf = io.BytesIO()
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def save():
+        # Inserted beside the open export query, without keeping the
+        # chunk in the session
+        db.session.execute(ExportChunk.__table__.insert(),
+                           {'job_id': job_id, 'data': buf.getvalue()})
+        buf.seek(0)
+        buf.truncate()
+
+    try:
+        chunks = csv_chunks(name, criteria, rows_per_chunk)
+        for i, chunk in enumerate(chunks, 1):
+            data = chunk.encode('utf-8')
+            size += len(data)
+            buf.write(compressor.compress(data))
+            if buf.tell() >= bytes_per_chunk:
+                save()
+            report_progress(job_id, rows=min(i * rows_per_chunk, total))
+        buf.write(compressor.flush())
+        save()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        report_progress(job_id, state='failed', error='The export failed.')
+        raise
+    return report_progress(job_id, state='finished', rows=total, size=size)
+
+
+def export_file(job_id):
+    """
+    The CSV text of export job `job_id` in chunks, or None if it has no
+    file (e.g. after expiring). Chunks are loaded one at a time.
+    """
+    ids = [chunk_id for chunk_id, in db.session.query(ExportChunk.id)
+           .filter_by(job_id=job_id).order_by(ExportChunk.id)]
+    if not ids:
+        return None
+
+    def chunks():
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        for chunk_id in ids:
+            data = db.session.query(ExportChunk.data) \
+                .filter_by(id=chunk_id).scalar()
+            yield decompressor.decompress(data)
+        yield decompressor.flush()
+
+    return chunks()
+
+
+def run_export(job_id, name, filters):
+    """RQ job: write an export to a file that admins can download."""
+    with job_context():
+        write_export(job_id, name, filters)
@@ -0,0 +1,270 @@
+import datetime
+import random
+from types import SimpleNamespace
+
+from sqlalchemy import func, select
+from werkzeug.security import generate_password_hash
+
+from . import db
+from .models import (Candidate, Class, Demographic, Donor, DonorStatus,
+                     Gender, Race, Role, SearchIndex, SexualOrientation,
+                     Status, Term, TermStats, User)
+
+FIRST_NAMES = (
+    'Aaliyah', 'Ahmed', 'Alex', 'Ana', 'Andre', 'Carmen', 'Chen', 'Dana',
+    'David', 'Devon', 'Elena', 'Emily', 'Fatima', 'Grace', 'Hannah', 'Hector',
+    'Imani', 'Jamal', 'James', 'Jordan', 'Keisha', 'Kevin', 'Laura', 'Lucia',
+    'Malik', 'Maria', 'Michael', 'Mei', 'Nadia', 'Omar', 'Priya', 'Rosa',
+    'Ruth', 'Sam', 'Sarah', 'Tanisha', 'Thomas', 'Tran', 'Yusuf', 'Zoe',
+)
+LAST_NAMES = (
+    'Adams', 'Ali', 'Brown', 'Chen', 'Cohen', 'Davis', 'Diaz', 'Evans',
+    'Flores', 'Garcia', 'Green', 'Harris', 'Hernandez', 'Jackson', 'Johnson',
+    'Kim', 'Lee', 'Lopez', 'Martin', 'Miller', 'Moore', 'Nguyen', 'Okafor',
+    'Patel', 'Perez', 'Reyes', 'Robinson', 'Rodriguez', 'Shah', 'Smith',
+    'Taylor', 'Thomas', 'Thompson', 'Walker', 'Washington', 'White',
+    'Williams', 'Wilson', 'Wright', 'Young',
+)
+NEIGHBORHOODS = (
+    ('Fishtown', '19125'), ('Germantown', '19144'), ('Kensington', '19134'),
+    ('Mount Airy', '19119'), ('Point Breeze', '19146'),
+    ('South Philly', '19148'), ('University City', '19104'),
+    ('West Philly', '19143'),
+)
+SOURCES = ('Friend', 'Flyer', 'Facebook', 'Past participant', 'Event', '')
+
+# Each status as often as it is repeated, roughly as a campaign winds down
+CANDIDATE_STATUSES = (Status.ASSIGNED,) * 7 + (Status.PENDING,) * 2 + \
+    (Status.REJECTED,)
+DONOR_STATUSES = (DonorStatus.TODO,) * 4 + (DonorStatus.ASKING,) * 2 + \
+    (DonorStatus.PLEDGED,) * 2 + (DonorStatus.COMPLETED,) * 3
+
+DEMOGRAPHIC_CHOICES = [(column, tuple(member.name for member in enum))
+                       for column, enum in (('race', Race),
+                                            ('soc_class', Class),
+                                            ('gender', Gender),
+                                            ('sexual_orientation',
+                                             SexualOrientation))]
+
+
+def _next_id(connection, model):
+    return (connection.scalar(select([func.max(model.id)])) or 0) + 1
+
+
+def _sequence_update(model):
+    """Move `model`'s Postgres id sequence up to its largest id."""
+    table = model.__table__
+    return select([func.setval(func.pg_get_serial_sequence(table.name, 'id'),
+                               select([func.max(table.c.id)]).as_scalar())])
+
+
+def _demographic(rng, demographic_id, age_range):
+    row = {column: rng.choice(names) for column, names in DEMOGRAPHIC_CHOICES}
+    row.update(id=demographic_id, age=rng.randint(*age_range))
+    return row
+
+
+def _person(rng, number):
+    first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return {
+        'first_name': first_name,
+        'last_name': last_name,
+        'email': '{}.{}{}@example.com'.format(first_name, last_name,
+                                              number).lower(),
+        'phone_number': '215-{:03d}-{:04d}'.format(rng.randint(200, 999),
+                                                   rng.randint(0, 9999)),
+    }
+
+
+def _donor(rng, donor_id, user_id, term):
+    """A donor of a participant of `term`, filled in up to its status."""
+    status = rng.choice(DONOR_STATUSES)
+    neighborhood, zipcode = rng.choice(NEIGHBORHOODS)
+    contact_date = term.start_date + datetime.timedelta(rng.randint(0, 60))
+    donor = dict(_person(rng, donor_id), **{
+        'id': donor_id,
+        'demographic_id': donor_id,
+        'user_id': user_id,
+        'status': status.name,
+        'contact_date': contact_date,
+        'street_address': '{} {} St'.format(rng.randint(1, 9999),
+                                            rng.choice(LAST_NAMES)),
+        'city': 'Philadelphia',
+        'state': 'PA',
+        'zipcode': zipcode,
+        # executemany needs the same columns in every row
+        'date_asking': None,
+        'amount_asking_for': None,
+        'how_asking': None,
+        'pledged': None,
+        'amount_pledged': 0,
+        'amount_received': 0,
+        'date_received': None,
+        'interested_in_future_gp': rng.random() < 0.2,
+        'want_to_learn_about_brf_guarantees': rng.random() < 0.1,
+        'interested_in_volunteering': rng.random() < 0.15,
+        'notes': 'Met in {}.'.format(neighborhood),
+    })
+    if status != DonorStatus.TODO:
+        ask = rng.choice((25, 50, 100, 250, 500, 1000))
+        donor.update(date_asking=contact_date + datetime.timedelta(7),
+                     amount_asking_for=str(ask),
+                     how_asking=rng.choice(('In person', 'Phone', 'Email')))
+        if status != DonorStatus.ASKING:
+            donor.update(pledged=True, amount_pledged=ask)
+        if status == DonorStatus.COMPLETED:
+            donor.update(amount_received=ask,
+                         date_received=contact_date + datetime.timedelta(30))
+    return donor
+
+
+def _insert(connection, model, rows, search_kind=None):
+    connection.execute(model.__table__.insert(), rows)
+    if search_kind is not None:
+        # Core inserts skip the ORM events that index new records
+        SearchIndex.index_records(connection, search_kind,
+                                  [SimpleNamespace(**row) for row in rows])
+
+
+def _add_terms(connection, n):
+    term_id = _next_id(connection, Term)
+    terms = []
+    for i in range(n):
+        start = datetime.date(2008 + (term_id + i) // 2,
+                              1 if (term_id + i) % 2 == 0 else 7, 1)
+        terms.append(SimpleNamespace(
+            id=term_id + i,
+            name='{} {}'.format('Spring' if start.month == 1 else 'Fall',
+                                start.year),
+            start_date=start,
+            end_date=start + datetime.timedelta(days=180),
+            in_progress=i == n - 1))
+    with connection.begin():
+        _insert(connection, Term, [vars(term) for term in terms])
+    return terms
+
+
+def _add_candidates(connection, rng, n, terms, search_kind, chunk_size):
+    """Add candidates and their accounts; returns [(user id, term)]."""
+    user_role = Role.query.filter_by(default=True).first()
+    password_hash = generate_password_hash('password')
+    demographic_id = _next_id(connection, Demographic)
+    candidate_id = _next_id(connection, Candidate)
+    user_id = _next_id(connection, User)
+    participants = []
+    for start in range(0, n, chunk_size):
+        demographic_rows, candidate_rows, user_rows = [], [], []
+        for i in range(start, min(start + chunk_size, n)):
+            term = terms[i % len(terms)]
+            status = rng.choice(CANDIDATE_STATUSES)
+            demographic_rows.append(
+                _demographic(rng, demographic_id, (18, 80)))
+            candidate = dict(_person(rng, candidate_id), **{
+                'id': candidate_id,
+                'term_id': term.id,
+                'status': status.name,
+                'demographic_id': demographic_id,
+                'source': rng.choice(SOURCES),
+                'applied': status != Status.PENDING,
+                'amount_donated': rng.choice((0, 0, 25, 50, 100, 250)),
+            })
+            candidate_rows.append(candidate)
+            if status == Status.ASSIGNED:
+                user_rows.append({
+                    'id': user_id,
+                    'first_name': candidate['first_name'],
+                    'last_name': candidate['last_name'],
+                    'email': candidate['email'],
+                    'password_hash': password_hash,
+                    'confirmed': True,
+                    'role_id': user_role.id if user_role else None,
+                    'candidate_id': candidate_id,
+                })
+                participants.append((user_id, term))
+                user_id += 1
+            demographic_id += 1
+            candidate_id += 1
+        with connection.begin():
+            _insert(connection, Demographic, demographic_rows)
+            _insert(connection, Candidate, candidate_rows, search_kind)
+            if user_rows:
+                _insert(connection, User, user_rows)
+    return participants
+
+
+def _add_donors(connection, rng, n, participants, search_kind, chunk_size):
+    # Donor counts per participant follow a long-tailed distribution
+    weights = [rng.paretovariate(1.5) for _ in participants]
+    owners = rng.choices(participants, weights, k=n)
+    # Each donor's demographic row shares its id
+    donor_id = max(_next_id(connection, Donor),
+                   _next_id(connection, Demographic))
+    for start in range(0, n, chunk_size):
+        demographic_rows, donor_rows = [], []
+        for user_id, term in owners[start:start + chunk_size]:
+            demographic_rows.append(_demographic(rng, donor_id, (18, 90)))
+            donor_rows.append(_donor(rng, donor_id, user_id, term))
+            donor_id += 1
+        with connection.begin():
+            _insert(connection, Demographic, demographic_rows)
+            _insert(connection, Donor, donor_rows, search_kind)
+
+
+def _advance_sequences(connection):
+    """
+    Rows here are inserted with ids of their own, which leaves Postgres's
+    id sequences behind; move them on so the next ORM insert does not
+    reuse an id.
+    """
+    if connection.dialect.name == 'postgresql':
+        for model in (Term, Demographic, Candidate, User, Donor):
+            connection.execute(_sequence_update(model))
+
+
+def _check_constraints(connection, enabled):
+    """
+    Turn SQLite's CHECK constraints (the enum columns') on or off for
+    `connection`. Checking them is a large share of insert time, and the
+    generated values are valid by construction.
+    """
+    if connection.dialect.name == 'sqlite':
+        connection.execute('PRAGMA ignore_check_constraints = {}'.format(
+            'OFF' if enabled else 'ON'))
+
+
+def generate_dataset(terms=20, candidates=5000, donors=500000, seed=0,
+                     index_search=True, chunk_size=10000):
+    """
+    Add a realistic dataset, the same for the same seed and starting
+    database: `terms` six-month terms, `candidates` candidates spread over
+    them, an account for every assigned candidate and `donors` donors
+    shared unevenly between those participants, a few with hundreds and
+    many with a handful. Donors go through every DonorStatus stage.
+
+    Rows are inserted with Core executemany, `chunk_size` per transaction,
+    and the new terms' statistics are rebuilt at the end. Indexing the
+    rows for search as they go takes about as long as inserting them;
+    without `index_search` run SearchIndex.rebuild to search them. Returns
+    the number of (terms, candidates, participants, donors) added.
+    """
+    rng = random.Random(seed)
+    connection = db.engine.connect()
+    try:
+        _check_constraints(connection, False)
+        new_terms = _add_terms(connection, terms)
+        participants = _add_candidates(
+            connection, rng, candidates, new_terms,
+            'candidate' if index_search else None, chunk_size) \
+            if new_terms else []
+        if participants and donors:
+            _add_donors(connection, rng, donors, participants,
+                        'donor' if index_search else None, chunk_size)
+        else:
+            donors = 0
+        _advance_sequences(connection)
+    finally:
+        _check_constraints(connection, True)
+        connection.close()
+    for term in new_terms:
+        TermStats.rebuild_term(term.id)
+    return terms, candidates if new_terms else 0, len(participants), donors
@@ -0,0 +1,258 @@
+import csv
+import datetime
+from itertools import islice
+from types import SimpleNamespace
+
+from sqlalchemy import Boolean, Date, Enum, Integer, false, func, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import db
+from .exports import EXPORTS
+from .models import (Candidate, Demographic, DonorStatus, SearchIndex, Status,
+                     Term, TermStats, User)
+
+# Record type of each import, as indexed for search
+IMPORT_KINDS = {'participants': 'candidate', 'donors': 'donor'}
+
+# Values given to a new record whose column is missing or blank, as the
+# forms creating records one at a time set them
+IMPORT_DEFAULTS = {
+    'participants': {'status': Status.PENDING, 'amount_donated': 0},
+    'donors': {'status': DonorStatus.TODO, 'amount_pledged': 0,
+               'amount_received': 0},
+}
+
+# Extra donors column naming the participant account each donor belongs to
+PARTICIPANT_EMAIL = 'Participant Email'
+
+
+def _parse(sql_type, value):
+    """
+    A cell as a value of `sql_type`, None if blank. Raises ValueError with
+    the reason if the cell does not hold one.
+    """
+    value = value.strip()
+    if isinstance(sql_type, Enum):  # before String, which Enum extends
+        if not value:
+            return None
+        members = sql_type.enum_class.__members__
+        name = value.upper().replace(' ', '_')
+        if name not in members:
+            raise ValueError('has to be one of {}'.format(', '.join(
+                m.replace('_', ' ') for m in members)))
+        return members[name]
+    if not value:
+        return None
+    if isinstance(sql_type, Boolean):
+        if value.lower() in ('true', 'yes', '1'):
+            return True
+        if value.lower() in ('false', 'no', '0'):
+            return False
+        raise ValueError('has to be True or False')
+    if isinstance(sql_type, Integer):
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError('has to be a whole number')
+    if isinstance(sql_type, Date):
+        try:
+            return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise ValueError('has to be a date like 2017-09-01')
+    if value == 'NOT SPECIFIED':  # how exports write blank text
+        return ''
+    if sql_type.length is not None and len(value) > sql_type.length:
+        raise ValueError('is longer than {} characters'.format(
+            sql_type.length))
+    return value
+
+
+def import_columns(name):
+    """
+    The columns import `name` reads, by header: the export's columns as
+    (model, attribute, SQL type), plus the participant email for donors.
+    """
+    columns = {header: (column.class_, column.key,
+                        column.property.columns[0].type)
+               for header, column, _ in EXPORTS[name][2]}
+    if name == 'donors':
+        columns[PARTICIPANT_EMAIL] = (User, 'email', User.email.type)
+    return columns
+
+
+def reserve_ids(connection, model, n):
+    """
+    `n` new primary keys for rows of `model` inserted without the ORM. On
+    Postgres they are drawn from the table's id sequence, so later inserts
+    never reuse them. Elsewhere they follow the largest id, read under a
+    write lock that makes other writers wait for this transaction, so
+    insert them in the same transaction.
+    """
+    table = model.__table__
+    if connection.dialect.name == 'postgresql':
+        sequence = func.pg_get_serial_sequence(table.name, 'id')
+        return [row[0] for row in connection.execute(
+            select([func.nextval(sequence)])
+            .select_from(func.generate_series(1, n)))]
+    latest = select([func.max(table.c.id)])
+    if connection.dialect.name == 'sqlite':
+        # SQLite locks the whole database for the first write statement of
+        # a transaction, even one that changes nothing
+        connection.execute(table.update().where(false())
+                           .values(id=table.c.id))
+    else:
+        latest = latest.with_for_update()
+    start = (connection.scalar(latest) or 0) + 1
+    return list(range(start, start + n))
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
+
+def _validate(name, headers, rows, terms):
+    """
+    Parse a chunk of (row number, cells) into mappings to insert, looking
+    up the participant accounts of the whole chunk with one query.
+    Returns ([(row number, record, demographic)], [(row number, message)]).
+    """
+    columns = import_columns(name)
+    parsed, errors = [], []
+    for number, cells in rows:
+        record = dict(IMPORT_DEFAULTS[name])
+        demographic = {}
+        messages = []
+        for header, cell in zip(headers, cells):
+            model, key, sql_type = columns[header]
+            try:
+                value = _parse(sql_type, cell)
+            except ValueError as e:
+                messages.append('{} {}'.format(header, e))
+                continue
+            if value is None:
+                continue
+            if model is Term:
+                if value in terms:
+                    record['term_id'] = terms[value]
+                else:
+                    messages.append('Term "{}" does not exist'.format(value))
+            elif model is User:
+                record['user_id'] = value.lower()  # resolved below
+            elif model is Demographic:
+                demographic[key] = value
+            else:
+                record[key] = value
+        if not record.get('first_name'):
+            messages.append('First Name is required')
+        if messages:
+            errors.append((number, '; '.join(messages)))
+        else:
+            parsed.append((number, record, demographic))
+
+    emails = {record['user_id'] for _, record, _ in parsed
+              if 'user_id' in record}
+    if emails:
+        users = dict(db.session.query(func.lower(User.email), User.id)
+                     .filter(func.lower(User.email).in_(emails)))
+        valid = []
+        for number, record, demographic in parsed:
+            email = record.get('user_id')
+            if email is not None and email not in users:
+                errors.append((number, 'No participant has the email '
+                               '"{}"'.format(email)))
+                continue
+            if email is not None:
+                record['user_id'] = users[email]
+            valid.append((number, record, demographic))
+        parsed = valid
+    return parsed, errors
+
+
+def _insert(name, records):
+    """
+    Insert the (row number, record, demographic) mappings of one chunk,
+    and their search index entries, in one transaction. Returns the
+    record mappings with their new ids.
+
+    The ids are reserved up front, so each table gets executemany inserts
+    rather than one INSERT per row to read back its key.
+    """
+    model = EXPORTS[name][0]
+    connection = db.session.connection()
+    demographic_ids = reserve_ids(connection, Demographic, len(records))
+    record_ids = reserve_ids(connection, model, len(records))
+    demographics, mappings = [], []
+    for (_, record, demographic), demographic_id, record_id in zip(
+            records, demographic_ids, record_ids):
+        demographic['id'] = demographic_id
+        record.update(id=record_id, demographic_id=demographic_id)
+        demographics.append(demographic)
+        mappings.append(record)
+    db.session.bulk_insert_mappings(Demographic, demographics)
+    db.session.bulk_insert_mappings(model, mappings)
+    # Bulk inserts skip the ORM events that index new records
+    SearchIndex.index_records(db.session.connection(), IMPORT_KINDS[name],
+                              [SimpleNamespace(**m) for m in mappings])
+    db.session.commit()
+    return mappings
+
+
+def _refresh_stats(name, mappings):
+    """Bring the statistics of the terms the new records affect up to date."""
+    if name == 'participants':
+        term_ids = {m.get('term_id') for m in mappings}
+    else:
+        user_ids = {m['user_id'] for m in mappings if m.get('user_id')}
+        candidates = db.session.query(Candidate.id, Candidate.term_id) \
+            .join(Candidate.user_account).filter(User.id.in_(user_ids)).all() \
+            if user_ids else []
+        for candidate_id, _ in candidates:
+            TermStats.invalidate(None, candidate_id)
+        term_ids = {term_id for _, term_id in candidates}
+    for term_id in term_ids - {None}:
+        TermStats.rebuild_term(term_id)
+    db.session.commit()
+
+
+def import_csv(name, stream, dry_run=False, chunk_size=1000):
+    """
+    Create participants or donors from CSV text with the headers of export
+    `name`; donors may also name their participant account in a
+    'Participant Email' column. Columns can come in any order or be left
+    out, and blank cells take the defaults of the forms.
+
+    Rows are validated `chunk_size` at a time and each chunk's valid rows
+    are inserted in their own transaction, bypassing the ORM. Rows with
+    errors are skipped, and nothing is written with `dry_run`. Returns
+    (number of rows imported, [(row number, message)]), counting the
+    header as row 1.
+    """
+    reader = csv.reader(stream)
+    headers = [h.strip() for h in next(reader, [])]
+    unknown = [h for h in headers if h not in import_columns(name)]
+    if unknown or 'First Name' not in headers:
+        return 0, [(1, 'Unknown columns: {}'.format(', '.join(unknown))
+                    if unknown else 'The First Name column is missing')]
+
+    terms = dict(db.session.query(Term.name, Term.id))
+    imported, errors, inserted = 0, [], []
+    for chunk in _chunks(enumerate(reader, 2), chunk_size):
+        records, chunk_errors = _validate(name, headers, chunk, terms)
+        errors.extend(chunk_errors)
+        if dry_run or not records:
+            imported += len(records)
+            continue
+        try:
+            inserted.extend(_insert(name, records))
+            imported += len(records)
+        except SQLAlchemyError:
+            db.session.rollback()
+            errors.extend((number, 'Could not be saved')
+                          for number, _, _ in records)
+    if inserted:
+        _refresh_stats(name, inserted)
+    return imported, sorted(errors)
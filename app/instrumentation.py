@@ -0,0 +1,145 @@
+import random
+import re
+import time
+from collections import Counter
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Literals and expanded IN lists, so one statement run with different
+# values (or a different number of ids) has one fingerprint
+_NORMALIZE = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%\(\w+\)s|:\w+|\$\d+|%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def fingerprint(statement):
+    """A statement with its values replaced by placeholders."""
+    for pattern, replacement in _NORMALIZE:
+        statement = pattern.sub(replacement, statement)
+    return statement.strip()
+
+
+class RequestQueries(object):
+    """The statements run while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold):
+        """(statement, count) run more than `threshold` times, most first."""
+        return [(statement, n) for statement, n in
+                self.fingerprints.most_common() if n > threshold]
+
+
+# The request's RequestQueries live in its WSGI environ rather than `g`:
+# a body streamed with stream_with_context runs in a new app context, but
+# still in the same request
+_ENVIRON_KEY = 'app.sql_queries'
+
+
+def _recording():
+    return request.environ.get(_ENVIRON_KEY) if has_request_context() \
+        else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    if _recording() is not None:
+        conn.info.setdefault('query_start', []).append(time.time())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    queries = _recording()
+    if queries is not None and conn.info.get('query_start'):
+        queries.record(statement,
+                       time.time() - conn.info['query_start'].pop())
+
+
+# Engine events, listened to for every engine once an app opts in
+_LISTENERS = (('before_cursor_execute', _before_cursor_execute),
+              ('after_cursor_execute', _after_cursor_execute))
+
+
+class SQLInstrumentation(object):
+    """
+    Count the SQL statements each request runs and how long the database
+    took, reported in the X-DB-Queries and X-DB-Time (milliseconds)
+    headers. Statements that run more than SQL_REPEAT_THRESHOLD times in
+    one request, usually a relationship lazy loaded in a loop, are logged
+    and counted in X-DB-Repeated.
+
+    The headers of a streamed response (e.g. the CSV downloads) go out
+    before its body runs any statements, so such responses get no X-DB-*
+    headers; their totals, streaming included, are logged once the body
+    has been sent.
+
+    Off unless SQL_INSTRUMENTATION is set, and then only a
+    SQL_SAMPLE_RATE fraction of requests is recorded; the others pay for
+    one check per statement. Apps that leave it off do not listen to the
+    engines at all.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config.get('SQL_INSTRUMENTATION'):
+            return
+        for name, listener in _LISTENERS:
+            if not event.contains(Engine, name, listener):
+                event.listen(Engine, name, listener)
+        app.before_request(self._start)
+        app.after_request(self._report)
+
+    @staticmethod
+    def _start():
+        if random.random() < current_app.config['SQL_SAMPLE_RATE']:
+            request.environ[_ENVIRON_KEY] = RequestQueries()
+
+    @staticmethod
+    def _report(response):
+        queries = _recording()
+        if queries is None:
+            return response
+        app = current_app._get_current_object()
+        method, path = request.method, request.path
+        if response.is_streamed:
+            response.call_on_close(lambda: SQLInstrumentation._log(
+                app, queries, method, path, streamed=True))
+            return response
+        del request.environ[_ENVIRON_KEY]
+        response.headers['X-DB-Queries'] = str(queries.count)
+        response.headers['X-DB-Time'] = '{:.1f}'.format(queries.seconds * 1000)
+        repeated = SQLInstrumentation._log(app, queries, method, path)
+        if repeated:
+            response.headers['X-DB-Repeated'] = str(len(repeated))
+        return response
+
+    @staticmethod
+    def _log(app, queries, method, path, streamed=False):
+        """Log a request's likely N+1 queries, and the totals if streamed."""
+        if streamed:
+            app.logger.info('%s %s (streamed) ran %d statements in %.1f ms',
+                            method, path, queries.count,
+                            queries.seconds * 1000)
+        repeated = queries.repeated(app.config['SQL_REPEAT_THRESHOLD'])
+        for statement, n in repeated:
+            app.logger.warning(
+                'Possible N+1 query in %s %s: ran %d times: %s',
+                method, path, n, statement[:500])
+        return repeated
@@ -0,0 +1,100 @@
+import smtplib
+import uuid
+
+from flask import current_app, url_for
+from flask_rq import get_queue
+from redis.exceptions import RedisError
+
+from . import db
+from .email import email_message, mail_session
+from .jobs import job_context, report_progress
+from .models import Candidate, Role, User
+
+
+def invite_candidates(candidate_ids):
+    """
+    Create participant accounts for the candidates with `candidate_ids`
+    that have no account yet, and queue one job emailing every one of them
+    an invitation. Candidates and existing accounts are each fetched with
+    one IN query and new accounts are created in one transaction.
+
+    Returns (names of the candidates invited, names of those skipped for
+    having no email, job id).
+    """
+    candidates = Candidate.query.filter(Candidate.id.in_(candidate_ids)) \
+        .order_by(Candidate.last_name, Candidate.first_name).all()
+    skipped = [c for c in candidates if not c.email]
+    candidates = [c for c in candidates if c.email]
+    users = {u.email: u for u in User.query.filter(
+        User.email.in_({c.email for c in candidates}))} if candidates else {}
+
+    user_role = Role.query.filter_by(name='User').first()
+    for candidate in candidates:
+        if candidate.email not in users:
+            # candidate_id rather than `candidate`, which would load the
+            # candidate's (empty) account to replace it
+            users[candidate.email] = User(
+                role=user_role,
+                first_name=candidate.first_name,
+                last_name=candidate.last_name,
+                email=candidate.email,
+                candidate_id=candidate.id)
+            db.session.add(users[candidate.email])
+    db.session.flush()
+
+    # A candidate sharing an email with another gets that one invitation
+    invited = list({c.email: users[c.email] for c in candidates}.values())
+    tokens = User.generate_confirmation_tokens(invited)
+    invites = [(user.id, url_for('account.join_from_invite', user_id=user.id,
+                                 token=tokens[user.id], _external=True))
+               for user in invited]
+    names = [['{} {}'.format(c.first_name, c.last_name) for c in group]
+             for group in (candidates, skipped)]
+    db.session.commit()
+
+    job_id = uuid.uuid4().hex
+    report_progress(job_id, id=job_id, state='queued', sent=0,
+                    total=len(invites), failed=[])
+    try:
+        get_queue().enqueue(send_invites, job_id, invites)
+    except RedisError:
+        current_app.logger.warning('Could not queue invite job %s', job_id)
+        report_progress(job_id, state='failed',
+                        error='The job queue is unavailable.')
+    return names[0], names[1], job_id
+
+
+def send_invites(job_id, invites):
+    """
+    RQ job: email each (user id, invite link) its invitation over one SMTP
+    session, reporting how many have been sent. Addresses the server
+    refuses are reported in `failed` without stopping the rest.
+    """
+    with job_context():
+        users = {u.id: u for u in User.query.filter(
+            User.id.in_([user_id for user_id, _ in invites]))}
+        report_progress(job_id, state='running')
+        session = mail_session()
+        sent, failed = 0, []
+        try:
+            for user_id, invite_link in invites:
+                user = users.get(user_id)
+                if user is None:
+                    continue
+                try:
+                    session.send(email_message(
+                        recipient=user.email,
+                        subject='You Are Invited To Join',
+                        template='account/email/invite',
+                        user=user,
+                        invite_link=invite_link))
+                    sent += 1
+                except smtplib.SMTPRecipientsRefused:
+                    failed.append(user.email)
+                report_progress(job_id, sent=sent, failed=failed)
+        except Exception:
+            report_progress(job_id, state='failed',
+                            error='Sending stopped after {} invitations.'
+                            .format(sent))
+            raise
+        report_progress(job_id, state='finished')
@@ -0,0 +1,77 @@
+import json
+import os
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+from rq import SimpleWorker
+
+from . import stats_cache
+
+_app = None
+
+
+def set_job_app(app):
+    """Run RQ jobs in `app`, e.g. the app a worker was started with."""
+    global _app
+    _app = app
+
+
+def job_app():
+    """The app RQ jobs run in, created once per worker process."""
+    if _app is None:
+        from app import create_app
+        set_job_app(create_app(os.getenv('FLASK_CONFIG') or 'default'))
+    return _app
+
+
+@contextmanager
+def job_context():
+    """
+    Run the body of an RQ job in an app context: the caller's if there is
+    one, otherwise a fresh context of the worker's app, which removes the
+    job's database session when it is popped.
+    """
+    if has_app_context():
+        yield
+    else:
+        with job_app().app_context():
+            yield
+
+
+def job_progress(job_id):
+    """
+    The progress job `job_id` has reported as a dict, or None if there is
+    no such job or it has expired. Jobs report their `state` as 'queued',
+    'running', 'finished' or 'failed', plus counts of their own.
+    """
+    value = stats_cache.get_blob('job:{}'.format(job_id))
+    if value is None:
+        return None
+    return json.loads(value.decode() if isinstance(value, bytes) else value)
+
+
+def report_progress(job_id, **state):
+    """
+    Merge `state` into the progress of job `job_id`. It goes through the
+    stats cache's Redis connection, so web workers can read what a worker
+    wrote, and is kept for JOB_PROGRESS_TTL.
+    """
+    progress = job_progress(job_id) or {}
+    progress.update(state)
+    stats_cache.set_blob('job:{}'.format(job_id), json.dumps(progress),
+                         current_app.config['JOB_PROGRESS_TTL'])
+    return progress
+
+
+class AppWorker(SimpleWorker):
+    """
+    An RQ worker that runs jobs in its own process, each in a fresh app
+    context of the one job_app. Jobs share the app and what it keeps open,
+    like the SMTP session, but not a database session. Without RQ's fork
+    per job, a job that crashes the process or leaks memory takes the
+    worker with it, so run it under a supervisor that restarts it.
+    """
+
+    def perform_job(self, *args, **kwargs):
+        with job_app().app_context():
+            return super(AppWorker, self).perform_job(*args, **kwargs)
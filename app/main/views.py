@@ -1,10 +1,9 @@
 from flask import render_template, flash, render_template
-from ..models import EditableHTML, Demographic, Candidate, Term, Status, User
+from ..models import EditableHTML, Demographic, Candidate, Term, Status, User, TermStats
 from .forms import IntakeForm
 from . import main
 from .. import db
-from flask_rq import get_queue
-from ..email import send_email
+from ..notifications import notify_admins
 import time
 
 
@@ -49,23 +48,11 @@ def interested():
         )
         db.session.add(demographic)
         db.session.add(candidate)
+        TermStats.record_candidate(candidate)
         db.session.commit()
 
-        admins = []
-        for u in User.query.all():
-            if u.is_admin():
-                admins.append(u)
-
-        # Notify admins via email
-        for a in admins:
-            get_queue().enqueue(
-                send_email,
-                recipient=a.email,
-                subject='New Giving Project Candidate',
-                template='admin/email/new_candidate',
-                user=a,
-                candidate=candidate,
-                add_method='Interest form')
+        notify_admins('new_candidate', candidate_id=candidate.id,
+                      add_method='Interest form')
 
         flash('Thank you {}! We will contact you shortly.'.format(candidate.first_name),
               'form-success')
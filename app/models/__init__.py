@@ -9,3 +9,6 @@ from .donor import *  # noqa
 from .candidate import *  # noqa
 from .miscellaneous import *  # noqa
 from .term import *  #noqa
+from .term_stats import *  # noqa
+from .search import *  # noqa
+from .export import *  # noqa
@@ -6,9 +6,13 @@ from itsdangerous import BadSignature, SignatureExpired
 from werkzeug.security import check_password_hash, generate_password_hash
 import datetime
 from datetime import date
+from sqlalchemy import case, func, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import aliased
 
-from .. import db, login_manager
-from app.models.demographic import Race, Class, Gender, SexualOrientation
+from .. import db, login_manager, stats_cache
+from app.models.demographic import (Race, Class, Gender, SexualOrientation,
+                                    DEMOGRAPHIC_DIMENSIONS)
 from app.models.donor import DonorStatus
 from app.models import Demographic, Donor, User
 
@@ -24,12 +28,12 @@ class Candidate(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     first_name = db.Column(db.String(64))
     last_name = db.Column(db.String(64))
-    email = db.Column(db.String(256))
+    email = db.Column(db.String(256), index=True)
     phone_number = db.Column(db.String(64))
     source = db.Column(db.String(256))
     staff_contact = db.Column(db.String(64))
     notes = db.Column(db.String(5024))
-    status = db.Column(db.Enum(Status))
+    status = db.Column(db.Enum(Status), index=True)
     term_id = db.Column(db.Integer, db.ForeignKey('terms.id'))
     term = db.relationship('Term', back_populates='candidates')
     amount_donated = db.Column(db.Integer)
@@ -41,6 +45,15 @@ class Candidate(db.Model):
     def __repr__(self):
         return '<Candidate \'{} {}\'>'.format(self.first_name, self.last_name)
 
+    @hybrid_property
+    def sort_name(self):
+        """Last name used to order participant listings ('' if missing)."""
+        return self.last_name or ''
+
+    @sort_name.expression
+    def sort_name(cls):
+        return func.coalesce(cls.last_name, literal_column("''"))
+
     def status_name(self):
         if Status.PENDING == self.status:
             return 'Pending'
@@ -52,98 +65,116 @@ class Candidate(db.Model):
             return 'None'
 
     @staticmethod
-    def race_stats(term_id):
-        results = {}
-        results["BLACK"] = Candidate.query.join(Candidate.demographic).filter(Demographic.race == Race.BLACK).filter(Candidate.term_id == term_id).count()
-        results["WHITE"] = Candidate.query.join(Candidate.demographic).filter(Demographic.race == Race.WHITE).filter(Candidate.term_id == term_id).count()
-        results["ASIAN"] = Candidate.query.join(Candidate.demographic).filter(Demographic.race == Race.ASIAN).filter(Candidate.term_id == term_id).count()
-        results["LATINX"] = Candidate.query.join(Candidate.demographic).filter(Demographic.race == Race.LATINX).filter(Candidate.term_id == term_id).count()
-        results["NATIVE_AMERICAN"] = Candidate.query.join(Candidate.demographic).filter(Demographic.race == Race.NATIVE_AMERICAN).filter(Candidate.term_id == term_id).count()
-        results["MULTI_RACIAL"] = Candidate.query.join(Candidate.demographic).filter(Demographic.race == Race.MULTI_RACIAL).filter(Candidate.term_id == term_id).count()
-        results["NOT_SPECIFIED"] = Candidate.query.join(Candidate.demographic).filter(Demographic.race == Race.NOT_SPECIFIED).filter(Candidate.term_id == term_id).count()
+    @stats_cache.memoize('term')
+    def demographic_stats(term_id):
+        """
+        Count the candidates of a term in every demographic bucket.
+
+        All four breakdowns come out of a single GROUP BY over
+        candidates JOIN demographics; buckets nobody falls into are
+        zero-filled. Returns a dict keyed by demographic column name
+        (see DEMOGRAPHIC_DIMENSIONS), e.g. results['race']['BLACK'].
+        """
+        columns = [getattr(Demographic, name)
+                   for name, _ in DEMOGRAPHIC_DIMENSIONS]
+        rows = db.session.query(*(columns + [func.count(Candidate.id)])) \
+            .select_from(Candidate) \
+            .join(Candidate.demographic) \
+            .filter(Candidate.term_id == term_id) \
+            .group_by(*columns) \
+            .all()
+
+        results = {name: Demographic.empty_buckets(enum_cls)
+                   for name, enum_cls in DEMOGRAPHIC_DIMENSIONS}
+        for row in rows:
+            count = row[-1]
+            for (name, _), value in zip(DEMOGRAPHIC_DIMENSIONS, row[:-1]):
+                if value is not None:
+                    results[name][value.name] += count
         return results
 
+    @staticmethod
+    def race_stats(term_id):
+        return Candidate.demographic_stats(term_id)['race']
+
     @staticmethod
     def class_stats(term_id):
-        results = {}
-        results["LOW"] = Candidate.query.join(Candidate.demographic).filter(Demographic.soc_class == Class.LOW).filter(Candidate.term_id == term_id).count()
-        results["MIDDLE"] = Candidate.query.join(Candidate.demographic).filter(Demographic.soc_class == Class.MIDDLE).filter(Candidate.term_id == term_id).count()
-        results["UPPER"] = Candidate.query.join(Candidate.demographic).filter(Demographic.soc_class == Class.UPPER).filter(Candidate.term_id == term_id).count()
-        results["NOT_SPECIFIED"] = Candidate.query.join(Candidate.demographic).filter(Demographic.soc_class == Class.NOT_SPECIFIED).filter(Candidate.term_id == term_id).count()
-        return results
+        return Candidate.demographic_stats(term_id)['soc_class']
 
     @staticmethod
     def gender_stats(term_id):
-        results = {}
-        results["WOMAN"] = Candidate.query.join(Candidate.demographic).filter(Demographic.gender == Gender.WOMAN).filter(Candidate.term_id == term_id).count()
-        results["MAN"] = Candidate.query.join(Candidate.demographic).filter(Demographic.gender == Gender.MAN).filter(Candidate.term_id == term_id).count()
-        results["NON_BINARY"] = Candidate.query.join(Candidate.demographic).filter(Demographic.gender == Gender.NON_BINARY).filter(Candidate.term_id == term_id).count()
-        results["TRANSGENDER"] = Candidate.query.join(Candidate.demographic).filter(Demographic.gender == Gender.TRANSGENDER).filter(Candidate.term_id == term_id).count()
-        results["NOT_SPECIFIED"] = Candidate.query.join(Candidate.demographic).filter(Demographic.gender == Gender.NOT_SPECIFIED).filter(Candidate.term_id == term_id).count()
-        return results
+        return Candidate.demographic_stats(term_id)['gender']
 
     @staticmethod
     def sexual_orientation_stats(term_id):
-        results = {}
-        results["LGBTQ"] = Candidate.query.join(Candidate.demographic).filter(Demographic.sexual_orientation == SexualOrientation.LGBTQ).filter(Candidate.term_id == term_id).count()
-        results["STRAIGHT"] = Candidate.query.join(Candidate.demographic).filter(Demographic.sexual_orientation == SexualOrientation.STRAIGHT).filter(Candidate.term_id == term_id).count()
-        results["NOT_SPECIFIED"] = Candidate.query.join(Candidate.demographic).filter(Demographic.sexual_orientation == SexualOrientation.NOT_SPECIFIED).filter(Candidate.term_id == term_id).count()
-        return results
+        return Candidate.demographic_stats(term_id)['sexual_orientation']
 
     @staticmethod
+    @stats_cache.memoize('term')
     def cohort_stats(term_id):
-        results = {}
-        results["amount_donated"] = 0
-        results["total_donations"] = 0
-        results["donor_count"] = 0
-        results["total_pledges"] = 0
-
-        candidates = Candidate.query.filter(Candidate.term_id == term_id)
-
-        # Gets the total amount donated by cohort participants
-        for candidate in candidates:
-            results["amount_donated"] += candidate.amount_donated
-
-        # Gets the donors associated with all participants in this term
-        # TODO check if in candidates list donors
-
-        donors = Donor.query.all() #filter(Candidate.term_id == term_id)
-        resultDonors = []
-        for donor in donors:
-            if (donor.user.candidate.term_id == term_id):
-                resultDonors.append(donor)
-
-        for donor in resultDonors:
-            results["donor_count"] += 1
-            results["total_donations"] += donor.amount_received
-            if donor.status == DonorStatus.PLEDGED:
-                results["total_pledges"] += 1
+        """
+        Fundraising totals for the participants of a term.
+
+        Computed in one statement: the candidates' own donations come from
+        a scalar subquery and the donor totals from donors joined through
+        their participant's user account to the candidate's term.
+        """
+        term_candidates = aliased(Candidate)
+        amount_donated = db.session.query(
+            func.coalesce(func.sum(term_candidates.amount_donated), 0)) \
+            .filter(term_candidates.term_id == term_id) \
+            .as_scalar()
+        pledged = case([(Donor.status == DonorStatus.PLEDGED, 1)], else_=0)
+
+        row = db.session.query(
+            amount_donated,
+            func.coalesce(func.sum(Donor.amount_received), 0),
+            func.count(Donor.id),
+            func.coalesce(func.sum(pledged), 0)) \
+            .select_from(Donor) \
+            .join(User, Donor.user_id == User.id) \
+            .join(Candidate, User.candidate_id == Candidate.id) \
+            .filter(Candidate.term_id == term_id) \
+            .one()
 
+        results = {}
+        results["amount_donated"] = row[0]
+        results["total_donations"] = row[1]
+        results["donor_count"] = row[2]
+        results["total_pledges"] = row[3]
         return results
 
     # For individual participant's statistics
+    @stats_cache.memoize('participant')
     def participant_stats(self):
-        results = {}
-        results["donor_count"] = 0
-        results["todo_count"] = 0
-        results["asking_count"] = 0
-        results["pledged_count"] = 0
-        results["completed_count"] = 0
-        results["total_donations"] = 0
-
-        # Gets the donors associated with participant
-        donors = Donor.query.filter(Donor.user_id == self.user_account.id)
-
-        for donor in donors:
-            results["donor_count"] += 1
-            if (donor.status == DonorStatus.TODO):
-                results["todo_count"] += 1
-            elif (donor.status == DonorStatus.ASKING):
-                results["asking_count"] += 1
-            elif (donor.status == DonorStatus.PLEDGED):
-                results["pledged_count"] += 1
-            elif (donor.status == DonorStatus.COMPLETED):
-                results["completed_count"] += 1
-                results["total_donations"] += donor.amount_received
+        """Donor counts by status and donations received, in one query."""
+        def count(status):
+            return func.coalesce(
+                func.sum(case([(Donor.status == status, 1)], else_=0)), 0)
+
+        received = case([(Donor.status == DonorStatus.COMPLETED,
+                          Donor.amount_received)], else_=0)
+        row = db.session.query(
+            func.count(Donor.id),
+            count(DonorStatus.TODO),
+            count(DonorStatus.ASKING),
+            count(DonorStatus.PLEDGED),
+            count(DonorStatus.COMPLETED),
+            func.coalesce(func.sum(received), 0)) \
+            .filter(Donor.user_id == self.user_account.id) \
+            .one()
 
+        results = {}
+        results["donor_count"] = row[0]
+        results["todo_count"] = row[1]
+        results["asking_count"] = row[2]
+        results["pledged_count"] = row[3]
+        results["completed_count"] = row[4]
+        results["total_donations"] = row[5]
         return results
+
+
+# Backs the keyset-paginated participant listing, ordered by (sort_name, id)
+db.Index('ix_candidates_sort_name_id', Candidate.sort_name, Candidate.id)
+# A term's participants, alone or by status (also serves term_id lookups)
+db.Index('ix_candidates_term_id_status', Candidate.term_id, Candidate.status)
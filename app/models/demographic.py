@@ -60,6 +60,15 @@ class SexualOrientation(enum.Enum):
             if data.value == value:
                 return data.name.replace('_', ' ')
 
+# Demographic columns paired with the enum each one stores, in the order
+# the statistics views present them.
+DEMOGRAPHIC_DIMENSIONS = (
+    ('race', Race),
+    ('soc_class', Class),
+    ('gender', Gender),
+    ('sexual_orientation', SexualOrientation),
+)
+
 class Demographic(db.Model):
     __tablename__ = 'demographics'
     id = db.Column(db.Integer, primary_key=True)
@@ -89,3 +98,24 @@ class Demographic(db.Model):
             demo_dict[key].remove('Not Specified')
 
         return demo_dict
+
+    @staticmethod
+    def filter_choices():
+        """
+        (column, label, [(enum name, display name)]) for each demographic,
+        as offered by the listing filters. 'NOT_SPECIFIED' is left out.
+        """
+        labels = {'race': 'Race', 'soc_class': 'Class', 'gender': 'Gender',
+                  'sexual_orientation': 'Sexual Orientation'}
+        return [(name, labels[name],
+                 [(m.name, 'LGBTQ' if m.name == 'LGBTQ'
+                   else m.name.replace('_', ' ').title())
+                  for m in enum_cls if m.name != 'NOT_SPECIFIED'])
+                for name, enum_cls in DEMOGRAPHIC_DIMENSIONS]
+
+    @staticmethod
+    def empty_buckets(enum_cls):
+        """Zero counts for every member of `enum_cls`, 'NOT_SPECIFIED' last."""
+        buckets = {m.name: 0 for m in enum_cls if m.name != 'NOT_SPECIFIED'}
+        buckets['NOT_SPECIFIED'] = 0
+        return buckets
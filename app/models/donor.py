@@ -1,4 +1,8 @@
 import enum
+
+from sqlalchemy import func, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
+
 from .. import db
 
 
@@ -17,7 +21,7 @@ class Donor(db.Model):
     __tablename__ = 'donors'
     id = db.Column(db.Integer, primary_key=True)
 
-    status = db.Column(db.Enum(DonorStatus))
+    status = db.Column(db.Enum(DonorStatus), index=True)
     contact_date = db.Column(db.Date)
 
     first_name = db.Column(db.String(64))
@@ -47,7 +51,8 @@ class Donor(db.Model):
     want_to_learn_about_brf_guarantees = db.Column(db.Boolean)
     interested_in_volunteering = db.Column(db.Boolean)
 
-    demographic_id = db.Column(db.Integer, db.ForeignKey('demographics.id'))
+    demographic_id = db.Column(db.Integer, db.ForeignKey('demographics.id'),
+                               index=True)
     demographic = db.relationship('Demographic', back_populates='donor')
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
@@ -58,6 +63,15 @@ class Donor(db.Model):
     def __repr__(self):
         return '<Donor \'{} {}\'>'.format(self.first_name, self.last_name)
 
+    @hybrid_property
+    def sort_name(self):
+        """Last name used to order donor listings ('' if missing)."""
+        return self.last_name or ''
+
+    @sort_name.expression
+    def sort_name(cls):
+        return func.coalesce(cls.last_name, literal_column("''"))
+
     def get_status(self):
         return DonorStatus.toString(self.status.value)
 
@@ -66,3 +80,9 @@ class Donor(db.Model):
 
     def status_name(self):
         return str(self.status).split('.')[1].title()
+
+
+# Backs the keyset-paginated donor listing, ordered by (sort_name, id)
+db.Index('ix_donors_sort_name_id', Donor.sort_name, Donor.id)
+# A participant's donors, alone or by status (also serves user_id lookups)
+db.Index('ix_donors_user_id_status', Donor.user_id, Donor.status)
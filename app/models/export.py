@@ -0,0 +1,22 @@
+import datetime
+
+from .. import db
+
+
+class ExportChunk(db.Model):
+    """
+    A piece of the gzipped CSV file an export job wrote, in order of id.
+
+    Export jobs run on the RQ worker while downloads are served by the web
+    processes, which on Heroku are separate dynos with their own disks, so
+    the files are kept in the database both can reach.
+    """
+    __tablename__ = 'export_chunks'
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), index=True)
+    created = db.Column(db.DateTime, default=datetime.datetime.utcnow,
+                        index=True)
+    data = db.Column(db.LargeBinary)
+
+    def __repr__(self):
+        return '<ExportChunk {} #{}>'.format(self.job_id, self.id)
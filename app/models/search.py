@@ -0,0 +1,284 @@
+import re
+
+from sqlalchemy import DDL, event, or_, text
+from sqlalchemy.exc import OperationalError
+
+from .. import db
+from .candidate import Candidate
+from .donor import Donor
+
+# Searchable record types. On SQLite a record's position in this tuple is
+# folded into its rowid, so only ever append to it.
+SEARCH_KINDS = ('candidate', 'donor')
+SEARCH_MODELS = {'candidate': Candidate, 'donor': Donor}
+
+# Indexed columns and their bm25 weights on SQLite; Postgres ranks the
+# same groups with tsvector weights A (name), B (contact) and C (the rest)
+SEARCH_COLUMNS = (('name', 10.0), ('email', 4.0), ('phone', 4.0),
+                  ('notes', 1.0), ('place', 2.0))
+
+# Model attributes each record type contributes to its search document
+SEARCH_FIELDS = {
+    'candidate': ('first_name', 'last_name', 'email', 'phone_number',
+                  'notes'),
+    'donor': ('first_name', 'last_name', 'email', 'phone_number', 'notes',
+              'city', 'zipcode'),
+}
+
+_SQLITE_DDL = [
+    DDL('CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5('
+        '{}, prefix=\'2 3\')'.format(', '.join(c for c, _ in SEARCH_COLUMNS)))
+]
+_POSTGRES_DDL = [
+    DDL('CREATE TABLE IF NOT EXISTS search_index ('
+        'kind VARCHAR(16) NOT NULL, ref_id INTEGER NOT NULL, '
+        'document TSVECTOR NOT NULL, PRIMARY KEY (kind, ref_id))'),
+    DDL('CREATE INDEX IF NOT EXISTS ix_search_index_document '
+        'ON search_index USING GIN (document)'),
+]
+_DROP = DDL('DROP TABLE IF EXISTS search_index')
+
+# Whether the SQLite library has FTS5; probed on first use
+_sqlite_fts5 = None
+
+
+def _fts5(bind):
+    global _sqlite_fts5
+    if _sqlite_fts5 is None:
+        try:
+            bind.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+            bind.execute('DROP TABLE temp.fts5_probe')
+            _sqlite_fts5 = True
+        except OperationalError:
+            _sqlite_fts5 = False
+    return _sqlite_fts5
+
+
+def _sqlite_fts5_ddl(ddl, target, bind, **kwargs):
+    return _fts5(bind)
+
+
+for _ddl in _SQLITE_DDL:
+    event.listen(db.metadata, 'after_create',
+                 _ddl.execute_if(dialect='sqlite', callable_=_sqlite_fts5_ddl))
+for _ddl in _POSTGRES_DDL:
+    event.listen(db.metadata, 'after_create',
+                 _ddl.execute_if(dialect='postgresql'))
+event.listen(db.metadata, 'before_drop',
+             _DROP.execute_if(dialect=('sqlite', 'postgresql')))
+
+
+def _words(*values):
+    """The words in `values`, space separated, ignoring punctuation."""
+    return ' '.join(w for value in values if value
+                    for w in re.findall(r'\w+', value))
+
+
+class SearchIndex(object):
+    """
+    Full-text index over candidates and donors: names, emails, phone
+    numbers, notes, city and zipcode.
+
+    SQLite keeps it in an FTS5 virtual table whose rowid encodes the record
+    type and id; Postgres keeps a tsvector per record in a table with a GIN
+    index. Other databases, and SQLite builds without FTS5, have no index
+    and search with LIKE instead. Either way the search_index table is written in the same
+    transaction as the record itself, from the ORM flush events below, so
+    every insert, update and delete of a Candidate or Donor keeps it in
+    sync. Bulk writes that skip the ORM must call index_records themselves.
+    """
+
+    @staticmethod
+    def supported(bind):
+        if bind.dialect.name == 'sqlite':
+            return _fts5(bind)
+        return bind.dialect.name == 'postgresql'
+
+    @staticmethod
+    def document(kind, record):
+        """The column values indexed for a record."""
+        get = lambda name: getattr(record, name, None)
+        phone = get('phone_number')
+        return {
+            'name': _words(get('first_name'), get('last_name')),
+            'email': _words(get('email')),
+            # Index the bare digits too so '2155551234' finds 215-555-1234
+            'phone': _words(phone, re.sub(r'\D', '', phone or '')),
+            'notes': _words(get('notes')),
+            'place': _words(get('city'), get('zipcode')),
+        }
+
+    @staticmethod
+    def _rowid(kind, ref_id):
+        return ref_id * len(SEARCH_KINDS) + SEARCH_KINDS.index(kind)
+
+    @staticmethod
+    def index_records(bind, kind, records):
+        """Add or replace the index entries for `records` of one kind."""
+        if not records or not SearchIndex.supported(bind):
+            return
+        rows = []
+        for record in records:
+            row = SearchIndex.document(kind, record)
+            row.update(kind=kind, ref_id=record.id,
+                       rowid=SearchIndex._rowid(kind, record.id))
+            rows.append(row)
+        if bind.dialect.name == 'sqlite':
+            columns = ', '.join(c for c, _ in SEARCH_COLUMNS)
+            values = ', '.join(':' + c for c, _ in SEARCH_COLUMNS)
+            statement = text(
+                'INSERT OR REPLACE INTO search_index (rowid, {}) '
+                'VALUES (:rowid, {})'.format(columns, values))
+        else:
+            statement = text(
+                'INSERT INTO search_index (kind, ref_id, document) VALUES '
+                '(:kind, :ref_id, '
+                "setweight(to_tsvector('simple', :name), 'A') || "
+                "setweight(to_tsvector('simple', :email || ' ' || :phone), "
+                "'B') || "
+                "setweight(to_tsvector('simple', :notes || ' ' || :place), "
+                "'C')) "
+                'ON CONFLICT (kind, ref_id) '
+                'DO UPDATE SET document = EXCLUDED.document')
+        bind.execute(statement, rows)
+
+    @staticmethod
+    def remove_record(bind, kind, ref_id):
+        if not SearchIndex.supported(bind):
+            return
+        if bind.dialect.name == 'sqlite':
+            bind.execute(text('DELETE FROM search_index WHERE rowid = :rowid'),
+                         rowid=SearchIndex._rowid(kind, ref_id))
+        else:
+            bind.execute(text('DELETE FROM search_index '
+                              'WHERE kind = :kind AND ref_id = :ref_id'),
+                         kind=kind, ref_id=ref_id)
+
+    @staticmethod
+    def rebuild(chunk_size=1000):
+        """Recreate the index from every candidate and donor."""
+        bind = db.session.connection()
+        _DROP.execute_if(dialect=('sqlite', 'postgresql'))(
+            db.metadata, bind)
+        for ddl in _SQLITE_DDL:
+            ddl.execute_if(dialect='sqlite', callable_=_sqlite_fts5_ddl)(
+                db.metadata, bind)
+        for ddl in _POSTGRES_DDL:
+            ddl.execute_if(dialect='postgresql')(db.metadata, bind)
+
+        count = 0
+        for kind in SEARCH_KINDS:
+            model = SEARCH_MODELS[kind]
+            columns = [getattr(model, f) for f in ('id', ) + SEARCH_FIELDS[kind]]
+            last_id = 0
+            while True:
+                records = db.session.query(*columns) \
+                    .filter(model.id > last_id) \
+                    .order_by(model.id) \
+                    .limit(chunk_size).all()
+                if not records:
+                    break
+                SearchIndex.index_records(bind, kind, records)
+                count += len(records)
+                last_id = records[-1].id
+        db.session.commit()
+        return count
+
+    @staticmethod
+    def search(query, kind=None, page=1, per_page=20):
+        """
+        Best matches first for `query`, optionally only of one kind. Every
+        word of the query has to match the start of an indexed word; a
+        single word under three letters only matches names and contact
+        details.
+        Returns ([(kind, id, score)], whether there is a next page).
+        """
+        bind = db.session.connection()
+        words = re.findall(r'\w+', query.lower())[:8]
+        if not words:
+            return [], False
+        if not SearchIndex.supported(bind):
+            return SearchIndex._search_columns(words, kind, page, per_page)
+        params = {'limit': per_page + 1, 'offset': (page - 1) * per_page}
+        # A one or two letter prefix matches a large share of all words;
+        # only look it up in names and contact details
+        short = len(words) == 1 and len(words[0]) < 3
+
+        if bind.dialect.name == 'sqlite':
+            params['match'] = ' '.join('"{}"*'.format(w) for w in words)
+            if short:
+                params['match'] = '{name email phone}: ' + params['match']
+            where = ''
+            if kind is not None:
+                where = 'AND rowid % :kinds = :kind_index'
+                params.update(kinds=len(SEARCH_KINDS),
+                              kind_index=SEARCH_KINDS.index(kind))
+            weights = ', '.join(str(w) for _, w in SEARCH_COLUMNS)
+            rows = bind.execute(text(
+                'SELECT rowid, bm25(search_index, {}) AS score '
+                'FROM search_index WHERE search_index MATCH :match {} '
+                'ORDER BY score, rowid LIMIT :limit OFFSET :offset'.format(
+                    weights, where)), **params).fetchall()
+            results = [(SEARCH_KINDS[rowid % len(SEARCH_KINDS)],
+                        rowid // len(SEARCH_KINDS), -score)
+                       for rowid, score in rows]
+        else:
+            params['match'] = ' & '.join(
+                '{}:*{}'.format(w, 'AB' if short else '') for w in words)
+            where = ''
+            if kind is not None:
+                where = 'AND kind = :kind'
+                params['kind'] = kind
+            rows = bind.execute(text(
+                'SELECT kind, ref_id, ts_rank(document, query) AS score '
+                "FROM search_index, to_tsquery('simple', :match) query "
+                'WHERE document @@ query {} '
+                'ORDER BY score DESC, kind, ref_id '
+                'LIMIT :limit OFFSET :offset'.format(where)),
+                **params).fetchall()
+            results = [(k, ref_id, score) for k, ref_id, score in rows]
+        return results[:per_page], len(results) > per_page
+
+    @staticmethod
+    def _search_columns(words, kind, page, per_page):
+        """
+        search() without an index: records with every word somewhere in
+        their searched fields, candidates then donors, by id, unranked.
+        """
+        end = page * per_page + 1
+        results = []
+        for match_kind in (kind, ) if kind is not None else SEARCH_KINDS:
+            model = SEARCH_MODELS[match_kind]
+            fields = [getattr(model, f) for f in SEARCH_FIELDS[match_kind]]
+            query = db.session.query(model.id)
+            for word in words:
+                query = query.filter(or_(*[f.ilike('%{}%'.format(word))
+                                           for f in fields]))
+            results.extend((match_kind, ref_id, 0.0) for ref_id, in
+                           query.order_by(model.id).limit(end))
+        results = results[(page - 1) * per_page:end]
+        return results[:per_page], len(results) > per_page
+
+
+def _changed(record, fields):
+    state = db.inspect(record)
+    return any(state.attrs[f].history.has_changes() for f in fields)
+
+
+def _listen(kind, model):
+    @event.listens_for(model, 'after_insert')
+    def after_insert(mapper, connection, target):
+        SearchIndex.index_records(connection, kind, [target])
+
+    @event.listens_for(model, 'after_update')
+    def after_update(mapper, connection, target):
+        if _changed(target, SEARCH_FIELDS[kind]):
+            SearchIndex.index_records(connection, kind, [target])
+
+    @event.listens_for(model, 'after_delete')
+    def after_delete(mapper, connection, target):
+        SearchIndex.remove_record(connection, kind, target.id)
+
+
+for _kind, _model in SEARCH_MODELS.items():
+    _listen(_kind, _model)
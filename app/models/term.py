@@ -12,8 +12,8 @@ class Term(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), unique=True)
     in_progress = db.Column(db.Boolean, default=True)
-    start_date = db.Column(db.Date)
-    end_date = db.Column(db.Date)
+    start_date = db.Column(db.Date, index=True)
+    end_date = db.Column(db.Date, index=True)
     candidates = db.relationship('Candidate', uselist=True, back_populates='term')
 
     def __repr__(self):
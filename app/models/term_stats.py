@@ -0,0 +1,228 @@
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+
+from .. import db, stats_cache
+from ..charts import prerender_on_commit
+from .candidate import Candidate
+from .demographic import DEMOGRAPHIC_DIMENSIONS, Demographic
+from .donor import Donor, DonorStatus
+from .term import Term
+
+# Fundraising totals kept under the 'cohort' dimension, in the order
+# Candidate.cohort_stats reports them.
+COHORT_STATS = ('amount_donated', 'total_donations', 'donor_count',
+                'total_pledges')
+
+
+class TermStats(db.Model):
+    """
+    Running statistics for a term, one counter per row.
+
+    A row holds the value for (term, dimension, bucket): the demographic
+    dimensions count candidates per enum member and the 'cohort' dimension
+    holds the fundraising totals. Write paths retract a record's old
+    contribution and apply its new one in the same transaction as the
+    change itself, so dashboards read a few dozen rows per term no matter
+    how much history there is.
+
+    New terms are seeded when they are created. A term without any rows
+    (one older than this table) is built from a full recompute the first
+    time it is read, or by `manage.py rebuild_term_stats`. The ('meta',
+    'version') row is bumped by every change to the term's statistics.
+    """
+    __tablename__ = 'term_stats'
+    __table_args__ = (db.UniqueConstraint('term_id', 'dimension', 'bucket'), )
+    id = db.Column(db.Integer, primary_key=True)
+    term_id = db.Column(db.Integer, db.ForeignKey('terms.id'), index=True)
+    dimension = db.Column(db.String(64))
+    bucket = db.Column(db.String(64))
+    value = db.Column(db.Integer, default=0)
+
+    def __repr__(self):
+        return '<TermStats {} {}.{}={}>'.format(self.term_id, self.dimension,
+                                                self.bucket, self.value)
+
+    @staticmethod
+    def empty():
+        """Zero-filled statistics in the shape returned by for_term."""
+        results = {name: Demographic.empty_buckets(enum_cls)
+                   for name, enum_cls in DEMOGRAPHIC_DIMENSIONS}
+        results['cohort'] = {name: 0 for name in COHORT_STATS}
+        return results
+
+    @staticmethod
+    def recompute(term_id):
+        """Compute a term's statistics from the raw candidate/donor rows."""
+        results = Candidate.demographic_stats.uncached(term_id)
+        results['cohort'] = Candidate.cohort_stats.uncached(term_id)
+        return results
+
+    @staticmethod
+    @stats_cache.memoize('term')
+    def for_term(term_id):
+        """
+        Statistics for a term, keyed by dimension and then bucket, e.g.
+        results['race']['BLACK'] or results['cohort']['donor_count'].
+        None if there is no such term.
+        """
+        rows = TermStats.query.filter_by(term_id=term_id).all()
+        if not rows:
+            if Term.query.get(term_id) is None:
+                return None
+            TermStats.seed(term_id)
+            rows = TermStats.query.filter_by(term_id=term_id).all()
+
+        results = TermStats.empty()
+        for row in rows:
+            if row.dimension != 'meta':
+                results.setdefault(row.dimension, {})[row.bucket] = row.value
+        return results
+
+    @staticmethod
+    def version(term_id):
+        """
+        A number that changes whenever the term's statistics do, or None
+        if there is no such term.
+        """
+        row = TermStats.query.filter_by(
+            term_id=term_id, dimension='meta', bucket='version').first()
+        if row is None:
+            if Term.query.get(term_id) is None:
+                return None
+            TermStats.seed(term_id)
+            return TermStats.version(term_id)
+        return row.value
+
+    @staticmethod
+    def seed(term_id):
+        """
+        Build the rows of a term that has none. Two requests can both find
+        the term empty; the one that loses the race on the unique
+        constraint rolls back and keeps the other's rows. Deleted terms
+        get no rows.
+        """
+        if Term.query.get(term_id) is None:
+            return
+        try:
+            TermStats.rebuild_term(term_id)
+        except IntegrityError:
+            db.session.rollback()
+
+    @staticmethod
+    def rebuild_term(term_id):
+        """Replace a term's rows with a full recompute and return it."""
+        results = TermStats.recompute(term_id)
+        version = TermStats.query.filter_by(
+            term_id=term_id, dimension='meta', bucket='version').first()
+        version = version.value + 1 if version is not None else 1
+        TermStats.query.filter_by(term_id=term_id).delete()
+        for dimension, buckets in results.items():
+            for bucket, value in buckets.items():
+                db.session.add(TermStats(term_id=term_id, dimension=dimension,
+                                         bucket=bucket, value=value))
+        db.session.add(TermStats(term_id=term_id, dimension='meta',
+                                 bucket='version', value=version))
+        TermStats.invalidate(term_id)
+        db.session.commit()
+        return results
+
+    @staticmethod
+    def verify(term_id):
+        """
+        Compare a term's stored rows against a full recompute. Returns a
+        list of (dimension, bucket, stored, expected) for every mismatch.
+        """
+        stored = {(row.dimension, row.bucket): row.value
+                  for row in TermStats.query.filter_by(term_id=term_id)}
+        mismatches = []
+        for dimension, buckets in TermStats.recompute(term_id).items():
+            for bucket, expected in buckets.items():
+                value = stored.get((dimension, bucket))
+                if value != expected:
+                    mismatches.append((dimension, bucket, value, expected))
+        return mismatches
+
+    @staticmethod
+    def invalidate(term_id=None, candidate_id=None):
+        """Drop cached statistics for a term and/or participant on commit."""
+        session = db.session()
+        TermStats.bump(term_id, 'meta', 'version', 1)
+        stats_cache.invalidate_on_commit(session, 'term', term_id)
+        stats_cache.invalidate_on_commit(session, 'participant', candidate_id)
+        prerender_on_commit(term_id)
+
+    @staticmethod
+    def bump(term_id, dimension, bucket, delta):
+        """
+        Add `delta` to one counter. Terms that have not been seeded are
+        left alone; their first read recomputes them from scratch.
+        """
+        if term_id is None or not delta:
+            return
+        TermStats.query.filter_by(
+            term_id=term_id, dimension=dimension, bucket=bucket).update(
+                {TermStats.value: TermStats.value + delta},
+                synchronize_session=False)
+
+    @staticmethod
+    def record_donor(donor, sign=1):
+        """
+        Apply (sign=1) or retract (sign=-1) a donor's contribution to its
+        participant's term. Retract before changing the donor and apply
+        again afterwards.
+        """
+        db.session.flush()
+        user = donor.user
+        candidate = user.candidate if user is not None else None
+        if candidate is None:
+            return
+        term_id = candidate.term_id
+        TermStats.invalidate(term_id, candidate.id)
+        pledged = 1 if donor.status == DonorStatus.PLEDGED else 0
+        TermStats.bump(term_id, 'cohort', 'donor_count', sign)
+        TermStats.bump(term_id, 'cohort', 'total_donations',
+                       sign * (donor.amount_received or 0))
+        TermStats.bump(term_id, 'cohort', 'total_pledges', sign * pledged)
+
+    @staticmethod
+    def record_participant_donors(user, term_id, sign=1):
+        """Apply or retract all of a participant's donors at once."""
+        if user is None or term_id is None:
+            return
+        TermStats.invalidate(term_id, user.candidate_id)
+        pledged = case([(Donor.status == DonorStatus.PLEDGED, 1)], else_=0)
+        count, received, pledges = db.session.query(
+            func.count(Donor.id),
+            func.coalesce(func.sum(Donor.amount_received), 0),
+            func.coalesce(func.sum(pledged), 0)) \
+            .filter(Donor.user_id == user.id) \
+            .one()
+        TermStats.bump(term_id, 'cohort', 'donor_count', sign * count)
+        TermStats.bump(term_id, 'cohort', 'total_donations', sign * received)
+        TermStats.bump(term_id, 'cohort', 'total_pledges', sign * pledges)
+
+    @staticmethod
+    def record_candidate(candidate, sign=1):
+        """
+        Apply (sign=1) or retract (sign=-1) a candidate's contribution to
+        its term: its demographic buckets, its own donation and the donors
+        of its participant account. Retract before editing the candidate
+        or moving it to another term and apply again afterwards.
+        """
+        db.session.flush()  # sync term_id with a reassigned `term`
+        term_id = candidate.term_id
+        TermStats.invalidate(term_id, candidate.id)
+        if term_id is None:
+            return
+        demographic = candidate.demographic
+        if demographic is not None:
+            for name, _ in DEMOGRAPHIC_DIMENSIONS:
+                # Forms assign enum names; loaded rows hold enum members
+                value = getattr(demographic, name)
+                if value is not None:
+                    TermStats.bump(term_id, name, getattr(value, 'name', value),
+                                   sign)
+        TermStats.bump(term_id, 'cohort', 'amount_donated',
+                       sign * (candidate.amount_donated or 0))
+        TermStats.record_participant_donors(candidate.user_account, term_id,
+                                            sign)
@@ -1,11 +1,17 @@
+import json
+
 from flask import current_app
-from flask_login import AnonymousUserMixin, UserMixin
+from flask_login import AnonymousUserMixin, UserMixin, user_logged_in
 from itsdangerous import TimedJSONWebSignatureSerializer as Serializer
 from itsdangerous import BadSignature, SignatureExpired
 from werkzeug.security import check_password_hash, generate_password_hash
 
-from .. import db, login_manager
+from .. import db, login_manager, stats_cache
+from ..cache import run_on_commit
+from sqlalchemy import event
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
+from sqlalchemy.orm import joinedload, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
 
 
 class Permission:
@@ -54,8 +60,8 @@ class User(UserMixin, db.Model):
     last_name = db.Column(db.String(64), index=True)
     email = db.Column(db.String(64), unique=True, index=True)
     password_hash = db.Column(db.String(128))
-    role_id = db.Column(db.Integer, db.ForeignKey('roles.id'))
-    candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id'))
+    role_id = db.Column(db.Integer, db.ForeignKey('roles.id'), index=True)
+    candidate_id = db.Column(db.Integer, db.ForeignKey('candidates.id'), index=True)
     candidate = db.relationship('Candidate', back_populates='user_account')
 
     donors = db.relationship("Donor", back_populates="user")
@@ -96,6 +102,12 @@ class User(UserMixin, db.Model):
         s = Serializer(current_app.config['SECRET_KEY'], expiration)
         return s.dumps({'confirm': self.id})
 
+    @staticmethod
+    def generate_confirmation_tokens(users, expiration=604800):
+        """Confirmation tokens for several users, by user id."""
+        s = Serializer(current_app.config['SECRET_KEY'], expiration)
+        return {user.id: s.dumps({'confirm': user.id}) for user in users}
+
     def generate_email_change_token(self, new_email, expiration=3600):
         """Generate an email change token to email an existing user."""
         s = Serializer(current_app.config['SECRET_KEY'], expiration)
@@ -155,6 +167,15 @@ class User(UserMixin, db.Model):
         db.session.commit()
         return True
 
+    @staticmethod
+    def with_permissions(permissions):
+        """
+        Query for the users whose role grants `permissions`, matched in SQL
+        against the roles table instead of loading each user's role.
+        """
+        return User.query.join(User.role).filter(
+            Role.permissions.op('&')(permissions) == permissions)
+
     @staticmethod
     def generate_fake(count=100, **kwargs):
         """Generate a number of fake users for testing."""
@@ -195,7 +216,97 @@ class AnonymousUser(AnonymousUserMixin):
 
 login_manager.anonymous_user = AnonymousUser
 
+# Columns of a signed in user and their role kept in the identity cache:
+# everything the permission checks, navigation and confirmation check read
+IDENTITY_COLUMNS = {
+    User: ('id', 'first_name', 'last_name', 'email', 'confirmed', 'role_id',
+           'candidate_id'),
+    Role: ('id', 'name', 'index', 'default', 'permissions'),
+}
+
+
+def _identity_key(user_id):
+    return 'identity:{}'.format(user_id)
+
+
+def _cached_instance(model, values):
+    """
+    Put a row known from the cache into the session without querying it.
+    The instance is persistent, so columns left out of the cache and
+    relationships still load on first access.
+    """
+    instance = model.__mapper__.class_manager.new_instance()
+    for key, value in values.items():
+        setattr(instance, key, value)
+    make_transient_to_detached(instance)
+    return db.session.merge(instance, load=False)
+
+
+def remember_identity(user):
+    """
+    Cache the columns of a user and their role that load_user needs. Only
+    Redis holds identities: a worker's local fallback would not see
+    another worker demote or delete the user.
+    """
+    identity = {
+        model.__name__.lower(): instance and {
+            column: getattr(instance, column)
+            for column in IDENTITY_COLUMNS[model]}
+        for model, instance in ((User, user), (Role, user.role))}
+    stats_cache.set_blob(_identity_key(user.id), json.dumps(identity).encode(),
+                         current_app.config['IDENTITY_CACHE_TTL'], shared=True)
+
+
+def forget_identity(user_id):
+    """Drop a user's cached identity."""
+    stats_cache.delete_blob(_identity_key(user_id))
+
+
+def forget_identities():
+    """Drop every cached identity, e.g. once a role's permissions change."""
+    stats_cache.delete_blobs(_identity_key('*'))
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    """
+    The signed in user, from the identity cache when it holds them. A hit
+    runs no SQL: the user and their role are put straight into the session
+    and the role is attached, so `current_user.can()` does not load it.
+    While Redis is down every request loads the user.
+    """
+    key = _identity_key(int(user_id))
+    cached = stats_cache.get_blob(key, shared=True)
+    if cached is not None:
+        identity = json.loads(cached.decode())
+        user = _cached_instance(User, identity['user'])
+        if identity['role'] is not None:
+            set_committed_value(user, 'role',
+                                _cached_instance(Role, identity['role']))
+        return user
+
+    user = User.query.options(joinedload(User.role)).get(int(user_id))
+    if user is not None:
+        remember_identity(user)
+    return user
+
+
+@user_logged_in.connect
+def _logged_in(app, user):
+    # The password check has just loaded the user, so the next request hits
+    remember_identity(user)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _user_changed(mapper, connection, target):
+    # Covers role and email changes, confirmation and deletion alike; on
+    # commit, so a concurrent request cannot re-cache the old row
+    run_on_commit(db.session(), forget_identity, target.id)
+
+
+@event.listens_for(Role, 'after_update')
+@event.listens_for(Role, 'after_delete')
+def _role_changed(mapper, connection, target):
+    # Every user cached with the role holds its old permissions
+    run_on_commit(db.session(), forget_identities)
@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+
+from flask import current_app
+from flask_rq import get_queue
+from redis.exceptions import RedisError
+from sqlalchemy.orm import joinedload
+
+from . import stats_cache
+from .email import send_emails
+from .jobs import job_context
+from .models import Candidate, Permission, User
+
+
+def _new_candidate(candidate_id, add_method):
+    candidate = Candidate.query.get(candidate_id)
+    if candidate is None:  # deleted before the job ran
+        return None
+    return {'candidate': candidate, 'add_method': add_method}
+
+
+def _new_candidates(events):
+    ids = [event['candidate_id'] for event in events]
+    candidates = {c.id: c for c in Candidate.query.filter(
+        Candidate.id.in_(ids))}
+    return [{'candidate': candidates[event['candidate_id']],
+             'add_method': event['add_method']}
+            for event in events if event['candidate_id'] in candidates]
+
+
+# Emails sent to every admin: the subject, the template and a function
+# loading the template's arguments from the ids and values the job carries
+ADMIN_NOTIFICATIONS = {
+    'new_candidate': ('New Giving Project Candidate',
+                      'admin/email/new_candidate', _new_candidate),
+}
+
+# Notifications that can be batched into a digest when ADMIN_DIGEST_MINUTES
+# is set: the subject (given the number of events), the template (given
+# `events`) and a function loading the template arguments of many events
+ADMIN_DIGESTS = {
+    'new_candidate': ('{} New Giving Project Candidates',
+                      'admin/email/new_candidate_digest', _new_candidates),
+}
+
+
+def _digest_key(notification):
+    return 'digest:{}'.format(notification)
+
+
+def notify_admins(notification, **kwargs):
+    """
+    Email every admin about `notification`. `kwargs` are its loader's
+    arguments: ids and short strings rather than ORM objects, so jobs are
+    small and read current rows when they run.
+
+    Normally this queues one job sending the emails, or sends them right
+    away if the queue is unreachable. In digest mode the event is added to
+    the notification's digest in Redis instead; the first event after a
+    quiet window sends its digest straight away, later ones wait for the
+    end of the window (see schedule_admin_digests) and a digest reaching
+    ADMIN_DIGEST_MAX_EVENTS events is sent at once.
+    """
+    if not _buffer_event(notification, kwargs):
+        _enqueue(send_admin_notification, notification, **kwargs)
+
+
+def _buffer_event(notification, event):
+    """Add an event to its digest; False if it has to be sent now."""
+    minutes = current_app.config['ADMIN_DIGEST_MINUTES']
+    client = stats_cache.redis()
+    if not minutes or notification not in ADMIN_DIGESTS or client is None:
+        return False
+    key = _digest_key(notification)
+    try:
+        size = client.rpush(key, json.dumps(event))
+        # The first event of a window sends the digest so far; the others
+        # wait for send_admin_digests or the first event of the next window
+        window = client.set(key + ':window', 1, nx=True, ex=minutes * 60)
+        if window or size >= current_app.config['ADMIN_DIGEST_MAX_EVENTS']:
+            _enqueue(send_admin_digest, notification)
+        return True
+    except RedisError:
+        return False
+
+
+def _enqueue(f, *args, **kwargs):
+    """Queue the job `f`, or run it now if the queue is unreachable."""
+    try:
+        get_queue().enqueue(f, *args, **kwargs)
+        return
+    except RedisError:
+        current_app.logger.warning('Could not queue %s for %s, running it '
+                                   'now', f.__name__, args[0])
+    try:
+        f(*args, **kwargs)
+    except Exception:
+        current_app.logger.exception('%s for %s failed', f.__name__, args[0])
+
+
+def _admins():
+    return User.with_permissions(Permission.ADMINISTER) \
+        .options(joinedload(User.role)).all()
+
+
+def send_admin_notification(notification, **kwargs):
+    """RQ job: email every admin about `notification` in one SMTP session."""
+    subject, template, load = ADMIN_NOTIFICATIONS[notification]
+    with job_context():
+        context = load(**kwargs)
+        if context is None:
+            return
+        send_emails([dict(context, recipient=admin.email, subject=subject,
+                          template=template, user=admin)
+                     for admin in _admins()])
+
+
+def send_admin_digest(notification):
+    """
+    RQ job: take every event buffered for `notification` and email each
+    admin one summary of them.
+    """
+    with job_context():
+        client = stats_cache.redis()
+        if client is None:
+            return
+        key = _digest_key(notification)
+        events, _ = client.pipeline().lrange(key, 0, -1).delete(key).execute()
+        send_digest_emails(notification,
+                           [json.loads(event.decode()) for event in events])
+
+
+def send_digest_emails(notification, events):
+    """Email every admin one summary of `events` in one SMTP session."""
+    subject, template, load = ADMIN_DIGESTS[notification]
+    contexts = load(events) if events else []
+    if not contexts:
+        return
+    send_emails([{'recipient': admin.email,
+                  'subject': subject.format(len(contexts)),
+                  'template': template, 'user': admin, 'events': contexts}
+                 for admin in _admins()])
+
+
+def send_admin_digests():
+    """Queue the digest of every notification with buffered events."""
+    client = stats_cache.redis()
+    if client is None:
+        return
+    for notification in ADMIN_DIGESTS:
+        if client.llen(_digest_key(notification)):
+            _enqueue(send_admin_digest, notification)
+
+
+def schedule_admin_digests(app):
+    """
+    Start a daemon thread queueing the digests of `app` every
+    ADMIN_DIGEST_MINUTES, so buffered events are sent even when no later
+    event arrives. The worker runs it; returns the thread, or None if
+    digests are off.
+    """
+    minutes = app.config['ADMIN_DIGEST_MINUTES']
+    if not minutes:
+        return None
+
+    def run():
+        while True:
+            time.sleep(minutes * 60)
+            with app.app_context():
+                try:
+                    send_admin_digests()
+                except RedisError:
+                    app.logger.warning('Could not queue the admin digests')
+
+    thread = threading.Thread(target=run, name='admin-digests', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,74 @@
+import base64
+import json
+
+from flask import abort
+from sqlalchemy import and_, or_
+
+# JSON values a cursor may hold; anything else is not a sort key
+CURSOR_VALUES = (str, int, float, bool, type(None))
+
+
+def encode_cursor(values):
+    """An opaque cursor for a row's sort key values."""
+    raw = json.dumps(list(values), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, length):
+    """Sort key values from encode_cursor; aborts with 400 if malformed."""
+    try:
+        values = json.loads(
+            base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except ValueError:
+        abort(400)
+    if not isinstance(values, list) or len(values) != length or \
+            not all(isinstance(v, CURSOR_VALUES) for v in values):
+        abort(400)
+    return values
+
+
+def _comparable(column, value):
+    """Whether a cursor value has the Python type of `column`'s values."""
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return True
+    if value is None:
+        return True
+    if isinstance(value, bool) and python_type is not bool:
+        return False
+    return isinstance(value, python_type) or \
+        (python_type is float and isinstance(value, int))
+
+
+def after(columns, values):
+    """
+    Filter for rows that come strictly after `values` in ascending order of
+    `columns`, spelled out with AND/OR so it works without row-value
+    comparisons.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*(equal + [column > values[i]])))
+    return or_(*clauses)
+
+
+def keyset_page(query, columns, key, cursor=None, limit=50):
+    """
+    Fetch one page of `query` ordered by `columns` (ascending, the last one
+    unique) that starts after `cursor`. `key(row)` returns a row's values
+    for `columns`. Returns (rows, cursor for the next page or None).
+
+    Unlike OFFSET, every page costs the same however deep it is.
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(columns))
+        if not all(_comparable(c, v) for c, v in zip(columns, values)):
+            abort(400)
+        query = query.filter(after(columns, values))
+    rows = query.order_by(*columns).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(key(rows[-1]))
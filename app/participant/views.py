@@ -1,12 +1,13 @@
 import datetime
 from flask import abort, flash, redirect, render_template, url_for, request
 from flask_login import current_user, login_required
+from sqlalchemy.orm import joinedload
 
 from .forms import NewDonorForm, TodoToAsking, AskingToPledged, PledgedToCompleted
 from ..decorators import admin_required
 from . import participant
 from .. import db
-from ..models import Donor, Demographic, DonorStatus, Candidate, User
+from ..models import Donor, Demographic, DonorStatus, Candidate, User, TermStats
 
 
 @participant.route('/<int:part_id>/')
@@ -18,14 +19,17 @@ def index(part_id):
         if not current_user.is_admin():
             return abort(403)
 
-        user = User.query.filter_by(id=part_id).first()
+        user = User.query.get_or_404(part_id)
 
     """Participant dashboard page."""
-    donors_by_status = {
-        status.name: Donor.query.filter_by(
-            user_id=user.id, status=status).all()
-        for status in DonorStatus
-    }
+    # Fetch the donors once and bucket them by status
+    donors = Donor.query.filter_by(user_id=user.id) \
+        .options(joinedload(Donor.demographic)) \
+        .order_by(Donor.id).all()
+    donors_by_status = {status.name: [] for status in DonorStatus}
+    for d in donors:
+        if d.status is not None:
+            donors_by_status[d.status.name].append(d)
 
     def datestring(s):
         return s.strftime('%b %d')
@@ -34,7 +38,7 @@ def index(part_id):
         return s.strftime('%b %d, %Y')
 
     forms_by_donor = {}
-    for d in Donor.query.filter_by(user_id=user.id).all():
+    for d in donors:
         f = None
         if d.status == DonorStatus.TODO:
             f = TodoToAsking(donor=d.id)
@@ -62,18 +66,6 @@ def index(part_id):
 @login_required
 def profile():
     """Participant Profile page."""
-    asking_donors = Donor.query.filter_by(
-        user_id=current_user.id, status=1).all()
-    pledged_donors = Donor.query.filter_by(
-        user_id=current_user.id, status=2).all()
-    completed_donors = Donor.query.filter_by(
-        user_id=current_user.id, status=3).all()
-    todo_donors = Donor.query.filter_by(
-        user_id=current_user.id, status=0).all()
-
-    num_donors = len(completed_donors)
-    num_asks = len(asking_donors) + len(pledged_donors) + len(completed_donors)
-
     ind_pledged = 0
     is_candidate = False
     term_participants = []
@@ -83,7 +75,7 @@ def profile():
 
 
     if current_user.candidate is not None and current_user.candidate.term_id is not None:
-        cohort_stats = Candidate.cohort_stats(current_user.candidate.term_id)
+        cohort_stats = TermStats.for_term(current_user.candidate.term_id)['cohort']
         participant_stats = current_user.candidate.participant_stats()
         amt_donated = current_user.candidate.amount_donated
     else:
@@ -136,11 +128,13 @@ def todo_to_asking(donor_id):
 
     f = TodoToAsking()
     if f.validate_on_submit():
+        TermStats.record_donor(d, -1)
         d.status = DonorStatus(int(f.status.data))
         d.date_asking = f.date_asking.data
         d.amount_asking_for = f.amount_asking_for.data
         d.how_asking = f.how_asking.data
         db.session.add(d)
+        TermStats.record_donor(d)
         db.session.commit()
         flash('Successfully moved donor %s to %s.' % (d.first_name, d.status.name.lower()), 'success')
     else:
@@ -163,10 +157,12 @@ def asking_to_pledged(donor_id):
 
     f = AskingToPledged()
     if f.validate_on_submit():
+        TermStats.record_donor(d, -1)
         d.status = DonorStatus(int(f.status.data))
         d.pledged = f.pledged.data
         d.amount_pledged = f.amount_pledged.data
         db.session.add(d)
+        TermStats.record_donor(d)
         db.session.commit()
         flash('Successfully moved donor %s to %s.' % (d.first_name, d.status.name.lower()), 'success')
     else:
@@ -188,10 +184,12 @@ def pledged_to_completed(donor_id):
 
     f = PledgedToCompleted()
     if f.validate_on_submit():
+        TermStats.record_donor(d, -1)
         d.status = DonorStatus(int(f.status.data))
         d.amount_received = f.amount_received.data
         d.date_received = f.date_received.data
         db.session.add(d)
+        TermStats.record_donor(d)
         db.session.commit()
         flash('Successfully moved donor %s to %s.' % (d.first_name, d.status.name.lower()), 'success')
     else:
@@ -211,6 +209,7 @@ def delete_donor(part_id, donor_id):
     ):
         return abort(403)
 
+    TermStats.record_donor(d, -1)
     db.session.delete(d)
     db.session.commit()
     flash('Successfully deleted donor %s.' % d.first_name, 'success')
@@ -271,6 +270,7 @@ def new_donor(part_id):
             demographic=demographic
         )
         db.session.add(donor)
+        TermStats.record_donor(donor)
         db.session.commit()
         flash('Donor {} successfully created'.format(donor.full_name()),
               'form-success')
@@ -0,0 +1,42 @@
+"""
+Performance benchmarks. Each module can be run on its own, e.g.
+
+    $ python -m benchmarks.cohort_stats
+
+Benchmarks build a throwaway SQLite database, so they never touch the
+development or test databases.
+"""
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from app import create_app, db
+
+
+@contextmanager
+def bench_app():
+    """Yield an app context bound to a fresh, temporary SQLite database."""
+    handle, path = tempfile.mkstemp(suffix='.sqlite')
+    os.close(handle)
+    app = create_app('testing')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    with app.app_context():
+        db.create_all()
+        try:
+            yield app
+        finally:
+            db.session.remove()
+            db.drop_all()
+            os.remove(path)
+
+
+def median_time(fn, repeat=25):
+    """Median wall-clock time of `fn()` in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
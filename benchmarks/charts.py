@@ -0,0 +1,66 @@
+"""
+Chart rendering: matplotlib PNG against the built-in SVG renderer.
+
+Reports the one-off cost a fresh worker pays to import each renderer
+(time and resident memory) and the median time to draw one chart.
+
+    $ python -m benchmarks.charts
+"""
+import subprocess
+import sys
+from collections import OrderedDict
+
+from app.charts import render_png, render_svg
+
+from . import median_time
+
+STATS = OrderedDict([('BLACK', 7), ('WHITE', 3), ('ASIAN', 2), ('LATINX', 0),
+                     ('NATIVE_AMERICAN', 1), ('MULTI_RACIAL', 4),
+                     ('NOT_SPECIFIED', 0)])
+
+# Imports each renderer in a clean interpreter, printing the import time
+# and the growth in resident memory in kilobytes (reads /proc, so Linux)
+IMPORT_PROBE = """
+import time
+def rss():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+before = rss()
+start = time.perf_counter()
+{}
+elapsed = (time.perf_counter() - start) * 1000
+print(elapsed, rss() - before)
+"""
+
+IMPORTS = OrderedDict([
+    ('matplotlib', 'from matplotlib.figure import Figure\n'
+                   'from matplotlib.backends.backend_agg import '
+                   'FigureCanvasAgg'),
+    ('svg', 'import math, textwrap, xml.sax.saxutils'),
+])
+
+
+def import_cost(statement):
+    output = subprocess.check_output(
+        [sys.executable, '-c', IMPORT_PROBE.format(statement)])
+    elapsed, rss = output.split()
+    return float(elapsed), int(rss) / 1024.0
+
+
+def main():
+    print('{:>12} {:>12} {:>12} {:>14}'.format(
+        'renderer', 'import (ms)', 'import (MB)', 'render (ms)'))
+    renderers = {'matplotlib': render_png, 'svg': render_svg}
+    for name, statement in IMPORTS.items():
+        elapsed, rss = import_cost(statement)
+        render = renderers[name]
+        render('Race Statistics', STATS)  # warm up
+        per_chart = median_time(lambda: render('Race Statistics', STATS))
+        print('{:>12} {:>12.1f} {:>12.1f} {:>14.3f}'.format(
+            name, elapsed, rss, per_chart))
+
+
+if __name__ == '__main__':
+    main()
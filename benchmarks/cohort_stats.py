@@ -0,0 +1,70 @@
+"""
+Candidate.cohort_stats latency as the donor table grows across terms.
+
+One term keeps a fixed number of participants and donors while other
+terms are added around it. cohort_stats only touches the measured term's
+rows, so its latency should stay flat as the table grows.
+
+    $ python -m benchmarks.cohort_stats
+"""
+from app import db
+from app.models import Candidate, Demographic, Donor, DonorStatus, Status, \
+    Term, User
+
+from . import bench_app, median_time
+
+PARTICIPANTS_PER_TERM = 20
+DONORS_PER_PARTICIPANT = 25
+TERM_STEPS = (1, 10, 50, 200)
+
+
+def add_term(index):
+    """Insert a term with its participants, users and donors."""
+    term = Term(name='Term {}'.format(index))
+    db.session.add(term)
+    db.session.flush()
+
+    demographic_id = db.session.execute(Demographic.__table__.insert(),
+                                        {'age': 30}).lastrowid
+    statuses = list(DonorStatus)
+    for p in range(PARTICIPANTS_PER_TERM):
+        candidate_id = db.session.execute(Candidate.__table__.insert(), {
+            'first_name': 'Participant',
+            'last_name': str(p),
+            'term_id': term.id,
+            'status': Status.ASSIGNED.name,
+            'amount_donated': 100,
+            'demographic_id': demographic_id,
+        }).lastrowid
+        user_id = db.session.execute(User.__table__.insert(), {
+            'email': 'p{}-{}@example.com'.format(index, p),
+            'candidate_id': candidate_id,
+        }).lastrowid
+        db.session.execute(Donor.__table__.insert(), [{
+            'user_id': user_id,
+            'first_name': 'Donor',
+            'last_name': str(d),
+            'status': statuses[d % len(statuses)].name,
+            'amount_received': 10,
+            'demographic_id': demographic_id,
+        } for d in range(DONORS_PER_PARTICIPANT)])
+    db.session.commit()
+    return term
+
+
+def main():
+    with bench_app():
+        measured = add_term(0)
+        terms = 1
+        print('{:>8} {:>10} {:>14}'.format('terms', 'donors', 'median (ms)'))
+        for step in TERM_STEPS:
+            while terms < step:
+                add_term(terms)
+                terms += 1
+            donors = Donor.query.count()
+            elapsed = median_time(lambda: Candidate.cohort_stats.uncached(measured.id))
+            print('{:>8} {:>10} {:>14.3f}'.format(terms, donors, elapsed))
+
+
+if __name__ == '__main__':
+    main()
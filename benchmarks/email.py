@@ -0,0 +1,96 @@
+"""
+Emails per second from send_email against a local SMTP server.
+
+Compares the old job, which built a new app and opened a new SMTP
+connection for every message, with the worker's shared app and SMTP
+session, one job per email and one job for a batch of emails.
+
+    $ python -m benchmarks.email
+"""
+import asyncore
+import os
+import smtpd
+import threading
+import time
+
+from flask import render_template
+from flask_mail import Message
+
+from app import create_app, mail
+from app.email import mail_session, send_email, send_emails
+from app.jobs import job_context, set_job_app
+from config import config
+
+EMAILS = 200
+
+
+class Server(smtpd.SMTPServer):
+    """Accepts and discards messages, like a fast mail relay."""
+    received = 0
+
+    def process_message(self, *args, **kwargs):
+        Server.received += 1
+
+
+def invite(i):
+    return {'recipient': 'person{}@example.com'.format(i),
+            'subject': 'You Are Invited To Join',
+            'template': 'account/email/invite',
+            'user': {'full_name': lambda: 'Person {}'.format(i)},
+            'invite_link': 'http://localhost/account/join/{}'.format(i)}
+
+
+def old_send_email(recipient, subject, template, **kwargs):
+    """send_email as it was: a new app and SMTP connection per message."""
+    app = create_app('testing')
+    with app.app_context():
+        msg = Message(
+            app.config['EMAIL_SUBJECT_PREFIX'] + ' ' + subject,
+            sender=app.config['EMAIL_SENDER'],
+            recipients=[recipient])
+        msg.body = render_template(template + '.txt', **kwargs)
+        msg.html = render_template(template + '.html', **kwargs)
+        mail.send(msg)
+
+
+def rate(name, fn):
+    Server.received = 0
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    assert Server.received == EMAILS, Server.received
+    print('{:<24} {:>8.1f} emails/s'.format(name, EMAILS / elapsed))
+
+
+def main():
+    server = Server(('127.0.0.1', 0), None)
+    port = server.socket.getsockname()[1]
+    threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.1},
+                     daemon=True).start()
+
+    testing = config['testing']
+    testing.MAIL_SERVER, testing.MAIL_PORT = '127.0.0.1', port
+    testing.MAIL_USE_TLS = testing.MAIL_USE_SSL = False
+    testing.MAIL_SUPPRESS_SEND = False
+    testing.EMAIL_SENDER = 'Admin <admin@example.com>'
+    os.environ['FLASK_CONFIG'] = 'testing'
+
+    rate('new app per email',
+         lambda: [old_send_email(**invite(i)) for i in range(EMAILS)])
+
+    set_job_app(create_app('testing'))
+
+    def one_job_each():
+        for i in range(EMAILS):
+            send_email(**invite(i))
+
+    rate('shared app and session', one_job_each)
+    rate('one batch job',
+         lambda: send_emails([invite(i) for i in range(EMAILS)]))
+
+    with job_context():
+        mail_session().close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+The busiest pages, requested through the test client against a seeded
+database (app.fake_data.generate_dataset). For each one this reports the
+p50 and p95 latency, the SQL statements one request runs and its peak
+Python memory (tracemalloc).
+
+    $ python manage.py bench
+    $ python -m benchmarks.endpoints
+
+A run can be saved as the baseline; later runs then fail when a page is
+slower or needs more memory than its baseline by more than a threshold,
+or runs more statements. Baselines depend on the machine, so they are
+not checked in.
+"""
+import json
+import math
+import os
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from flask import url_for
+from sqlalchemy import event, func
+
+from app import db
+from app.fake_data import generate_dataset
+from app.models import Donor, Role, User
+
+from . import bench_app
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+INTAKE_FORM = {
+    'first_name': 'Jane', 'last_name': 'Doe', 'email': 'jane@example.com',
+    'phone_number': '215-555-0100', 'address': '1 Main St',
+    'pronouns': 'she/her', 'ability': 'n/a', 'how_long_philly': '2 years',
+    'what_neighborhood': 'West Philly', 'how_did_you_hear': 'A friend',
+    'demographic-race': 'ASIAN', 'demographic-soc_class': 'LOW',
+    'demographic-gender': 'WOMAN', 'demographic-sexual_orientation': 'LGBTQ',
+    'demographic-age': 30,
+}
+
+# Metrics compared against the baseline with the regression threshold;
+# statement counts may not grow at all
+TIMED_METRICS = ('p50', 'p95', 'peak_kb')
+
+
+def _cases(term_id):
+    """name -> (who is signed in, method, url, form data)."""
+    return OrderedDict([
+        ('admin.participants',
+         ('admin', 'GET', url_for('admin.participants'), None)),
+        ('admin.all_donors',
+         ('admin', 'GET', url_for('admin.all_donors'), None)),
+        ('admin.download_participants',
+         ('admin', 'GET', url_for('admin.download_participants'), None)),
+        ('admin.download_donors',
+         ('admin', 'GET', url_for('admin.download_donors'), None)),
+        ('admin.make_graph',
+         ('admin', 'GET', url_for('admin.make_graph', term_id=term_id,
+                                  dimension='race'), None)),
+        ('participant.index',
+         ('participant', 'GET', url_for('participant.index'), None)),
+        ('participant.profile',
+         ('participant', 'GET', url_for('participant.profile'), None)),
+        ('main.interested',
+         (None, 'POST', url_for('main.interested'), INTAKE_FORM)),
+    ])
+
+
+def _client(app, email):
+    client = app.test_client()
+    if email is not None:
+        client.post('/account/login',
+                    data={'email': email, 'password': 'password'})
+    return client
+
+
+def _request(client, method, url, data):
+    """Make one request, reading all of a streamed body."""
+    response = client.open(url, method=method, data=data)
+    body = response.get_data()
+    response.close()
+    if response.status_code != 200:
+        raise RuntimeError('{} {} returned {}'.format(
+            method, url, response.status_code))
+    return body
+
+
+def percentile(timings, p):
+    """The nearest-rank `p`th percentile of `timings`."""
+    timings = sorted(timings)
+    return timings[max(int(math.ceil(p / 100.0 * len(timings))) - 1, 0)]
+
+
+def measure(client, method, url, data, repeat):
+    """Latency of `repeat` requests, then statements and memory of one."""
+    _request(client, method, url, data)  # warm up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _request(client, method, url, data)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    statements = []
+
+    def count(*args):
+        statements.append(None)
+
+    event.listen(db.engine, 'after_cursor_execute', count)
+    tracemalloc.start()
+    try:
+        _request(client, method, url, data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        event.remove(db.engine, 'after_cursor_execute', count)
+    return OrderedDict([('p50', percentile(timings, 50)),
+                        ('p95', percentile(timings, 95)),
+                        ('queries', len(statements)),
+                        ('peak_kb', peak / 1024.0)])
+
+
+def run(terms=10, candidates=1000, donors=50000, seed=0, repeat=20):
+    """
+    Seed a throwaway database and measure every page; returns
+    {page: {'p50', 'p95', 'queries', 'peak_kb'}}. The participant pages
+    are those of the participant with the most donors.
+    """
+    with bench_app() as app:
+        Role.insert_roles()
+        db.session.add(User(first_name='Admin', last_name='Account',
+                            email='admin@example.com', password='password',
+                            confirmed=True,
+                            role=Role.query.filter_by(
+                                name='Administrator').first()))
+        db.session.commit()
+        generate_dataset(terms=terms, candidates=candidates, donors=donors,
+                         seed=seed, index_search=False)
+        busiest = User.query.get(
+            db.session.query(Donor.user_id).group_by(Donor.user_id)
+            .order_by(func.count(Donor.id).desc()).limit(1).scalar())
+        clients = {
+            None: _client(app, None),
+            'admin': _client(app, 'admin@example.com'),
+            'participant': _client(app, busiest.email),
+        }
+        with app.test_request_context():
+            cases = _cases(busiest.candidate.term_id)
+        results = OrderedDict()
+        for name, (who, method, url, data) in cases.items():
+            results[name] = measure(clients[who], method, url, data, repeat)
+        return results
+
+
+def report(results):
+    print('{:<30} {:>10} {:>10} {:>8} {:>11}'.format(
+        'page', 'p50 (ms)', 'p95 (ms)', 'queries', 'peak (KB)'))
+    for name, result in results.items():
+        print('{:<30} {:>10.1f} {:>10.1f} {:>8} {:>11.0f}'.format(
+            name, result['p50'], result['p95'], result['queries'],
+            result['peak_kb']))
+
+
+def regressions(results, baseline, threshold):
+    """
+    Messages for every metric worse than `baseline` by more than
+    `threshold` (0.2 is 20%), or any extra statement.
+    """
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            found.append('{}: {} statements, baseline {}'.format(
+                name, result['queries'], before['queries']))
+        for metric in TIMED_METRICS:
+            if result[metric] > before[metric] * (1 + threshold):
+                change = '+{:.0%}'.format(
+                    result[metric] / before[metric] - 1) \
+                    if before[metric] else 'up from 0'
+                found.append('{}: {} {:.1f}, baseline {:.1f} ({})'.format(
+                    name, metric, result[metric], before[metric], change))
+    return found
+
+
+def load_baseline(path, dataset):
+    """The baseline results in `path` for `dataset`, or None if none."""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        saved = json.load(f)
+    if saved['dataset'] != dataset:
+        raise ValueError('The baseline in {} is for {}, not {}; save a new '
+                         'one'.format(path, saved['dataset'], dataset))
+    return saved['results']
+
+
+def save_baseline(path, dataset, results):
+    with open(path, 'w') as f:
+        json.dump({'dataset': dataset, 'results': results}, f, indent=2)
+
+
+def main(terms=10, candidates=1000, donors=50000, seed=0, repeat=20,
+         baseline_path=BASELINE, threshold=0.25, save=False):
+    """Run and report the benchmarks; returns 1 on a regression, else 0."""
+    dataset = OrderedDict([('terms', terms), ('candidates', candidates),
+                           ('donors', donors), ('seed', seed)])
+    results = run(repeat=repeat, **dataset)
+    report(results)
+    if save:
+        save_baseline(baseline_path, dataset, results)
+        print('Saved the baseline to {}.'.format(baseline_path))
+        return 0
+    baseline = load_baseline(baseline_path, dataset)
+    if baseline is None:
+        print('No baseline at {}; save one with --save.'.format(
+            baseline_path))
+        return 0
+    found = regressions(results, baseline, threshold)
+    for message in found:
+        print('REGRESSION ' + message)
+    if not found:
+        print('No regressions over {:.0%} against {}.'.format(
+            threshold, baseline_path))
+    return 1 if found else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,102 @@
+"""
+Donor CSV export: time and peak memory as the donor table grows.
+
+Each export runs in a fresh interpreter against the benchmark database
+and reports the growth in peak resident memory (VmHWM, so Linux only)
+while the whole file is generated. 'stream' and 'gzip' consume the
+streamed chunks as the download does; 'buffered' joins them into one
+string first, for comparison.
+
+    $ python -m benchmarks.export
+"""
+import os
+import subprocess
+import sys
+
+from app import db
+from app.models import Demographic, Donor, DonorStatus, User
+
+from . import bench_app
+
+SIZES = (50000, 200000)
+MODES = ('stream', 'gzip', 'buffered')
+
+PROBE = """
+import sys, time
+from app import create_app, db
+from app.exports import csv_chunks, gzip_chunks
+
+def peak():
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+
+app = create_app('testing')
+app.config['SQLALCHEMY_DATABASE_URI'] = sys.argv[1]
+with app.app_context():
+    db.session.execute('SELECT 1')
+    before = peak()
+    start = time.perf_counter()
+    chunks = csv_chunks('donors')
+    if sys.argv[2] == 'gzip':
+        chunks = gzip_chunks(chunks)
+    if sys.argv[2] == 'buffered':
+        size = len(''.join(chunks))
+    else:
+        size = sum(len(chunk) for chunk in chunks)
+    elapsed = time.perf_counter() - start
+    print(elapsed, size, peak() - before)
+"""
+
+
+def add_donors(n):
+    statuses = list(DonorStatus)
+    demographic_id = db.session.execute(Demographic.__table__.insert(),
+                                        {'age': 30}).lastrowid
+    user_id = db.session.execute(User.__table__.insert(), {
+        'email': 'participant{}@example.com'.format(n)}).lastrowid
+    for start in range(0, n, 10000):
+        db.session.execute(Donor.__table__.insert(), [{
+            'user_id': user_id,
+            'demographic_id': demographic_id,
+            'first_name': 'Donor',
+            'last_name': 'Number {}'.format(start + i),
+            'email': 'donor{}@example.com'.format(start + i),
+            'street_address': '{} Main Street'.format(i),
+            'city': 'Philadelphia',
+            'state': 'PA',
+            'zipcode': '19104',
+            'status': statuses[i % len(statuses)].name,
+            'amount_received': i % 500,
+            'notes': 'Met at the spring fundraiser, follow up in May.',
+        } for i in range(min(10000, n - start))])
+    db.session.commit()
+
+
+def export(uri, mode):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE, uri, mode], cwd=root,
+        stderr=subprocess.DEVNULL)
+    elapsed, size, peak = output.split()[-3:]
+    return float(elapsed), int(size), int(peak) / 1024.0
+
+
+def main():
+    with bench_app() as app:
+        uri = app.config['SQLALCHEMY_DATABASE_URI']
+        donors = 0
+        print('{:>8} {:>10} {:>10} {:>12} {:>14}'.format(
+            'donors', 'mode', 'time (s)', 'size (MB)', 'peak RSS (MB)'))
+        for size in SIZES:
+            add_donors(size - donors)
+            donors = size
+            for mode in MODES:
+                elapsed, length, peak = export(uri, mode)
+                print('{:>8} {:>10} {:>10.2f} {:>12.1f} {:>14.1f}'.format(
+                    donors, mode, elapsed, length / 1e6, peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Bulk CSV import of 10k participants and 10k donors.
+
+Times import_csv on generated files against creating the same records
+the way the admin forms do, one ORM add and commit per record (timed on
+a sample and scaled up). The import should finish in seconds.
+
+    $ python -m benchmarks.imports
+"""
+import csv
+import io
+import random
+import time
+
+from app import db
+from app.imports import import_csv
+from app.models import (Candidate, Class, Demographic, DonorStatus, Gender,
+                        Race, SexualOrientation, Status, Term, TermStats,
+                        User)
+
+from . import bench_app
+
+ROWS = 10000
+SAMPLE = 500
+
+
+def participants_csv(rng):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['First Name', 'Last Name', 'Term', 'Email', 'Phone',
+                     'Notes', 'Status', 'Race', 'Class', 'Gender',
+                     'Sexual Orientation', 'Age'])
+    for i in range(ROWS):
+        writer.writerow([
+            'First{}'.format(i), 'Last{}'.format(i), 'Spring',
+            'person{}@example.com'.format(i), '215-555-{:04d}'.format(i),
+            'Met at the open house.', rng.choice(list(Status)).name.title(),
+            rng.choice(list(Race)).name, rng.choice(list(Class)).name,
+            rng.choice(list(Gender)).name,
+            rng.choice(list(SexualOrientation)).name, rng.randint(18, 80)
+        ])
+    out.seek(0)
+    return out
+
+
+def donors_csv(rng):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(['First Name', 'Last Name', 'Email', 'City', 'Zip',
+                     'Status', 'Amount Received', 'Contact Date',
+                     'Participant Email'])
+    for i in range(ROWS):
+        writer.writerow([
+            'Donor{}'.format(i), 'Last{}'.format(i),
+            'donor{}@example.com'.format(i), 'Philadelphia', '19104',
+            rng.choice(list(DonorStatus)).name, rng.randint(0, 500),
+            '2017-03-{:02d}'.format(rng.randint(1, 28)),
+            'participant{}@example.com'.format(i % 50)
+        ])
+    out.seek(0)
+    return out
+
+
+def one_at_a_time(term):
+    """Seconds per record when created like the new candidate form does."""
+    start = time.perf_counter()
+    for i in range(SAMPLE):
+        candidate = Candidate(first_name='Form{}'.format(i), term=term,
+                              status=Status.PENDING, amount_donated=0,
+                              demographic=Demographic(race=Race.ASIAN))
+        db.session.add(candidate)
+        TermStats.record_candidate(candidate)
+        db.session.commit()
+    return (time.perf_counter() - start) / SAMPLE
+
+
+def main():
+    rng = random.Random(1)
+    with bench_app():
+        term = Term(name='Spring')
+        db.session.add(term)
+        db.session.add_all(
+            User(email='participant{}@example.com'.format(i),
+                 candidate=Candidate(first_name='P', term=term))
+            for i in range(50))
+        db.session.commit()
+        TermStats.for_term(term.id)
+
+        for name, text in [('participants', participants_csv(rng)),
+                           ('donors', donors_csv(rng))]:
+            start = time.perf_counter()
+            imported, errors = import_csv(name, text)
+            elapsed = time.perf_counter() - start
+            print('import {:>12}: {} rows in {:.2f} s ({} errors)'.format(
+                name, imported, elapsed, len(errors)))
+
+        per_record = one_at_a_time(term)
+        print('one form submission at a time: ~{:.0f} s for {} rows'.format(
+            per_record * ROWS, ROWS))
+
+
+if __name__ == '__main__':
+    main()
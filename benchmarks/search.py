@@ -0,0 +1,97 @@
+"""
+Admin search latency over 100k candidates and donors.
+
+Rows are bulk inserted without the ORM, indexed with SearchIndex.rebuild,
+and then a mix of queries (name prefixes, full names, email fragments,
+phone digits, zipcodes) is timed, each with the endpoint's default page
+size. Every query should stay under 50 ms.
+
+    $ python -m benchmarks.search
+"""
+import random
+
+from faker import Faker
+
+from app import db
+from app.models import Candidate, Donor, SearchIndex, User
+
+from . import bench_app, median_time
+
+CANDIDATES = 20000
+DONORS = 80000
+BUDGET_MS = 50
+
+
+def populate(fake):
+    """
+    Insert the candidates, one participant account and the donors, built
+    from pools of fake values (generating 100k of each is slow).
+    """
+    pool = lambda f: [f() for _ in range(2000)]
+    first, last, cities = pool(fake.first_name), pool(fake.last_name), \
+        pool(fake.city)
+    words = pool(fake.word)
+
+    def person(i):
+        first_name, last_name = random.choice(first), random.choice(last)
+        return {
+            'first_name': first_name,
+            'last_name': last_name,
+            'email': '{}.{}{}@example.com'.format(first_name, last_name, i),
+            'phone_number': '{:03d}-555-{:04d}'.format(
+                random.randint(200, 999), random.randint(0, 9999)),
+            'notes': ' '.join(random.sample(words, 6)),
+        }
+
+    db.session.execute(Candidate.__table__.insert(),
+                       [person(i) for i in range(CANDIDATES)])
+    user_id = db.session.execute(User.__table__.insert(), {
+        'email': 'participant@example.com'}).lastrowid
+    donors = []
+    for i in range(DONORS):
+        donor = person(i)
+        donor.update(user_id=user_id, city=random.choice(cities),
+                     zipcode='{:05d}'.format(random.randint(0, 99999)))
+        donors.append(donor)
+    db.session.execute(Donor.__table__.insert(), donors)
+    db.session.commit()
+
+
+def queries(fake):
+    donor = Donor.query.get(DONORS // 2)
+    candidate = Candidate.query.get(CANDIDATES // 2)
+    digits = ''.join(c for c in candidate.phone_number if c.isdigit())
+    return [
+        ('short prefix', 'ma', None),
+        ('first name', fake.first_name(), None),
+        ('full name', '{} {}'.format(donor.first_name, donor.last_name),
+         None),
+        ('email', candidate.email.split('@')[0], None),
+        ('phone digits', digits, None),
+        ('zipcode', donor.zipcode, 'donor'),
+        ('city, donors', donor.city, 'donor'),
+        ('name, candidates', candidate.last_name, 'candidate'),
+    ]
+
+
+def main():
+    fake = Faker()
+    fake.seed(0)
+    random.seed(0)
+    with bench_app():
+        populate(fake)
+        indexed = SearchIndex.rebuild()
+        print('{} records indexed'.format(indexed))
+        print('{:<18} {:>8} {:>14}'.format('query', 'matches',
+                                           'median (ms)'))
+        slowest = 0
+        for label, query, kind in queries(fake):
+            matches = len(SearchIndex.search(query, kind, per_page=1000)[0])
+            elapsed = median_time(lambda: SearchIndex.search(query, kind))
+            slowest = max(slowest, elapsed)
+            print('{:<18} {:>8} {:>14.3f}'.format(label, matches, elapsed))
+        print('slowest: {:.3f} ms ({} ms budget)'.format(slowest, BUDGET_MS))
+
+
+if __name__ == '__main__':
+    main()
@@ -66,6 +66,42 @@ class Config:
     RQ_DEFAULT_PASSWORD = url.password
     RQ_DEFAULT_DB = 0
 
+    # Statistics cache (Redis, with an in-process LRU fallback)
+    STATS_CACHE_REDIS = True
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL') or 300)
+    STATS_CACHE_SIZE = 512
+
+    # How long a signed in user's id, role and confirmation are cached
+    # in Redis between requests; changes to the user or a role drop entries
+    # right away, and without Redis users are loaded on every request
+    IDENTITY_CACHE_TTL = int(os.environ.get('IDENTITY_CACHE_TTL') or 60)
+
+    # Rendered demographic charts, keyed by a hash of their contents
+    CHART_CACHE_TTL = 7 * 24 * 60 * 60
+    CHART_PRERENDER = True
+    CHART_FORMAT = os.environ.get('CHART_FORMAT') or 'png'  # or 'svg'
+
+    # How long the files export jobs write (kept in the database) last
+    EXPORT_TTL = 24 * 60 * 60
+    EXPORT_JOB_TIMEOUT = 60 * 60
+
+    # How long the progress background jobs report is kept
+    JOB_PROGRESS_TTL = 24 * 60 * 60
+
+    # Batch admin notifications into one digest email per this many minutes
+    # (0 emails every event as it happens); the worker sends the digests on
+    # this schedule, and any digest of ADMIN_DIGEST_MAX_EVENTS at once
+    ADMIN_DIGEST_MINUTES = int(os.environ.get('ADMIN_DIGEST_MINUTES') or 0)
+    ADMIN_DIGEST_MAX_EVENTS = int(
+        os.environ.get('ADMIN_DIGEST_MAX_EVENTS') or 50)
+
+    # Per-request SQL statement counts and timings in the X-DB-* response
+    # headers, for a sample of requests; statements repeated more than
+    # SQL_REPEAT_THRESHOLD times in one request are logged as likely N+1s
+    SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION') == 'True'
+    SQL_SAMPLE_RATE = float(os.environ.get('SQL_SAMPLE_RATE') or 0.05)
+    SQL_REPEAT_THRESHOLD = int(os.environ.get('SQL_REPEAT_THRESHOLD') or 5)
+
     @staticmethod
     def init_app(app):
         pass
@@ -84,6 +120,8 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('TEST_DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'data-test.sqlite')
     WTF_CSRF_ENABLED = False
+    STATS_CACHE_REDIS = False
+    CHART_PRERENDER = False
 
 
 class ProductionConfig(Config):
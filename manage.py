@@ -6,10 +6,13 @@ from config import Config
 from flask_migrate import Migrate, MigrateCommand
 from flask_script import Manager, Shell
 from redis import Redis
-from rq import Connection, Queue, Worker
+from rq import Connection, Queue
 
 from app import create_app, db
-from app.models import Role, User
+from app.jobs import AppWorker, set_job_app
+from app.models import Role, SearchIndex, Term, TermStats, User
+from app.notifications import (schedule_admin_digests,
+                               send_admin_digests as queue_admin_digests)
 
 
 app = create_app(os.getenv('FLASK_CONFIG') or 'default')
@@ -59,6 +62,91 @@ def add_fake_data(number_users):
     User.generate_fake(count=number_users)
 
 
+@manager.option('-t', '--terms', default=20, type=int)
+@manager.option('-c', '--candidates', default=5000, type=int)
+@manager.option('-d', '--donors', default=500000, type=int)
+@manager.option('-s', '--seed', default=0, type=int,
+                help='The same seed gives the same data')
+@manager.option('--skip-search-index', action='store_true', default=False,
+                help='Leave the rows out of search until '
+                     'rebuild_search_index runs; about twice as fast')
+def add_scale_data(terms, candidates, donors, seed, skip_search_index):
+    """
+    Adds a production-sized set of terms, candidates, participants and
+    donors, e.g. to reproduce performance problems.
+    """
+    from app.fake_data import generate_dataset
+    counts = generate_dataset(terms=terms, candidates=candidates,
+                              donors=donors, seed=seed,
+                              index_search=not skip_search_index)
+    print('Added {} terms, {} candidates, {} participants and {} donors.'
+          .format(*counts))
+
+
+@manager.option(
+    '-c',
+    '--check',
+    action='store_true',
+    default=False,
+    help='Only compare the stored statistics against a full recompute',
+    dest='check_only')
+def rebuild_term_stats(check_only):
+    """
+    Rebuilds the per-term statistics table from scratch and verifies it
+    against a full recompute.
+    """
+    drifted = 0
+    for term in Term.query.order_by(Term.start_date).all():
+        if not check_only:
+            TermStats.rebuild_term(term.id)
+        mismatches = TermStats.verify(term.id)
+        for dimension, bucket, stored, expected in mismatches:
+            print('{}: {}.{} is {}, expected {}'.format(
+                term.name, dimension, bucket, stored, expected))
+        drifted += bool(mismatches)
+    print('{} term(s) checked, {} out of date.'.format(
+        Term.query.count(), drifted))
+
+
+@manager.command
+def rebuild_search_index():
+    """Recreates the full-text search index over candidates and donors."""
+    print('{} record(s) indexed.'.format(SearchIndex.rebuild()))
+
+
+@manager.command
+def send_admin_digests():
+    """Queues the admin notification digests with events waiting."""
+    queue_admin_digests()
+
+
+@manager.option('-t', '--terms', default=10, type=int)
+@manager.option('-c', '--candidates', default=1000, type=int)
+@manager.option('-d', '--donors', default=50000, type=int)
+@manager.option('-s', '--seed', default=0, type=int)
+@manager.option('-r', '--repeat', default=20, type=int,
+                help='Timed requests per page')
+@manager.option('-b', '--baseline', default=None, dest='baseline_path',
+                help='Baseline file (default benchmarks/baseline.json)')
+@manager.option('--threshold', default=0.25, type=float,
+                help='Fail when a page is this much (0.25 is 25%%) slower '
+                     'or larger than its baseline')
+@manager.option('--save', action='store_true', default=False,
+                help='Save the results as the new baseline')
+def bench(terms, candidates, donors, seed, repeat, baseline_path, threshold,
+          save):
+    """
+    Times the busiest pages against a throwaway seeded database and
+    compares them with the saved baseline.
+    """
+    # Imported here so the web process does not load the benchmarks
+    from benchmarks import endpoints
+    return endpoints.main(terms=terms, candidates=candidates, donors=donors,
+                          seed=seed, repeat=repeat,
+                          baseline_path=baseline_path or endpoints.BASELINE,
+                          threshold=threshold, save=save)
+
+
 @manager.command
 def setup_dev():
     """Runs the set-up needed for local development."""
@@ -100,7 +188,9 @@ def run_worker():
         password=app.config['RQ_DEFAULT_PASSWORD'])
 
     with Connection(conn):
-        worker = Worker(map(Queue, listen))
+        set_job_app(app)
+        schedule_admin_digests(app)
+        worker = AppWorker(map(Queue, listen))
         worker.work()
 
 
@@ -0,0 +1,132 @@
+"""Index the filter columns, add the term stats and search tables
+
+Revision ID: 3e8a94b27bb4
+Revises:
+Create Date: 2026-10-18 10:12:31.402117
+
+The first migration: databases so far were made with `recreate_db`, so
+depending on when that ran some of these indexes and tables already exist.
+Each one is only created if it is missing, and running this against a fresh
+`recreate_db` database is a no-op.
+
+The term_stats rollup fills itself in as terms are read. The search_index
+table starts empty, so run `manage.py rebuild_search_index` after upgrading.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3e8a94b27bb4'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# users.candidate_id and the composites led by donors.user_id and
+# candidates.term_id are the joins Candidate.cohort_stats runs through; the
+# models indexed them before there were migrations, so databases older than
+# that only get them here
+INDEXES = [
+    ('ix_candidates_email', 'candidates', ['email']),
+    ('ix_candidates_status', 'candidates', ['status']),
+    ('ix_candidates_term_id_status', 'candidates', ['term_id', 'status']),
+    ('ix_donors_demographic_id', 'donors', ['demographic_id']),
+    ('ix_donors_status', 'donors', ['status']),
+    ('ix_donors_user_id_status', 'donors', ['user_id', 'status']),
+    ('ix_terms_end_date', 'terms', ['end_date']),
+    ('ix_terms_start_date', 'terms', ['start_date']),
+    ('ix_users_candidate_id', 'users', ['candidate_id']),
+    ('ix_users_role_id', 'users', ['role_id']),
+]
+
+# Keyset pagination orders by coalesce(last_name, ''), id. SQLite does not
+# report expression indexes, hence IF [NOT] EXISTS rather than _existing
+EXPRESSION_INDEXES = [
+    ('ix_candidates_sort_name_id', 'candidates'),
+    ('ix_donors_sort_name_id', 'donors'),
+]
+
+# Single column indexes made redundant by the composites above
+REPLACED = [
+    ('ix_candidates_term_id', 'candidates', ['term_id']),
+    ('ix_donors_user_id', 'donors', ['user_id']),
+]
+
+
+# The full-text index: an FTS5 table on SQLite, a tsvector table with a GIN
+# index on Postgres (see app/models/search.py)
+SEARCH_INDEX_DDL = {
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "name, email, phone, notes, place, prefix='2 3')",
+    ],
+    'postgresql': [
+        'CREATE TABLE IF NOT EXISTS search_index ('
+        'kind VARCHAR(16) NOT NULL, ref_id INTEGER NOT NULL, '
+        'document TSVECTOR NOT NULL, PRIMARY KEY (kind, ref_id))',
+        'CREATE INDEX IF NOT EXISTS ix_search_index_document '
+        'ON search_index USING GIN (document)',
+    ],
+}
+
+
+def _tables():
+    return set(sa.inspect(op.get_bind()).get_table_names())
+
+
+def _search_index_ddl():
+    bind = op.get_bind()
+    if bind.dialect.name == 'sqlite':
+        # SQLite builds without FTS5 search with LIKE and have no index
+        try:
+            bind.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+            bind.execute('DROP TABLE temp.fts5_probe')
+        except sa.exc.OperationalError:
+            return []
+    return SEARCH_INDEX_DDL.get(bind.dialect.name, [])
+
+
+def _existing(table):
+    return {index['name'] for index in
+            sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    if 'term_stats' not in _tables():
+        op.create_table(
+            'term_stats',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('term_id', sa.Integer(), nullable=True),
+            sa.Column('dimension', sa.String(length=64), nullable=True),
+            sa.Column('bucket', sa.String(length=64), nullable=True),
+            sa.Column('value', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['term_id'], ['terms.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('term_id', 'dimension', 'bucket'))
+        op.create_index('ix_term_stats_term_id', 'term_stats', ['term_id'])
+    for statement in _search_index_ddl():
+        op.execute(statement)
+    for name, table, columns in INDEXES:
+        if name not in _existing(table):
+            op.create_index(name, table, columns)
+    for name, table in EXPRESSION_INDEXES:
+        op.execute("CREATE INDEX IF NOT EXISTS {} ON {} "
+                   "(coalesce(last_name, ''), id)".format(name, table))
+    for name, table, _ in REPLACED:
+        if name in _existing(table):
+            op.drop_index(name, table_name=table)
+
+
+def downgrade():
+    for name, table, columns in REPLACED:
+        if name not in _existing(table):
+            op.create_index(name, table, columns)
+    for name, _ in EXPRESSION_INDEXES:
+        op.execute('DROP INDEX IF EXISTS {}'.format(name))
+    for name, table, _ in INDEXES:
+        if name in _existing(table):
+            op.drop_index(name, table_name=table)
+    if op.get_bind().dialect.name in SEARCH_INDEX_DDL:
+        op.execute('DROP TABLE IF EXISTS search_index')
+    if 'term_stats' in _tables():
+        op.drop_table('term_stats')
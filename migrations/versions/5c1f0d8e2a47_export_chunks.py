@@ -0,0 +1,38 @@
+"""Keep export files in the database
+
+Revision ID: 5c1f0d8e2a47
+Revises: 3e8a94b27bb4
+Create Date: 2026-10-18 18:05:12.528310
+
+Export jobs used to write their files to the worker's disk, which the web
+processes serving the downloads cannot read on separate dynos.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c1f0d8e2a47'
+down_revision = '3e8a94b27bb4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'export_chunks' in sa.inspect(op.get_bind()).get_table_names():
+        return  # made by recreate_db
+    op.create_table(
+        'export_chunks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.String(length=32), nullable=True),
+        sa.Column('created', sa.DateTime(), nullable=True),
+        sa.Column('data', sa.LargeBinary(), nullable=True),
+        sa.PrimaryKeyConstraint('id'))
+    op.create_index('ix_export_chunks_job_id', 'export_chunks', ['job_id'])
+    op.create_index('ix_export_chunks_created', 'export_chunks', ['created'])
+
+
+def downgrade():
+    op.drop_index('ix_export_chunks_created', table_name='export_chunks')
+    op.drop_index('ix_export_chunks_job_id', table_name='export_chunks')
+    op.drop_table('export_chunks')
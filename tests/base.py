@@ -0,0 +1,58 @@
+import unittest
+
+from app import create_app, db, stats_cache
+from app.models import Role, User
+
+
+class AppTestCase(unittest.TestCase):
+    """
+    Runs each test in the app context of a new testing app, with freshly
+    created tables and an empty statistics cache.
+    """
+
+    def create_app(self):
+        return create_app('testing')
+
+    def setUp(self):
+        self.app = self.create_app()
+        self.app_context = self.app.app_context()
+        self.app_context.push()
+        db.create_all()
+        stats_cache.clear()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.app_context.pop()
+
+    def add_admin(self):
+        """Add the roles and the ADMIN_EMAIL account, password 'password'."""
+        Role.insert_roles()
+        admin = User(
+            first_name='Admin',
+            last_name='Account',
+            email=self.app.config['ADMIN_EMAIL'],
+            password='password',
+            confirmed=True,
+            role=Role.query.filter_by(permissions=0xff).first())
+        db.session.add(admin)
+        db.session.commit()
+        return admin
+
+    def login(self, email=None, password='password'):
+        """A test client signed in as `email`, by default the admin."""
+        client = self.app.test_client()
+        client.post('/account/login', data={
+            'email': email or self.app.config['ADMIN_EMAIL'],
+            'password': password
+        })
+        return client
+
+
+class AdminTestCase(AppTestCase):
+    """An AppTestCase with `self.client` signed in as the admin."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = self.add_admin()
+        self.client = self.login()
@@ -0,0 +1,26 @@
+from fnmatch import fnmatchcase
+
+
+class FakeRedis(object):
+    """
+    The few StrictRedis commands the identity cache uses, kept in a dict.
+    Expiry is not simulated.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    def ping(self):
+        return True
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def scan_iter(self, match='*', count=None):
+        return [key for key in list(self.data) if fnmatchcase(key, match)]
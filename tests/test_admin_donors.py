@@ -0,0 +1,104 @@
+import re
+
+from app import db
+from app.models import (Candidate, Class, Demographic, Donor, DonorStatus,
+                        Gender, Race, SexualOrientation, Status, Term, User)
+from base import AdminTestCase
+from query_counter import count_queries
+
+
+class AdminDonorsTestCase(AdminTestCase):
+    def setUp(self):
+        super().setUp()
+        self.participants = []
+        for i, name in enumerate(['Spring', 'Fall']):
+            candidate = Candidate(first_name='P', last_name=str(i),
+                                  term=Term(name=name),
+                                  status=Status.ASSIGNED)
+            user = User(first_name='P', last_name=str(i),
+                        email='p{}@example.com'.format(i),
+                        candidate=candidate)
+            db.session.add(user)
+            self.participants.append(user)
+        db.session.commit()
+
+    def add_donors(self, n, user, status=DonorStatus.ASKING,
+                   race=Race.ASIAN):
+        for i in range(n):
+            db.session.add(Donor(
+                first_name='Donor',
+                last_name='Name{:03d}'.format(i),
+                status=status,
+                user=user,
+                demographic=Demographic(
+                    race=race,
+                    soc_class=Class.MIDDLE,
+                    gender=Gender.WOMAN,
+                    sexual_orientation=SexualOrientation.LGBTQ,
+                    age=40)))
+        db.session.commit()
+
+    def get(self, **params):
+        response = self.client.get('/admin/all-donors', query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return response.data.decode('utf-8')
+
+    def names(self, html):
+        return re.findall(r'<div class="partname">Donor (\w+)</div>', html)
+
+    def test_query_count_bounded_by_page(self):
+        self.add_donors(3, self.participants[0])
+        db.session.expire_all()
+        with count_queries(db.engine) as few:
+            self.get()
+        self.add_donors(40, self.participants[1])
+        db.session.expire_all()
+        with count_queries(db.engine) as many:
+            self.get(limit=10)
+        self.assertEqual(len(many), len(few))
+
+    def test_pages_in_last_name_order(self):
+        self.add_donors(7, self.participants[0])
+        html = self.get(limit=3, participant=self.participants[0].id)
+        self.assertNotIn('First page', html)
+        seen = self.names(html)
+        while True:
+            match = re.search(r'href="([^"]*cursor=[^"]*)">Next page', html)
+            if match is None:
+                break
+            # Following the link keeps the page size and filters
+            url = match.group(1).replace('&amp;', '&')
+            self.assertIn('limit=3', url)
+            html = self.client.get(url).data.decode('utf-8')
+            self.assertIn('First page', html)
+            seen.extend(self.names(html))
+        self.assertEqual(seen, ['Name{:03d}'.format(i) for i in range(7)])
+
+    def test_filters(self):
+        spring, fall = self.participants
+        self.add_donors(2, spring, status=DonorStatus.PLEDGED)
+        self.add_donors(3, spring, race=Race.BLACK)
+        self.add_donors(4, fall)
+
+        self.assertEqual(len(self.names(self.get())), 9)
+        self.assertEqual(len(self.names(self.get(participant=fall.id))), 4)
+        self.assertEqual(len(self.names(self.get(status='PLEDGED'))), 2)
+        self.assertEqual(
+            len(self.names(self.get(term_id=spring.candidate.term_id))), 5)
+        self.assertEqual(len(self.names(self.get(race='BLACK'))), 3)
+        self.assertEqual(
+            len(self.names(self.get(term_id=spring.candidate.term_id,
+                                    race='ASIAN'))), 2)
+        response = self.client.get('/admin/all-donors',
+                                   query_string={'status': 'LOST'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_participant_choices_from_one_term(self):
+        spring, fall = self.participants
+        option = '<div class="item" data-value="{}">P {}</div>'
+        html = self.get(term_id=spring.candidate.term_id)
+        self.assertIn(option.format(spring.id, 0), html)
+        self.assertNotIn(option.format(fall.id, 1), html)
+        # The chosen participant stays on offer whatever the term
+        html = self.get(term_id=spring.candidate.term_id, participant=fall.id)
+        self.assertIn(option.format(fall.id, 1), html)
@@ -0,0 +1,167 @@
+import json
+
+from app import db
+from app.pagination import encode_cursor
+from app.charts import render_term_charts
+from app.models import (Candidate, Class, Demographic, Gender, Race,
+                        SexualOrientation, Status, Term, TermStats, User)
+from base import AdminTestCase
+from query_counter import count_queries
+
+
+class AdminParticipantsTestCase(AdminTestCase):
+    def setUp(self):
+        super().setUp()
+        self.terms = [Term(name='Spring'), Term(name='Fall')]
+        db.session.add_all(self.terms)
+        db.session.commit()
+
+    def add_participants(self, n, last_name='Last'):
+        start = Candidate.query.count()
+        for i in range(start, start + n):
+            candidate = Candidate(
+                first_name='First{}'.format(i),
+                last_name=last_name,
+                email='p{}@example.com'.format(i),
+                term=self.terms[i % 2],
+                demographic=Demographic(
+                    race=Race.ASIAN if i % 2 else Race.BLACK,
+                    soc_class=Class.MIDDLE,
+                    gender=Gender.WOMAN,
+                    sexual_orientation=SexualOrientation.LGBTQ,
+                    age=30),
+                status=Status.ASSIGNED,
+                amount_donated=0)
+            db.session.add(candidate)
+            if i % 3 == 0:
+                db.session.add(User(email=candidate.email,
+                                    candidate=candidate))
+        db.session.commit()
+
+    def get_json(self, **params):
+        response = self.client.get('/admin/participants/data',
+                                   query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.data.decode('utf-8'))
+
+    def statements(self, url, **params):
+        db.session.expire_all()
+        with count_queries(db.engine) as statements:
+            response = self.client.get(url, query_string=params)
+        self.assertEqual(response.status_code, 200)
+        return statements
+
+    def test_participants_page_query_count(self):
+        self.add_participants(2)
+        few = self.statements('/admin/participants')
+        self.add_participants(30)
+        many = self.statements('/admin/participants')
+        self.assertEqual(len(many), len(few))
+        self.assertLessEqual(len(many), 5)
+        self.assertEqual(
+            sum(1 for s in many if 'FROM terms' in s and 'JOIN' not in s), 1)
+
+    def test_participants_data_query_count(self):
+        self.add_participants(2)
+        few = self.statements('/admin/participants/data')
+        self.add_participants(30)
+        many = self.statements('/admin/participants/data', race='ASIAN')
+        self.assertEqual(len(many), len(few))
+
+    def test_keyset_pagination(self):
+        self.add_participants(5, last_name='Young')
+        self.add_participants(5, last_name='Adams')
+        self.add_participants(1, last_name=None)
+
+        seen = []
+        data = self.get_json(limit=4, fields='id,last_name')
+        while True:
+            seen.extend(data['participants'])
+            if data['next'] is None:
+                break
+            data = self.get_json(limit=4, fields='id,last_name',
+                                 cursor=data['next'])
+        self.assertEqual(len(seen), 11)
+        self.assertEqual(len(set(p['id'] for p in seen)), 11)
+        self.assertEqual([p['last_name'] for p in seen],
+                         [None] + ['Adams'] * 5 + ['Young'] * 5)
+        self.assertEqual(set(seen[0]), set(['id', 'last_name']))
+
+    def test_filters(self):
+        self.add_participants(6)
+        rows = self.get_json(term_id=self.terms[0].id,
+                             race='BLACK')['participants']
+        self.assertEqual(len(rows), 3)
+        for row in rows:
+            self.assertEqual(row['term']['id'], self.terms[0].id)
+            self.assertEqual(row['demographic']['race'], 'BLACK')
+        self.assertEqual(
+            len(self.get_json(status='PENDING')['participants']), 0)
+        self.assertEqual(
+            len(self.get_json(status='ASSIGNED')['participants']), 6)
+
+    def test_bad_arguments(self):
+        for params in [{'race': 'PURPLE'}, {'fields': 'id,password'},
+                       {'cursor': 'not a cursor'},
+                       {'cursor': encode_cursor([{'a': 1}, 1])},
+                       {'cursor': encode_cursor(['Doe', [1]])},
+                       {'cursor': encode_cursor(['Doe', 'one'])},
+                       {'cursor': encode_cursor(['Doe', True])}]:
+            response = self.client.get('/admin/participants/data',
+                                       query_string=params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_delete_term(self):
+        self.add_participants(10)
+        term_id = self.terms[0].id
+        with count_queries(db.engine) as statements:
+            response = self.client.get('/admin/terms/{}/_delete'.format(
+                term_id))
+        self.assertEqual(response.status_code, 302)
+        updates = [s for s in statements if s.startswith('UPDATE candidates')]
+        self.assertEqual(len(updates), 1)
+        self.assertIsNone(Term.query.get(term_id))
+        self.assertEqual(Candidate.query.filter_by(term_id=None).count(), 5)
+        self.assertEqual(
+            self.client.get('/admin/terms/12345/_delete').status_code, 404)
+
+        # A chart job queued before the delete must not seed the term again
+        render_term_charts(term_id)
+        self.assertIsNone(TermStats.for_term(term_id))
+        self.assertEqual(TermStats.query.filter_by(term_id=term_id).count(), 0)
+
+    def test_roll_over_term(self):
+        self.add_participants(10)
+        spring, fall = self.terms
+        pending = Candidate.query.filter_by(term_id=spring.id).limit(3).all()
+        for candidate in pending:
+            candidate.status = Status.PENDING
+        db.session.commit()
+        TermStats.rebuild_term(spring.id)
+        TermStats.rebuild_term(fall.id)
+        page = self.client.get('/admin/edit-term/{}'.format(spring.id))
+        self.assertIn(b'Roll over', page.data)
+
+        with count_queries(db.engine) as statements:
+            self.client.post(
+                '/admin/terms/{}/_roll-over'.format(spring.id),
+                data={'term': fall.id})
+        updates = [s for s in statements if s.startswith('UPDATE candidates')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Candidate.query.filter_by(term_id=spring.id).count(),
+                         2)
+        self.assertEqual(Candidate.query.filter_by(
+            term_id=fall.id, status=Status.PENDING).count(), 3)
+        self.assertEqual(TermStats.for_term(spring.id)['race']['BLACK'], 2)
+        self.assertEqual(TermStats.for_term(fall.id)['race']['BLACK'], 3)
+
+        # Rolling a term over into itself moves nothing
+        page = self.client.post('/admin/terms/{}/_roll-over'.format(fall.id),
+                                data={'term': fall.id}, follow_redirects=True)
+        self.assertIn(b'Choose another term', page.data)
+        page = self.client.post('/admin/terms/{}/_roll-over'.format(fall.id),
+                                data={}, follow_redirects=True)
+        self.assertIn(b'Error filling out Term field', page.data)
+        self.assertNotIn(b'Choose another term', page.data)
+        self.assertEqual(Candidate.query.filter_by(term_id=fall.id).count(),
+                         8)
@@ -0,0 +1,37 @@
+import unittest
+
+from benchmarks.endpoints import percentile, regressions, run
+
+
+class BenchmarksTestCase(unittest.TestCase):
+    def test_every_page_runs(self):
+        results = run(terms=2, candidates=20, donors=200, repeat=2)
+        self.assertEqual(len(results), 8)
+        for result in results.values():
+            self.assertLessEqual(result['p50'], result['p95'])
+            self.assertGreater(result['peak_kb'], 0)
+        self.assertGreater(results['main.interested']['queries'], 0)
+
+    def test_percentile(self):
+        timings = list(range(1, 21))
+        self.assertEqual(percentile(timings, 50), 10)
+        self.assertEqual(percentile(timings, 95), 19)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_regressions(self):
+        baseline = {'a': {'p50': 10, 'p95': 20, 'queries': 3,
+                          'peak_kb': 100},
+                    'b': {'p50': 10, 'p95': 20, 'queries': 3,
+                          'peak_kb': 100}}
+        results = {'a': {'p50': 12, 'p95': 30, 'queries': 3, 'peak_kb': 90},
+                   'b': {'p50': 10, 'p95': 20, 'queries': 4,
+                         'peak_kb': 100},
+                   'new': {'p50': 1, 'p95': 1, 'queries': 1, 'peak_kb': 1}}
+        found = regressions(results, baseline, 0.25)
+        self.assertEqual(len(found), 2)
+        self.assertTrue(found[0].startswith('a: p95 30.0'))
+        self.assertEqual(found[1], 'b: 4 statements, baseline 3')
+
+        baseline['a']['p50'] = 0
+        self.assertEqual(regressions(results, baseline, 0.25)[0],
+                         'a: p50 12.0, baseline 0.0 (up from 0)')
@@ -0,0 +1,117 @@
+from app import db
+from app.models import (Candidate, Class, Demographic, Donor, DonorStatus,
+                        Gender, Race, SexualOrientation, Status, Term, User)
+from base import AppTestCase
+
+
+class CandidateModelTestCase(AppTestCase):
+    def add_candidate(self, term, race, soc_class, gender, orientation):
+        demographic = Demographic(
+            race=race,
+            soc_class=soc_class,
+            gender=gender,
+            sexual_orientation=orientation,
+            age=30)
+        candidate = Candidate(
+            first_name='First',
+            last_name='Last',
+            term=term,
+            demographic=demographic,
+            status=Status.PENDING,
+            amount_donated=0)
+        db.session.add(demographic)
+        db.session.add(candidate)
+        return candidate
+
+    def test_demographic_stats(self):
+        term = Term(name='Spring')
+        other_term = Term(name='Fall')
+        db.session.add_all([term, other_term])
+        self.add_candidate(term, Race.BLACK, Class.LOW, Gender.WOMAN,
+                           SexualOrientation.LGBTQ)
+        self.add_candidate(term, Race.BLACK, Class.MIDDLE, Gender.WOMAN,
+                           SexualOrientation.STRAIGHT)
+        self.add_candidate(term, Race.ASIAN, Class.LOW, Gender.MAN,
+                           SexualOrientation.LGBTQ)
+        self.add_candidate(other_term, Race.WHITE, Class.UPPER, Gender.MAN,
+                           SexualOrientation.STRAIGHT)
+        db.session.commit()
+
+        stats = Candidate.demographic_stats(term.id)
+        self.assertEqual(stats['race']['BLACK'], 2)
+        self.assertEqual(stats['race']['ASIAN'], 1)
+        self.assertEqual(stats['race']['WHITE'], 0)
+        self.assertEqual(stats['soc_class']['LOW'], 2)
+        self.assertEqual(stats['soc_class']['MIDDLE'], 1)
+        self.assertEqual(stats['gender']['WOMAN'], 2)
+        self.assertEqual(stats['gender']['MAN'], 1)
+        self.assertEqual(stats['sexual_orientation']['LGBTQ'], 2)
+        self.assertEqual(stats['sexual_orientation']['STRAIGHT'], 1)
+
+    def test_demographic_stats_zero_filled(self):
+        term = Term(name='Spring')
+        db.session.add(term)
+        db.session.commit()
+
+        stats = Candidate.demographic_stats(term.id)
+        self.assertEqual(set(stats['race']), set(m.name for m in Race))
+        self.assertEqual(set(stats['soc_class']), set(m.name for m in Class))
+        self.assertEqual(set(stats['gender']), set(m.name for m in Gender))
+        self.assertEqual(set(stats['sexual_orientation']),
+                         set(m.name for m in SexualOrientation))
+        self.assertEqual(list(stats['race'])[-1], 'NOT_SPECIFIED')
+        self.assertFalse(any(stats['race'].values()))
+
+    def test_single_dimension_views(self):
+        term = Term(name='Spring')
+        db.session.add(term)
+        self.add_candidate(term, Race.LATINX, Class.LOW, Gender.NON_BINARY,
+                           SexualOrientation.NOT_SPECIFIED)
+        db.session.commit()
+
+        self.assertEqual(Candidate.race_stats(term.id)['LATINX'], 1)
+        self.assertEqual(Candidate.class_stats(term.id)['LOW'], 1)
+        self.assertEqual(Candidate.gender_stats(term.id)['NON_BINARY'], 1)
+        self.assertEqual(
+            Candidate.sexual_orientation_stats(term.id)['NOT_SPECIFIED'], 1)
+
+    def test_cohort_stats(self):
+        term = Term(name='Spring')
+        other_term = Term(name='Fall')
+        db.session.add_all([term, other_term])
+        candidate = self.add_candidate(term, Race.BLACK, Class.LOW,
+                                       Gender.WOMAN, SexualOrientation.LGBTQ)
+        candidate.amount_donated = 50
+        other = self.add_candidate(other_term, Race.WHITE, Class.UPPER,
+                                   Gender.MAN, SexualOrientation.STRAIGHT)
+        other.amount_donated = 500
+        user = User(email='one@example.com', candidate=candidate)
+        other_user = User(email='two@example.com', candidate=other)
+        db.session.add_all([
+            user, other_user,
+            Donor(user=user, status=DonorStatus.PLEDGED, amount_received=0),
+            Donor(user=user, status=DonorStatus.COMPLETED,
+                  amount_received=25),
+            Donor(user=other_user, status=DonorStatus.PLEDGED,
+                  amount_received=100),
+        ])
+        db.session.commit()
+
+        stats = Candidate.cohort_stats(term.id)
+        self.assertEqual(stats['amount_donated'], 50)
+        self.assertEqual(stats['total_donations'], 25)
+        self.assertEqual(stats['donor_count'], 2)
+        self.assertEqual(stats['total_pledges'], 1)
+
+    def test_cohort_stats_empty_term(self):
+        term = Term(name='Spring')
+        db.session.add(term)
+        db.session.commit()
+
+        stats = Candidate.cohort_stats(term.id)
+        self.assertEqual(stats, {
+            'amount_donated': 0,
+            'total_donations': 0,
+            'donor_count': 0,
+            'total_pledges': 0
+        })
@@ -0,0 +1,33 @@
+from collections import OrderedDict
+
+from app import stats_cache
+from app.charts import chart_image, chart_key
+from base import AppTestCase
+
+
+class ChartsTestCase(AppTestCase):
+    def test_chart_key_tracks_contents(self):
+        stats = OrderedDict([('LOW', 1), ('UPPER', 2)])
+        self.assertEqual(chart_key('Class', stats), chart_key('Class', stats))
+        self.assertNotEqual(chart_key('Class', stats),
+                            chart_key('Class', OrderedDict([('LOW', 2),
+                                                            ('UPPER', 2)])))
+        self.assertNotEqual(chart_key('Class', stats),
+                            chart_key('Race', stats))
+
+    def test_chart_png_is_cached(self):
+        stats = OrderedDict([('LOW', 1), ('UPPER', 2)])
+        key, png = chart_image('Class', stats)
+        self.assertTrue(png.startswith(b'\x89PNG'))
+        self.assertEqual(stats_cache.get_blob('chart:png:' + key), png)
+        self.assertEqual(chart_image('Class', stats), (key, png))
+
+    def test_chart_svg(self):
+        stats = OrderedDict([('NATIVE_AMERICAN', 3), ('NOT_SPECIFIED', 0)])
+        key, svg = chart_image('Race & Ethnicity', stats, 'svg')
+        self.assertTrue(svg.startswith(b'<svg'))
+        self.assertIn(b'Graph for Race &amp; Ethnicity', svg)
+        self.assertIn(b'>Native</tspan>', svg)
+        self.assertIn(b'>American</tspan>', svg)
+        self.assertIn(b'fill="gray">3</text>', svg)
+        self.assertEqual(stats_cache.get_blob('chart:svg:' + key), svg)
@@ -0,0 +1,76 @@
+import smtplib
+import threading
+
+from flask import current_app
+from flask_mail import Message
+
+from app import mail
+from app.email import MailSession, mail_session, send_email, send_emails
+from app.jobs import job_app, job_context, set_job_app
+from base import AppTestCase
+
+
+class EmailTestCase(AppTestCase):
+    def tearDown(self):
+        super().tearDown()
+        set_job_app(None)
+
+    def invite(self, email):
+        return {'recipient': email, 'subject': 'Invite',
+                'template': 'account/email/invite',
+                'user': {'full_name': lambda: 'Jane Doe'},
+                'invite_link': 'http://example.com/join'}
+
+    def test_send_reuses_session(self):
+        with mail.record_messages() as outbox:
+            send_email(**self.invite('a@example.com'))
+            session = mail_session()
+            connection = session.connection
+            send_emails([self.invite('b@example.com'),
+                         self.invite('c@example.com')])
+        self.assertEqual([m.recipients for m in outbox],
+                         [['a@example.com'], ['b@example.com'],
+                          ['c@example.com']])
+        self.assertTrue(outbox[0].subject.endswith(' Invite'))
+        self.assertIs(mail_session(), session)
+        self.assertIs(session.connection, connection)
+
+    def test_session_per_thread(self):
+        session = mail_session()
+        others = []
+
+        def other_thread():
+            with self.app.app_context():
+                others.append(mail_session())
+
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        thread.join()
+        self.assertIsNot(others[0], session)
+        self.assertIs(mail_session(), session)
+
+    def test_reconnects_after_server_drops_session(self):
+        session = MailSession()
+        session.connection = mail.connect().__enter__()
+        session.connection.host = smtplib.SMTP()  # not connected any more
+        dropped = session.connection
+
+        message = Message('Hi', sender='admin@example.com',
+                          recipients=['a@example.com'], body='Hi')
+        with mail.record_messages() as outbox:
+            session.send(message)
+        self.assertEqual(len(outbox), 1)
+        self.assertIsNot(session.connection, dropped)
+
+        with self.assertRaises(AssertionError):  # not a connection problem
+            session.send(Message('Hi', sender='admin@example.com'))
+
+    def test_job_context(self):
+        set_job_app(self.app)
+        self.assertIs(job_app(), self.app)
+        self.app_context.pop()
+        try:
+            with job_context():
+                self.assertIs(current_app._get_current_object(), self.app)
+        finally:
+            self.app_context.push()
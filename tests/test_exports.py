@@ -0,0 +1,189 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+
+from app import db
+from app.exports import (csv_chunks, export_criteria, gzip_chunks,
+                         remove_expired_exports, start_export, write_export)
+from app.jobs import job_progress
+from app.models import (Candidate, Class, Demographic, Donor, DonorStatus,
+                        ExportChunk, Gender, Race, Role, SexualOrientation,
+                        Status, Term, User)
+from base import AppTestCase
+
+
+class ExportsTestCase(AppTestCase):
+    def login_admin(self):
+        self.add_admin()
+        return self.login()
+
+    def read(self, name, criteria=()):
+        return list(csv.reader(io.StringIO(''.join(csv_chunks(name,
+                                                              criteria)))))
+
+    def test_participants(self):
+        db.session.add_all([
+            Candidate(first_name='Jane', last_name='Doe, Jr.',
+                      term=Term(name='Spring'), notes='said "hi"',
+                      status=Status.ASSIGNED, amount_donated=20,
+                      applied=True, source='',
+                      demographic=Demographic(
+                          race=Race.NATIVE_AMERICAN, soc_class=Class.LOW,
+                          gender=Gender.WOMAN,
+                          sexual_orientation=SexualOrientation.LGBTQ,
+                          age=31)),
+            Candidate(first_name='No', last_name='Term'),
+        ])
+        db.session.commit()
+
+        rows = self.read('participants')
+        self.assertEqual(rows[0][:3], ['First Name', 'Last Name', 'Term'])
+        header = rows[0]
+        jane = dict(zip(header, rows[1]))
+        self.assertEqual(jane['Last Name'], 'Doe, Jr.')
+        self.assertEqual(jane['Term'], 'Spring')
+        self.assertEqual(jane['Notes'], 'said "hi"')
+        self.assertEqual(jane['Source'], 'NOT SPECIFIED')
+        self.assertEqual(jane['Status'], 'Assigned')
+        self.assertEqual(jane['Applied'], 'True')
+        self.assertEqual(jane['Race'], 'NATIVE AMERICAN')
+        self.assertEqual(jane['Age'], '31')
+        other = dict(zip(header, rows[2]))
+        self.assertEqual((other['Term'], other['Race']), ('', ''))
+
+    def test_donors_and_gzip(self):
+        user = User(email='p@example.com')
+        db.session.add_all([user] + [
+            Donor(first_name='Donor', last_name=str(i), user=user,
+                  status=DonorStatus.PLEDGED, amount_pledged=i)
+            for i in range(1200)])
+        db.session.commit()
+
+        rows = self.read('donors', [Donor.amount_pledged >= 1000])
+        self.assertEqual(len(rows), 201)
+        self.assertEqual(rows[1][8], 'PLEDGED')
+
+        plain = ''.join(csv_chunks('donors')).encode('utf-8')
+        zipped = b''.join(gzip_chunks(csv_chunks('donors')))
+        self.assertEqual(gzip.decompress(zipped), plain)
+        self.assertLess(len(zipped), len(plain))
+
+    def test_download_requires_admin(self):
+        Role.insert_roles()
+        db.session.add(User(email='p@example.com', password='password',
+                            confirmed=True,
+                            role=Role.query.filter_by(name='User').first()))
+        db.session.commit()
+        client = self.login('p@example.com')
+        self.assertEqual(client.get('/admin/download/donors').status_code,
+                         403)
+
+    def test_download_streams(self):
+        client = self.login_admin()
+        db.session.add(Candidate(first_name='Jane', last_name='Doe'))
+        db.session.commit()
+
+        response = client.get('/admin/download/participants')
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.mimetype, 'text/csv')
+        self.assertIn(b'Jane,Doe', response.data)
+
+        response = client.get('/admin/download/participants?gzip=1')
+        self.assertIn('participants.csv.gz',
+                      response.headers['Content-Disposition'])
+        self.assertIn(b'Jane,Doe', gzip.decompress(response.data))
+
+    def add_donors(self):
+        spring = Term(name='Spring', start_date=datetime.date(2017, 1, 1))
+        fall = Term(name='Fall', start_date=datetime.date(2017, 9, 1))
+        for term, status in [(spring, Status.ASSIGNED),
+                             (fall, Status.PENDING)]:
+            user = User(email='{}@example.com'.format(term.name),
+                        candidate=Candidate(first_name=term.name,
+                                            term=term, status=status))
+            db.session.add_all([user] + [
+                Donor(first_name=term.name, last_name=str(day), user=user,
+                      status=DonorStatus.PLEDGED if day % 2 else
+                      DonorStatus.TODO,
+                      contact_date=term.start_date +
+                      datetime.timedelta(days=day))
+                for day in range(10)])
+        db.session.commit()
+        return spring, fall
+
+    def test_criteria(self):
+        spring, fall = self.add_donors()
+
+        def names(name, **filters):
+            rows = self.read(name, export_criteria(name, **filters))[1:]
+            return [(row[0], row[1]) for row in rows]
+
+        self.assertEqual(names('participants', term_id=fall.id),
+                         [('Fall', '')])
+        self.assertEqual(names('participants', status='ASSIGNED'),
+                         [('Spring', '')])
+        self.assertEqual(names('participants', start='2017-06-01'),
+                         [('Fall', '')])
+        self.assertEqual(len(names('donors', term_id=spring.id)), 10)
+        self.assertEqual(
+            names('donors', term_id=spring.id, status='PLEDGED',
+                  start='2017-01-04', end='2017-01-08'),
+            [('Spring', '3'), ('Spring', '5'), ('Spring', '7')])
+
+    def test_export_job(self):
+        spring, _ = self.add_donors()
+        client = self.login_admin()
+
+        response = client.post('/admin/exports', data={
+            'export': 'donors', 'term': spring.id,
+            'donor_status': 'TODO', 'participant_status': '',
+            'start_date': '', 'end_date': ''
+        }, follow_redirects=True)
+        self.assertIn(b'Recent exports', response.data)
+        with client.session_transaction() as session:
+            job_id = session['exports'][0]
+        progress = job_progress(job_id)
+        self.assertEqual(progress['filters']['term_id'], spring.id)
+        self.assertEqual(progress['filters']['status'], 'TODO')
+        # Without Redis the worker could not report back
+        self.assertEqual(progress['state'], 'failed')
+        self.assertIn('Redis', progress['error'])
+
+        # Run the job here instead of on a worker, in small pieces
+        write_export(job_id, 'donors', progress['filters'], rows_per_chunk=2,
+                     bytes_per_chunk=1)
+        self.assertGreater(ExportChunk.query.filter_by(job_id=job_id).count(),
+                           1)
+        status = json.loads(
+            client.get('/admin/jobs/{}'.format(job_id)).data.decode())
+        self.assertEqual((status['state'], status['rows'], status['total']),
+                         ('finished', 5, 5))
+
+        response = client.get('/admin/exports/{}/download'.format(job_id))
+        rows = list(csv.reader(io.StringIO(response.data.decode('utf-8'))))
+        response.close()
+        self.assertEqual([row[1] for row in rows[1:]],
+                         ['0', '2', '4', '6', '8'])
+        self.assertIn(progress['filename'],
+                      response.headers['Content-Disposition'])
+
+    def test_expired_export(self):
+        client = self.login_admin()
+        job_id = start_export('participants', {})
+        write_export(job_id, 'participants', {})
+        self.app.config['EXPORT_TTL'] = -1
+        remove_expired_exports()
+        self.assertEqual(
+            client.get('/admin/exports/{}/download'.format(job_id))
+            .status_code, 404)
+
+    def test_unfinished_export_job(self):
+        client = self.login_admin()
+        job_id = start_export('participants', {})
+        self.assertEqual(
+            client.get('/admin/exports/{}/download'.format(job_id))
+            .status_code, 404)
+        self.assertEqual(client.get('/admin/jobs/missing').status_code,
+                         404)
@@ -0,0 +1,70 @@
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql
+
+from app import db
+from app.fake_data import _sequence_update, generate_dataset
+from app.models import (Candidate, Donor, DonorStatus, Role, SearchIndex,
+                        Term, TermStats, User)
+from base import AppTestCase
+
+
+class FakeDataTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        Role.insert_roles()
+
+    def snapshot(self):
+        return [db.session.query(Candidate.first_name, Candidate.status,
+                                 Candidate.term_id).order_by(Candidate.id)
+                .all(),
+                db.session.query(Donor.email, Donor.status, Donor.user_id,
+                                 Donor.amount_received).order_by(Donor.id)
+                .all()]
+
+    def test_dataset(self):
+        counts = generate_dataset(terms=3, candidates=60, donors=2000,
+                                  chunk_size=500)
+        terms, candidates, participants, donors = counts
+        self.assertEqual((terms, candidates, donors), (3, 60, 2000))
+        self.assertEqual(Term.query.count(), 3)
+        self.assertEqual(Candidate.query.count(), 60)
+        self.assertEqual(User.query.filter(User.candidate_id != None).count(),
+                         participants)
+        self.assertEqual(Donor.query.count(), 2000)
+        self.assertEqual(
+            {status for status, in db.session.query(Donor.status).distinct()},
+            set(DonorStatus))
+
+        # A few participants have many more donors than the rest
+        per_participant = sorted(
+            n for n, in db.session.query(func.count(Donor.id))
+            .group_by(Donor.user_id))
+        self.assertGreater(per_participant[-1],
+                           3 * per_participant[len(per_participant) // 2])
+
+        for term in Term.query:
+            self.assertEqual(TermStats.verify(term.id), [])
+        donor = Donor.query.first()
+        results, _ = SearchIndex.search(donor.email, kind='donor')
+        self.assertIn(donor.id, [ref_id for _, ref_id, _ in results])
+
+    def test_deterministic(self):
+        generate_dataset(terms=2, candidates=20, donors=200, seed=7,
+                         index_search=False)
+        first = self.snapshot()
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        Role.insert_roles()
+        generate_dataset(terms=2, candidates=20, donors=200, seed=7,
+                         index_search=False)
+        self.assertEqual(self.snapshot(), first)
+        self.assertEqual(SearchIndex.search('example')[0], [])
+
+    def test_sequence_update(self):
+        self.assertEqual(
+            ' '.join(str(_sequence_update(Donor).compile(
+                dialect=postgresql.dialect())).split()),
+            'SELECT setval(pg_get_serial_sequence(%(pg_get_serial_sequence_1)s,'
+            ' %(pg_get_serial_sequence_2)s), (SELECT max(donors.id) AS max_1 '
+            'FROM donors)) AS setval_1')
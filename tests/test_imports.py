@@ -0,0 +1,155 @@
+import csv
+import datetime
+import io
+
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.exports import csv_chunks
+from app.imports import import_csv, reserve_ids
+from app.models import (Candidate, Class, Demographic, Donor, DonorStatus,
+                        Race, SearchIndex, Status, Term, TermStats, User)
+from base import AppTestCase
+from query_counter import count_queries
+
+
+class ImportsTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.term = Term(name='Spring')
+        db.session.add(self.term)
+        db.session.commit()
+        TermStats.for_term(self.term.id)
+
+    def csv(self, rows):
+        out = io.StringIO()
+        csv.writer(out).writerows(rows)
+        out.seek(0)
+        return out
+
+    def test_participants(self):
+        imported, errors = import_csv('participants', self.csv([
+            ['First Name', 'Last Name', 'Term', 'Race', 'Class', 'Age',
+             'Status', 'Applied'],
+            ['Jane', 'Doe', 'Spring', 'native american', 'LOW', '31',
+             'Assigned', 'yes'],
+            ['John', 'Roe', 'Spring', '', '', '', '', ''],
+            ['', 'Nameless', 'Spring', 'WHITE', '', '', '', ''],
+            ['Bad', 'Row', 'Winter', 'MARTIAN', '', 'old', '', 'maybe'],
+        ]), chunk_size=2)
+
+        self.assertEqual(imported, 2)
+        self.assertEqual(errors, [
+            (4, 'First Name is required'),
+            (5, 'Term "Winter" does not exist; Race has to be one of NOT '
+             'SPECIFIED, BLACK, WHITE, ASIAN, LATINX, NATIVE AMERICAN, '
+             'MULTI RACIAL; Age has to be a whole number; Applied has to '
+             'be True or False'),
+        ])
+        jane = Candidate.query.filter_by(first_name='Jane').one()
+        self.assertEqual(jane.term, self.term)
+        self.assertEqual(jane.status, Status.ASSIGNED)
+        self.assertTrue(jane.applied)
+        self.assertEqual((jane.demographic.race, jane.demographic.soc_class,
+                          jane.demographic.age),
+                         (Race.NATIVE_AMERICAN, Class.LOW, 31))
+        john = Candidate.query.filter_by(first_name='John').one()
+        self.assertEqual((john.status, john.amount_donated),
+                         (Status.PENDING, 0))
+        self.assertIsNotNone(john.demographic)
+
+        self.assertEqual(TermStats.verify(self.term.id), [])
+        self.assertEqual(TermStats.for_term(self.term.id)['race']
+                         ['NATIVE_AMERICAN'], 1)
+        if SearchIndex.supported(db.session.connection()):
+            matches, _ = SearchIndex.search('jane')
+            self.assertEqual(matches[0][:2], ('candidate', jane.id))
+
+    def test_inserts_in_bulk(self):
+        rows = [['First Name', 'Race']] + \
+            [['Name{}'.format(i), 'ASIAN'] for i in range(50)]
+        with count_queries(db.engine) as statements:
+            imported, _ = import_csv('participants', self.csv(rows))
+        self.assertEqual(imported, 50)
+        inserts = [s for s in statements
+                   if s.startswith('INSERT INTO demographics')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            [c.demographic.race for c in Candidate.query], [Race.ASIAN] * 50)
+
+    def test_reserved_ids_lock_out_other_writers(self):
+        if db.engine.dialect.name != 'sqlite':
+            self.skipTest('checks the SQLite write lock')
+        first, second = db.engine.connect(), db.engine.connect()
+        try:
+            second.execute('PRAGMA busy_timeout = 10')
+            with first.begin():
+                self.assertEqual(reserve_ids(first, Demographic, 3), [1, 2, 3])
+                # A concurrent import would read the same largest id
+                with self.assertRaises(OperationalError):
+                    with second.begin():
+                        reserve_ids(second, Demographic, 3)
+        finally:
+            first.close()
+            second.close()
+
+    def test_donors(self):
+        db.session.add(User(email='p@example.com', candidate=Candidate(
+            first_name='P', term=self.term)))
+        db.session.commit()
+
+        imported, errors = import_csv('donors', self.csv([
+            ['First Name', 'Status', 'Amount Received', 'Contact Date',
+             'Participant Email'],
+            ['Ann', 'COMPLETED', '50', '2017-03-01', 'P@example.com'],
+            ['Bob', 'PLEDGED', '', 'March 1', 'p@example.com'],
+            ['Cy', '', '', '', 'nobody@example.com'],
+        ]))
+
+        self.assertEqual(imported, 1)
+        self.assertEqual(errors, [
+            (3, 'Contact Date has to be a date like 2017-09-01'),
+            (4, 'No participant has the email "nobody@example.com"'),
+        ])
+        donor = Donor.query.one()
+        self.assertEqual(donor.user.email, 'p@example.com')
+        self.assertEqual((donor.status, donor.contact_date),
+                         (DonorStatus.COMPLETED, datetime.date(2017, 3, 1)))
+        cohort = TermStats.for_term(self.term.id)['cohort']
+        self.assertEqual(cohort['total_donations'], 50)
+        self.assertEqual(TermStats.verify(self.term.id), [])
+
+    def test_export_round_trip_and_dry_run(self):
+        db.session.add(Candidate(
+            first_name='Jane', last_name='Doe', term=self.term, source='',
+            status=Status.REJECTED, amount_donated=5,
+            demographic=Demographic(race=Race.ASIAN)))
+        db.session.commit()
+        exported = ''.join(csv_chunks('participants'))
+
+        self.assertEqual(import_csv('participants', io.StringIO(exported),
+                                    dry_run=True), (1, []))
+        self.assertEqual(Candidate.query.count(), 1)
+        self.assertEqual(import_csv('participants', io.StringIO(exported)),
+                         (1, []))
+        copy = Candidate.query.order_by(Candidate.id.desc()).first()
+        self.assertEqual((copy.source, copy.status, copy.demographic.race),
+                         ('', Status.REJECTED, Race.ASIAN))
+
+    def test_unknown_columns(self):
+        self.assertEqual(
+            import_csv('participants', self.csv([['First Name', 'Shoe']])),
+            (0, [(1, 'Unknown columns: Shoe')]))
+
+    def test_upload(self):
+        self.add_admin()
+        client = self.login()
+
+        response = client.post('/admin/import', data={
+            'records': 'participants',
+            'file': (io.BytesIO(b'\xef\xbb\xbfFirst Name,Age\nJane,x\nJo,4\n'),
+                     'cohort.csv'),
+        })
+        self.assertIn(b'Imported 1 rows.', response.data)
+        self.assertIn(b'Age has to be a whole number', response.data)
+        self.assertEqual(Candidate.query.one().first_name, 'Jo')
@@ -0,0 +1,99 @@
+import datetime
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app import db
+from app.invites import invite_candidates
+from app.models import (Candidate, Class, Demographic, Donor, DonorStatus,
+                        Gender, Race, Role, SexualOrientation, Status, Term,
+                        User)
+from base import AppTestCase
+
+# Tables that grow with the organisation; a plain SCAN of one is a full scan
+LARGE_TABLES = ('candidates', 'donors', 'users', 'terms', 'demographics')
+
+
+@contextmanager
+def query_plans(engine):
+    """
+    Collect (statement, EXPLAIN QUERY PLAN details) for every SELECT
+    `engine` runs inside the block. SQLite only.
+    """
+    executed = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            executed.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    plans = []
+    try:
+        yield plans
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+    connection = engine.raw_connection()
+    try:
+        for statement, parameters in executed:
+            rows = connection.execute('EXPLAIN QUERY PLAN ' + statement,
+                                      parameters).fetchall()
+            plans.append((statement, [row[-1] for row in rows]))
+    finally:
+        connection.close()
+
+
+class IndexesTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        Role.insert_roles()
+        self.term = Term(name='Spring')
+        self.candidates = [
+            Candidate(first_name='First', last_name=str(i),
+                      email='c{}@example.com'.format(i), term=self.term,
+                      status=Status.ASSIGNED, amount_donated=10,
+                      demographic=Demographic())
+            for i in range(3)]
+        self.user = User(email='c0@example.com', password='password',
+                         confirmed=True, candidate=self.candidates[0])
+        db.session.add_all(self.candidates + [self.user] + [
+            Donor(first_name='Donor', last_name=str(i), user=self.user,
+                  status=DonorStatus.TODO, amount_received=5,
+                  contact_date=datetime.date(2017, 9, 1),
+                  demographic=Demographic(
+                      race=Race.ASIAN, soc_class=Class.MIDDLE,
+                      gender=Gender.WOMAN,
+                      sexual_orientation=SexualOrientation.LGBTQ, age=40))
+            for i in range(3)])
+        db.session.commit()
+
+    def assertNoFullScans(self, plans):
+        self.assertTrue(plans)
+        for statement, details in plans:
+            for detail in details:
+                words = detail.split()
+                if words[0] == 'SCAN' and words[1] in LARGE_TABLES:
+                    # Reading a whole index in order is fine, e.g. ORDER BY
+                    self.assertIn('USING', detail, statement)
+
+    def test_participant_dashboard(self):
+        client = self.login('c0@example.com')
+        with query_plans(db.engine) as plans:
+            self.assertEqual(client.get('/participant/').status_code, 200)
+            self.candidates[0].participant_stats.uncached(self.candidates[0])
+        self.assertNoFullScans(plans)
+        self.assertTrue(any('ix_donors_user_id_status' in detail
+                            for _, details in plans for detail in details))
+
+    def test_cohort_stats(self):
+        with query_plans(db.engine) as plans:
+            stats = Candidate.cohort_stats.uncached(self.term.id)
+        self.assertEqual(stats['donor_count'], 3)
+        self.assertNoFullScans(plans)
+
+    def test_invites(self):
+        with self.app.test_request_context():
+            with query_plans(db.engine) as plans:
+                Candidate.query.filter_by(status=Status.ASSIGNED).all()
+                Term.query.order_by(Term.end_date.desc()).first()
+                invite_candidates([c.id for c in self.candidates])
+        self.assertNoFullScans(plans)
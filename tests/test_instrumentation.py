@@ -0,0 +1,99 @@
+from flask import Response, stream_with_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app import create_app, db, sql_instrumentation
+from app.instrumentation import _LISTENERS, RequestQueries, fingerprint
+from app.models import Candidate, Term
+from base import AppTestCase
+
+
+class InstrumentationTestCase(AppTestCase):
+    def create_app(self):
+        app = create_app('testing')
+        app.config.update(SQL_INSTRUMENTATION=True, SQL_SAMPLE_RATE=1,
+                          SQL_REPEAT_THRESHOLD=3)
+        sql_instrumentation.init_app(app)
+
+        @app.route('/_terms')
+        def terms():
+            # Lazy loads each candidate's term: one query per candidate
+            candidates = Candidate.query.all()
+            return ','.join(c.term.name for c in candidates)
+
+        @app.route('/_terms.csv')
+        def terms_csv():
+            def rows():
+                for c in Candidate.query.all():
+                    yield c.term.name + '\n'
+            return Response(stream_with_context(rows()), mimetype='text/csv')
+
+        return app
+
+    def setUp(self):
+        super().setUp()
+        db.session.add_all(
+            Candidate(first_name=str(i), term=Term(name='Term {}'.format(i)))
+            for i in range(5))
+        db.session.commit()
+        self.client = self.app.test_client()
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM users WHERE id = 3 AND email = 'a''b'"),
+            'SELECT * FROM users WHERE id = ? AND email = ?')
+        self.assertEqual(
+            fingerprint('SELECT * FROM users\n WHERE id IN (?, ?, ?)'),
+            fingerprint('SELECT * FROM users WHERE id IN (%(id_1)s)'))
+        self.assertEqual(fingerprint('SELECT users_1.id FROM users AS users_1'),
+                         'SELECT users_1.id FROM users AS users_1')
+
+    def test_repeated(self):
+        queries = RequestQueries()
+        for i in range(5):
+            queries.record('SELECT * FROM terms WHERE id = {}'.format(i), 0.01)
+        queries.record('SELECT * FROM candidates', 0.01)
+        self.assertEqual(queries.count, 6)
+        self.assertAlmostEqual(queries.seconds, 0.06)
+        self.assertEqual(queries.repeated(3),
+                         [('SELECT * FROM terms WHERE id = ?', 5)])
+        self.assertEqual(queries.repeated(5), [])
+
+    def test_headers(self):
+        db.session.remove()
+        response = self.client.get('/_terms')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(int(response.headers['X-DB-Queries']), 6)
+        self.assertGreaterEqual(float(response.headers['X-DB-Time']), 0)
+        self.assertEqual(response.headers['X-DB-Repeated'], '1')
+
+        response = self.client.get('/')
+        self.assertIn('X-DB-Queries', response.headers)
+        self.assertNotIn('X-DB-Repeated', response.headers)
+
+    def test_streamed(self):
+        db.session.remove()
+        with self.assertLogs(self.app.logger, 'INFO') as logs:
+            response = self.client.get('/_terms.csv', buffered=False)
+            # The headers are sent before the body runs its statements
+            self.assertNotIn('X-DB-Queries', response.headers)
+            self.assertEqual(len(response.get_data().splitlines()), 5)
+            response.close()
+        self.assertIn('ran 6 statements', logs.output[0])
+        self.assertIn('Possible N+1 query', logs.output[1])
+
+    def test_listeners_need_opt_in(self):
+        for name, listener in _LISTENERS:
+            event.remove(Engine, name, listener)
+        create_app('testing')
+        self.assertFalse(any(event.contains(Engine, name, listener)
+                             for name, listener in _LISTENERS))
+        sql_instrumentation.init_app(self.app)
+        self.assertTrue(all(event.contains(Engine, name, listener)
+                            for name, listener in _LISTENERS))
+
+    def test_sampling(self):
+        self.app.config['SQL_SAMPLE_RATE'] = 0
+        response = self.client.get('/_terms')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-DB-Queries', response.headers)
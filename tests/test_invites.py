@@ -0,0 +1,87 @@
+from app import db, mail
+from app.invites import invite_candidates, send_invites
+from app.jobs import job_progress
+from app.models import Candidate, Role, Status, User
+from base import AppTestCase
+from query_counter import count_queries
+
+
+class InvitesTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        Role.insert_roles()
+        self.request_context = self.app.test_request_context()
+        self.request_context.push()
+
+    def tearDown(self):
+        self.request_context.pop()
+        super().tearDown()
+
+    def add_candidates(self, n, offset=0):
+        candidates = [Candidate(first_name='First', last_name=str(i),
+                                email='c{}@example.com'.format(i),
+                                status=Status.ASSIGNED)
+                      for i in range(offset, offset + n)]
+        db.session.add_all(candidates)
+        db.session.commit()
+        return [c.id for c in candidates]
+
+    def selects(self, ids):
+        with count_queries(db.engine) as queries:
+            invite_candidates(ids)
+        return [q for q in queries if q.lstrip().upper().startswith('SELECT')]
+
+    def test_lookups_do_not_grow_with_selection(self):
+        few = self.selects(self.add_candidates(3))
+        many = self.selects(self.add_candidates(30, offset=3))
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(User.query.count(), 33)
+
+    def test_existing_accounts_and_missing_emails(self):
+        ids = self.add_candidates(2)
+        existing = User(email='c0@example.com', first_name='Existing')
+        nameless = Candidate(first_name='No', last_name='Email')
+        twin = Candidate(first_name='Twin', last_name='1',
+                         email='c1@example.com')
+        db.session.add_all([existing, nameless, twin])
+        db.session.commit()
+
+        invited, skipped, job_id = invite_candidates(
+            ids + [nameless.id, twin.id])
+        self.assertEqual(len(invited), 3)
+        self.assertEqual(skipped, ['No Email'])
+        self.assertEqual(User.query.count(), 2)
+        self.assertEqual(
+            User.query.filter_by(email='c1@example.com').one().candidate.id,
+            ids[1])
+        self.assertEqual(job_progress(job_id)['total'], 2)
+
+    def test_send_invites(self):
+        invited, _, job_id = invite_candidates(self.add_candidates(3))
+        users = User.query.order_by(User.id).all()
+        invites = [(u.id, 'http://localhost/join/{}'.format(u.id))
+                   for u in users]
+
+        with mail.record_messages() as outbox:
+            send_invites(job_id, invites)
+        self.assertEqual([m.recipients[0] for m in outbox],
+                         [u.email for u in users])
+        self.assertIn('http://localhost/join/{}'.format(users[0].id),
+                      outbox[0].body)
+        progress = job_progress(job_id)
+        self.assertEqual((progress['state'], progress['sent'],
+                          progress['failed']), ('finished', 3, []))
+
+    def test_invite_page(self):
+        self.add_admin()
+        ids = self.add_candidates(2)
+        client = self.login()
+
+        response = client.post('/admin/invite-accepted-candidates', data={
+            'selected_candidates': ','.join(str(i) for i in ids)
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('job=', response.headers['Location'])
+        response = client.get(response.headers['Location'])
+        self.assertIn(b'Inviting candidates First 0, First 1', response.data)
+        self.assertIn(b'invite-progress', response.data)
@@ -0,0 +1,53 @@
+import os
+
+import sqlalchemy as sa
+from flask_migrate import Migrate, downgrade, upgrade
+
+from app import db
+from app.models import Candidate, Donor, SearchIndex, Term, TermStats
+from base import AppTestCase
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), '..', 'migrations')
+
+# Tables added since the baseline schema, which the migrations create
+NEW_TABLES = ('term_stats', 'search_index', 'export_chunks')
+
+
+class MigrationsTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        Migrate(self.app, db, directory=MIGRATIONS)
+        # The baseline schema: today's tables minus the new ones, no indexes
+        db.drop_all()
+        baseline = sa.MetaData()
+        for table in db.metadata.sorted_tables:
+            if table.name not in NEW_TABLES:
+                table.tometadata(baseline).indexes.clear()
+        baseline.create_all(db.engine)
+
+    def tearDown(self):
+        db.engine.execute('DROP TABLE IF EXISTS alembic_version')
+        super().tearDown()
+
+    def tables(self):
+        return set(sa.inspect(db.engine).get_table_names())
+
+    def test_upgrade_baseline(self):
+        self.assertFalse(self.tables() & set(NEW_TABLES))
+        upgrade()
+        self.assertLessEqual(set(NEW_TABLES), self.tables())
+
+        term = Term(name='Spring')
+        candidate = Candidate(first_name='Jane', last_name='Doe', term=term)
+        db.session.add_all([candidate,
+                            Donor(first_name='Dan', last_name='Roe')])
+        db.session.commit()
+        self.assertEqual(TermStats.for_term(term.id)['cohort']['donor_count'],
+                         0)
+        self.assertEqual(
+            [(kind, ref_id) for kind, ref_id, _ in
+             SearchIndex.search('jane')[0]], [('candidate', candidate.id)])
+
+        db.session.remove()
+        downgrade(revision='base')
+        self.assertFalse(self.tables() & set(NEW_TABLES))
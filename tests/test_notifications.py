@@ -0,0 +1,125 @@
+from app import db, mail
+from app.models import Candidate, Permission, Role, User
+from app.notifications import (_buffer_event, notify_admins,
+                               schedule_admin_digests,
+                               send_admin_notification, send_digest_emails)
+from base import AppTestCase
+from query_counter import count_queries
+
+
+class NotificationsTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        Role.insert_roles()
+        admin = Role.query.filter_by(permissions=0xff).first()
+        user = Role.query.filter_by(name='User').first()
+        db.session.add_all(
+            [User(first_name='Admin', last_name=str(i),
+                  email='admin{}@example.com'.format(i), role=admin)
+             for i in range(3)] +
+            [User(first_name='User', last_name=str(i),
+                  email='user{}@example.com'.format(i), role=user)
+             for i in range(10)])
+        db.session.commit()
+
+    def test_admins_in_one_query(self):
+        with count_queries(db.engine) as queries:
+            admins = User.with_permissions(Permission.ADMINISTER).all()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(sorted(a.email for a in admins),
+                         ['admin{}@example.com'.format(i) for i in range(3)])
+        self.assertEqual(User.with_permissions(Permission.GENERAL).count(),
+                         13)
+
+    def test_new_candidate_notification(self):
+        candidate = Candidate(first_name='Jane', last_name='Doe',
+                              email='jane@example.com')
+        db.session.add(candidate)
+        db.session.commit()
+
+        with mail.record_messages() as outbox:
+            send_admin_notification('new_candidate',
+                                    candidate_id=candidate.id,
+                                    add_method='Interest form')
+        self.assertEqual(sorted(m.recipients[0] for m in outbox),
+                         ['admin{}@example.com'.format(i) for i in range(3)])
+        self.assertIn('Jane Doe', outbox[0].body)
+        self.assertIn('Hello Admin', outbox[0].body)
+
+        with mail.record_messages() as outbox:
+            send_admin_notification('new_candidate', candidate_id=12345,
+                                    add_method='Interest form')
+        self.assertEqual(outbox, [])
+
+    def test_new_candidate_digest(self):
+        candidates = [Candidate(first_name='Jane', last_name=str(i),
+                                email='jane{}@example.com'.format(i))
+                      for i in range(5)]
+        db.session.add_all(candidates)
+        db.session.commit()
+        events = [{'candidate_id': c.id, 'add_method': 'Interest form'}
+                  for c in candidates]
+        events.append({'candidate_id': 12345, 'add_method': 'Interest form'})
+
+        with mail.record_messages() as outbox:
+            with count_queries(db.engine) as queries:
+                send_digest_emails('new_candidate', events)
+        self.assertEqual(len(queries), 2)  # candidates, admins
+        self.assertEqual(sorted(m.recipients[0] for m in outbox),
+                         ['admin{}@example.com'.format(i) for i in range(3)])
+        self.assertTrue(outbox[0].subject.endswith(
+            ' 5 New Giving Project Candidates'))
+        for i in range(5):
+            self.assertIn('Jane {}'.format(i), outbox[0].body)
+            self.assertIn('Jane {}'.format(i), outbox[0].html)
+
+        with mail.record_messages() as outbox:
+            send_digest_emails('new_candidate', events[-1:])
+        self.assertEqual(outbox, [])
+
+    def test_digest_needs_redis(self):
+        event = {'candidate_id': 1, 'add_method': 'Interest form'}
+        self.assertFalse(_buffer_event('new_candidate', event))
+        self.app.config['ADMIN_DIGEST_MINUTES'] = 15
+        # Without Redis events are emailed as they happen
+        self.assertFalse(_buffer_event('new_candidate', event))
+
+    def test_sent_now_without_queue(self):
+        candidate = Candidate(first_name='Jane', last_name='Doe',
+                              email='jane@example.com')
+        db.session.add(candidate)
+        db.session.commit()
+        self.app.config['ADMIN_DIGEST_MINUTES'] = 15
+        # No Redis for RQ or the digest: the emails go out from the request
+        with mail.record_messages() as outbox:
+            notify_admins('new_candidate', candidate_id=candidate.id,
+                          add_method='Interest form')
+        self.assertEqual(len(outbox), 3)
+        self.assertIn('Jane Doe', outbox[0].body)
+
+    def test_digest_schedule_off(self):
+        self.assertIsNone(schedule_admin_digests(self.app))
+
+    def test_intake_form_queries_do_not_grow_with_users(self):
+        client = self.app.test_client()
+        data = {
+            'first_name': 'Jane', 'last_name': 'Doe',
+            'email': 'jane@example.com', 'address': '1 Main St',
+            'pronouns': 'she/her', 'ability': 'n/a',
+            'how_long_philly': '2 years', 'what_neighborhood': 'West',
+            'how_did_you_hear': 'A friend',
+            'demographic-race': 'ASIAN', 'demographic-soc_class': 'LOW',
+            'demographic-gender': 'WOMAN',
+            'demographic-sexual_orientation': 'LGBTQ', 'demographic-age': 30,
+        }
+        with count_queries(db.engine) as few_users:
+            client.post('/interested', data=data)
+        role = Role.query.filter_by(permissions=0xff).first()
+        db.session.add_all(User(email='more{}@example.com'.format(i),
+                                role=role) for i in range(30))
+        db.session.commit()
+        with count_queries(db.engine) as many_users:
+            client.post('/interested', data=data)
+
+        self.assertEqual(Candidate.query.count(), 2)
+        self.assertEqual(len(many_users), len(few_users))
@@ -0,0 +1,87 @@
+from datetime import date
+
+from app import db, stats_cache
+from app.models import (Candidate, Class, Demographic, Donor, DonorStatus,
+                        Gender, Race, Role, SexualOrientation, Status, Term,
+                        TermStats, User)
+from base import AppTestCase
+from query_counter import count_queries
+
+
+class ParticipantViewsTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        Role.insert_roles()
+        term = Term(name='Spring')
+        self.candidate = Candidate(first_name='Pat', last_name='Doe',
+                                   term=term, status=Status.ASSIGNED,
+                                   amount_donated=10)
+        self.user = User(
+            first_name='Pat',
+            last_name='Doe',
+            email='pat@example.com',
+            password='password',
+            confirmed=True,
+            role=Role.query.filter_by(name='User').first(),
+            candidate=self.candidate)
+        db.session.add(self.user)
+        db.session.commit()
+        TermStats.for_term(term.id)
+
+        self.client = self.login('pat@example.com')
+
+    def add_donors(self, n):
+        statuses = list(DonorStatus)
+        for i in range(n):
+            db.session.add(Donor(
+                first_name='Donor',
+                last_name=str(i),
+                status=statuses[i % len(statuses)],
+                amount_received=5,
+                contact_date=date(2018, 3, 1),
+                date_asking=date(2018, 3, 2),
+                date_received=date(2018, 3, 3),
+                user=self.user,
+                demographic=Demographic(
+                    race=Race.ASIAN,
+                    soc_class=Class.MIDDLE,
+                    gender=Gender.WOMAN,
+                    sexual_orientation=SexualOrientation.LGBTQ,
+                    age=40)))
+        db.session.commit()
+
+    def statements(self, url):
+        db.session.expire_all()
+        stats_cache.clear()
+        with count_queries(db.engine) as statements:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return statements
+
+    def test_dashboard_query_count(self):
+        self.add_donors(4)
+        few = self.statements('/participant/')
+        self.add_donors(40)
+        many = self.statements('/participant/')
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(sum(1 for s in many if 'FROM donors' in s), 1)
+
+    def test_profile_query_count(self):
+        self.add_donors(4)
+        few = self.statements('/participant/profile')
+        self.add_donors(40)
+        many = self.statements('/participant/profile')
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(sum(1 for s in many if 'FROM donors' in s), 1)
+
+    def test_participant_stats(self):
+        self.add_donors(9)
+        stats = self.candidate.participant_stats()
+        self.assertEqual(stats, {
+            'donor_count': 9,
+            'todo_count': 3,
+            'asking_count': 2,
+            'pledged_count': 2,
+            'completed_count': 2,
+            'total_donations': 10,
+        })
@@ -0,0 +1,111 @@
+import json
+
+from app import db
+from app.models import Candidate, Donor, SearchIndex, User, search
+from base import AppTestCase
+
+
+class SearchIndexTestCase(AppTestCase):
+    def ids(self, query, kind=None):
+        return [(k, ref_id) for k, ref_id, _ in
+                SearchIndex.search(query, kind)[0]]
+
+    def test_writes_keep_index_in_sync(self):
+        candidate = Candidate(first_name='Jane', last_name='Doe',
+                              email='jd@example.com',
+                              phone_number='(215) 555-1234')
+        db.session.add(candidate)
+        db.session.commit()
+        self.assertEqual(self.ids('jane'), [('candidate', candidate.id)])
+        self.assertEqual(self.ids('2155551234'), [('candidate', candidate.id)])
+        self.assertEqual(self.ids('jd@example'), [('candidate', candidate.id)])
+
+        candidate.last_name = 'Roe'
+        db.session.commit()
+        self.assertEqual(self.ids('doe jane'), [])
+        self.assertEqual(self.ids('ro'), [('candidate', candidate.id)])
+
+        db.session.delete(candidate)
+        db.session.commit()
+        self.assertEqual(self.ids('jane'), [])
+
+    def test_rollback_leaves_index_alone(self):
+        db.session.add(Candidate(first_name='Jane', last_name='Doe'))
+        db.session.flush()
+        db.session.rollback()
+        self.assertEqual(self.ids('jane'), [])
+
+    def test_kinds_and_ranking(self):
+        user = User(email='p@example.com')
+        by_name = Donor(first_name='Rosa', last_name='Parks', user=user)
+        by_place = Donor(first_name='Ann', last_name='Lee', city='Rosamond',
+                         zipcode='93560', user=user)
+        candidate = Candidate(first_name='Rosalind', last_name='Franklin')
+        db.session.add_all([user, by_name, by_place, candidate])
+        db.session.commit()
+
+        self.assertEqual(self.ids('rosa', 'donor'),
+                         [('donor', by_name.id), ('donor', by_place.id)])
+        self.assertEqual(self.ids('rosa', 'candidate'),
+                         [('candidate', candidate.id)])
+        self.assertEqual(self.ids('93560'), [('donor', by_place.id)])
+
+    def test_rebuild(self):
+        db.session.add(Candidate(first_name='Jane', last_name='Doe'))
+        db.session.commit()
+        db.session.execute('DELETE FROM search_index')
+        db.session.commit()
+        self.assertEqual(self.ids('jane'), [])
+        self.assertEqual(SearchIndex.rebuild(), 1)
+        self.assertEqual(len(self.ids('jane')), 1)
+
+    def test_search_endpoint(self):
+        self.add_admin()
+        db.session.add_all([Candidate(first_name='Sam', last_name=str(i))
+                            for i in range(3)])
+        db.session.commit()
+        client = self.login()
+
+        response = client.get('/admin/search?q=sam&limit=2')
+        data = json.loads(response.data.decode('utf-8'))
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(data['next'], 2)
+        self.assertEqual(data['results'][0]['kind'], 'candidate')
+        data = json.loads(client.get('/admin/search?q=sam&limit=2&page=2')
+                          .data.decode('utf-8'))
+        self.assertEqual(len(data['results']), 1)
+        self.assertIsNone(data['next'])
+        self.assertEqual(client.get('/admin/search?q=sam&kind=user')
+                         .status_code, 400)
+
+
+class ColumnSearchTestCase(AppTestCase):
+    """Search on a SQLite build without FTS5."""
+
+    def setUp(self):
+        search._sqlite_fts5 = False
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        search._sqlite_fts5 = None
+
+    def test_search_without_index(self):
+        self.assertNotIn('search_index',
+                         db.inspect(db.engine).get_table_names())
+        db.session.add_all([
+            Candidate(first_name='Jane', last_name='Doe',
+                      email='jd@example.com'),
+            Donor(first_name='Janet', last_name='Roe', city='Philadelphia')])
+        db.session.commit()
+        self.assertEqual(
+            [k for k, _, _ in SearchIndex.search('jan')[0]],
+            ['candidate', 'donor'])
+        self.assertEqual(
+            [k for k, _, _ in SearchIndex.search('jan phila')[0]], ['donor'])
+        matches, more = SearchIndex.search('jan', per_page=1)
+        self.assertEqual(([k for k, _, _ in matches], more),
+                         (['candidate'], True))
+        matches, more = SearchIndex.search('jan', page=2, per_page=1)
+        self.assertEqual(([k for k, _, _ in matches], more), (['donor'], False))
+        self.assertEqual(SearchIndex.rebuild(), 2)
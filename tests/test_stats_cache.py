@@ -0,0 +1,87 @@
+from redis import StrictRedis
+
+from app import db, stats_cache
+from app.cache import LRUCache
+from app.models import Candidate, Term, TermStats
+from base import AppTestCase
+
+
+class StatsCacheTestCase(AppTestCase):
+    def test_lru_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_lru_expiry(self):
+        cache = LRUCache()
+        cache.set('a', 1, -1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_hits_and_misses(self):
+        term = Term(name='Spring')
+        db.session.add(term)
+        db.session.commit()
+
+        Candidate.cohort_stats(term.id)
+        Candidate.cohort_stats(term.id)
+        Candidate.cohort_stats(term.id)
+        counters = stats_cache.counters()
+        self.assertEqual(counters['backend'], 'local')
+        self.assertEqual(counters['misses'], 1)
+        self.assertEqual(counters['hits'], 2)
+
+    def test_invalidated_on_commit(self):
+        term = Term(name='Spring')
+        db.session.add(term)
+        db.session.commit()
+        TermStats.for_term(term.id)
+
+        TermStats.invalidate(term.id)
+        self.assertIsNotNone(
+            stats_cache.get('term', term.id, 'TermStats.for_term'))
+        db.session.commit()
+        self.assertIsNone(
+            stats_cache.get('term', term.id, 'TermStats.for_term'))
+
+    def test_invalidation_dropped_on_rollback(self):
+        term = Term(name='Spring')
+        db.session.add(term)
+        db.session.commit()
+        TermStats.for_term(term.id)
+
+        TermStats.invalidate(term.id)
+        db.session.rollback()
+        db.session.commit()
+        self.assertIsNotNone(
+            stats_cache.get('term', term.id, 'TermStats.for_term'))
+
+    def test_falls_back_when_redis_unreachable(self):
+        stats_cache._redis = StrictRedis(port=1, socket_connect_timeout=0.1)
+        try:
+            stats_cache.set('term', 1, 'f', {'a': 1})
+            self.assertEqual(stats_cache.get('term', 1, 'f'), {'a': 1})
+            self.assertEqual(stats_cache.counters()['backend'], 'local')
+        finally:
+            stats_cache._redis = None
+            stats_cache._redis_down_until = 0
+            stats_cache._flush_pending = False
+
+    def test_flushes_before_reusing_redis(self):
+        stats_cache._redis = StrictRedis(port=1, socket_connect_timeout=0.1)
+        try:
+            stats_cache.invalidate('term', 1)
+            self.assertIsNone(stats_cache.redis())
+            # Once the retry window passes Redis is only used again after
+            # the keys invalidated meanwhile are flushed, which fails here
+            stats_cache._redis_down_until = 0
+            self.assertIsNone(stats_cache.redis())
+            self.assertGreater(stats_cache._redis_down_until, 0)
+        finally:
+            stats_cache._redis = None
+            stats_cache._redis_down_until = 0
+            stats_cache._flush_pending = False
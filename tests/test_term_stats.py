@@ -0,0 +1,160 @@
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import (Candidate, Class, Demographic, Donor, DonorStatus,
+                        Gender, Race, SexualOrientation, Status, Term,
+                        TermStats, User)
+from base import AppTestCase
+
+
+class TermStatsTestCase(AppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.term = Term(name='Spring')
+        self.other_term = Term(name='Fall')
+        db.session.add_all([self.term, self.other_term])
+        db.session.commit()
+        # Seed both terms so writes are tracked incrementally
+        TermStats.for_term(self.term.id)
+        TermStats.for_term(self.other_term.id)
+
+    def add_candidate(self, term):
+        candidate = Candidate(
+            first_name='First',
+            last_name='Last',
+            term=term,
+            demographic=Demographic(
+                race=Race.ASIAN,
+                soc_class=Class.MIDDLE,
+                gender=Gender.WOMAN,
+                sexual_orientation=SexualOrientation.LGBTQ,
+                age=30),
+            status=Status.PENDING,
+            amount_donated=20)
+        db.session.add(candidate)
+        TermStats.record_candidate(candidate)
+        db.session.commit()
+        return candidate
+
+    def assertInSync(self):
+        self.assertEqual(TermStats.verify(self.term.id), [])
+        self.assertEqual(TermStats.verify(self.other_term.id), [])
+
+    def test_new_candidate(self):
+        self.add_candidate(self.term)
+        stats = TermStats.for_term(self.term.id)
+        self.assertEqual(stats['race']['ASIAN'], 1)
+        self.assertEqual(stats['cohort']['amount_donated'], 20)
+        self.assertInSync()
+
+    def test_candidate_edit_and_term_reassignment(self):
+        candidate = self.add_candidate(self.term)
+        user = User(email='p@example.com', candidate=candidate)
+        db.session.add(user)
+        donor = Donor(user=user, status=DonorStatus.TODO, amount_received=0)
+        db.session.add(donor)
+        TermStats.record_donor(donor)
+        db.session.commit()
+
+        TermStats.record_candidate(candidate, -1)
+        candidate.demographic.race = Race.BLACK
+        candidate.term = self.other_term
+        TermStats.record_candidate(candidate)
+        db.session.commit()
+
+        self.assertEqual(TermStats.for_term(self.term.id)['race']['ASIAN'], 0)
+        moved = TermStats.for_term(self.other_term.id)
+        self.assertEqual(moved['race']['BLACK'], 1)
+        self.assertEqual(moved['cohort']['donor_count'], 1)
+        self.assertInSync()
+
+    def test_donor_transitions(self):
+        candidate = self.add_candidate(self.term)
+        user = User(email='p@example.com', candidate=candidate)
+        donor = Donor(user=user, status=DonorStatus.ASKING, amount_received=0)
+        db.session.add_all([user, donor])
+        TermStats.record_donor(donor)
+        db.session.commit()
+
+        for status, received in [(DonorStatus.PLEDGED, 0),
+                                 (DonorStatus.COMPLETED, 75)]:
+            TermStats.record_donor(donor, -1)
+            donor.status = status
+            donor.amount_received = received
+            TermStats.record_donor(donor)
+            db.session.commit()
+            self.assertInSync()
+
+        cohort = TermStats.for_term(self.term.id)['cohort']
+        self.assertEqual(cohort['total_donations'], 75)
+        self.assertEqual(cohort['total_pledges'], 0)
+
+    def test_rebuild_repairs_drift(self):
+        self.add_candidate(self.term)
+        TermStats.bump(self.term.id, 'race', 'ASIAN', 5)
+        db.session.commit()
+        self.assertEqual(TermStats.verify(self.term.id),
+                         [('race', 'ASIAN', 6, 1)])
+
+        TermStats.rebuild_term(self.term.id)
+        self.assertInSync()
+
+    def test_version_changes_with_stats(self):
+        version = TermStats.version(self.term.id)
+        self.add_candidate(self.term)
+        self.assertGreater(TermStats.version(self.term.id), version)
+
+        version = TermStats.version(self.term.id)
+        TermStats.rebuild_term(self.term.id)
+        self.assertGreater(TermStats.version(self.term.id), version)
+        self.assertNotIn('meta', TermStats.for_term(self.term.id))
+        self.assertIsNone(TermStats.version(12345))
+
+    def test_form_values(self):
+        # Forms assign enum names rather than members
+        candidate = Candidate(
+            term=self.term,
+            demographic=Demographic(race='BLACK', soc_class='LOW',
+                                    gender='MAN', sexual_orientation='LGBTQ'),
+            status=Status.PENDING, amount_donated=0)
+        db.session.add(candidate)
+        TermStats.record_candidate(candidate)
+        db.session.commit()
+        self.assertEqual(TermStats.for_term(self.term.id)['race']['BLACK'], 1)
+        self.assertInSync()
+
+    def test_new_candidate_form(self):
+        self.add_admin()
+        client = self.login()
+        race = TermStats.for_term(self.term.id)['race']['BLACK']
+        response = client.post('/admin/new-candidate', data={
+            'first_name': 'Jane', 'last_name': 'Doe',
+            'email': 'jane@example.com', 'term': self.term.id,
+            'demographic-race': 'BLACK', 'demographic-soc_class': 'LOW',
+            'demographic-gender': 'WOMAN',
+            'demographic-sexual_orientation': 'LGBTQ', 'demographic-age': 30,
+        })
+        self.assertIn(b'successfully created', response.data)
+        self.assertEqual(TermStats.for_term(self.term.id)['race']['BLACK'],
+                         race + 1)
+        self.assertInSync()
+
+    def test_concurrent_seed(self):
+        term = Term(name='Summer')
+        candidate = self.add_candidate(self.other_term)
+        candidate.term = term
+        db.session.commit()
+        rebuild_term = TermStats.rebuild_term
+
+        def lose_race(term_id):
+            # Another request seeds the term first; ours then conflicts
+            rebuild_term(term_id)
+            raise IntegrityError('INSERT INTO term_stats', {}, None)
+
+        TermStats.rebuild_term = lose_race
+        try:
+            stats = TermStats.for_term(term.id)
+        finally:
+            TermStats.rebuild_term = rebuild_term
+        self.assertEqual(stats['race']['ASIAN'], 1)
+        self.assertEqual(TermStats.verify(term.id), [])
@@ -1,8 +1,12 @@
 import time
 import unittest
 
-from app import create_app, db
+from app import create_app, db, stats_cache
 from app.models import AnonymousUser, Permission, Role, User
+from app.models.user import load_user
+
+from fake_redis import FakeRedis
+from query_counter import count_queries
 
 
 class UserModelTestCase(unittest.TestCase):
@@ -11,6 +15,7 @@ class UserModelTestCase(unittest.TestCase):
         self.app_context = self.app.app_context()
         self.app_context.push()
         db.create_all()
+        stats_cache.local.clear()
 
     def tearDown(self):
         db.session.remove()
@@ -131,3 +136,92 @@ class UserModelTestCase(unittest.TestCase):
     def test_anonymous(self):
         u = AnonymousUser()
         self.assertFalse(u.can(Permission.GENERAL))
+
+    def use_redis(self):
+        """Cache identities in a fake Redis, returned for inspection."""
+        client = FakeRedis()
+        stats_cache._redis = client
+        self.addCleanup(setattr, stats_cache, '_redis', None)
+        return client
+
+    def test_cached_identity(self):
+        self.use_redis()
+        Role.insert_roles()
+        u = User(email='user@example.com', password='password',
+                 first_name='Jane', confirmed=True)
+        db.session.add(u)
+        db.session.commit()
+        user_id = u.id
+        load_user(str(user_id))
+        db.session.remove()
+
+        with count_queries(db.engine) as queries:
+            user = load_user(str(user_id))
+            self.assertTrue(user.confirmed)
+            self.assertTrue(user.can(Permission.GENERAL))
+            self.assertFalse(user.is_admin())
+            self.assertEqual(user.role.index, 'main')
+            self.assertEqual(user.full_name(), 'Jane None')
+        self.assertEqual(queries, [])
+        # Columns left out of the cache still load
+        self.assertTrue(user.verify_password('password'))
+
+    def test_identity_not_cached_locally(self):
+        Role.insert_roles()
+        u = User(email='user@example.com', password='password')
+        db.session.add(u)
+        db.session.commit()
+        user_id = u.id
+        load_user(str(user_id))
+        db.session.remove()
+        # Without Redis another worker's change has to be seen at once
+        role = Role.query.filter_by(name='User').first()
+        role.permissions = 0
+        db.session.commit()
+        db.session.remove()
+        with count_queries(db.engine) as queries:
+            self.assertFalse(load_user(str(user_id)).can(Permission.GENERAL))
+        self.assertEqual(len(queries), 1)
+
+    def test_cached_identity_forgotten_on_role_change(self):
+        self.use_redis()
+        Role.insert_roles()
+        u = User(email='user@example.com', password='password')
+        db.session.add(u)
+        db.session.commit()
+        user_id = u.id
+        self.assertTrue(load_user(str(user_id)).can(Permission.GENERAL))
+        db.session.remove()
+        Role.query.filter_by(name='User').first().permissions = 0
+        db.session.commit()
+        db.session.remove()
+        self.assertFalse(load_user(str(user_id)).can(Permission.GENERAL))
+
+    def test_cached_identity_forgotten_on_change(self):
+        client = self.use_redis()
+        Role.insert_roles()
+        u = User(email='user@example.com', password='password')
+        db.session.add(u)
+        db.session.commit()
+        user_id = u.id
+        key = 'identity:{}'.format(user_id)
+        load_user(str(user_id)).role = Role.query.filter_by(
+            permissions=Permission.ADMINISTER).first()
+        self.assertIn(key, client.data)
+        db.session.commit()
+        self.assertNotIn(key, client.data)
+        db.session.remove()
+        self.assertTrue(load_user(str(user_id)).is_admin())
+
+        user = load_user(str(user_id))
+        self.assertFalse(user.confirmed)
+        user.confirm_account(user.generate_confirmation_token())
+        self.assertNotIn(key, client.data)
+        db.session.remove()
+        self.assertTrue(load_user(str(user_id)).confirmed)
+
+        db.session.delete(load_user(str(user_id)))
+        db.session.commit()
+        self.assertNotIn(key, client.data)
+        db.session.remove()
+        self.assertIsNone(load_user(str(user_id)))